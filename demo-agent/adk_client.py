@@ -0,0 +1,283 @@
+import asyncio
+import json
+import os
+import queue
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import aiohttp
+
+
+class StreamingUnavailable(Exception):
+    """Raised when the ADK server does not offer the /run_sse endpoint."""
+
+
+class AdkApiError(Exception):
+    """Raised when the ADK server answers with a non-success status code."""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"API Error ({status}): {text}")
+        self.status = status
+        self.text = text
+
+
+async def iter_sse_events(response: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Parse a server-sent events stream into decoded JSON events.
+
+    Args:
+        response: An open response from the /run_sse endpoint
+
+    Yields:
+        Each event payload as a dictionary
+    """
+    data_lines = []
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+        elif not line and data_lines:
+            # A blank line terminates the current event
+            payload = "\n".join(data_lines)
+            data_lines = []
+            try:
+                yield json.loads(payload)
+            except json.JSONDecodeError:
+                continue
+    if data_lines:
+        try:
+            yield json.loads("\n".join(data_lines))
+        except json.JSONDecodeError:
+            pass
+
+
+_STREAM_DONE = object()
+
+
+class AdkClient:
+    """
+    A long-lived HTTP client for the ADK API server.
+
+    The client owns a background thread running its own asyncio event loop and a single
+    ``aiohttp.ClientSession`` with a keep-alive connection pool. Every Streamlit script
+    run submits its requests to that loop, so connections are reused across chat
+    messages and users instead of being opened and torn down per call.
+
+    All public methods are synchronous and thread-safe; errors raised while talking to
+    the server (``aiohttp.ClientError``, ``asyncio.TimeoutError``, ``AdkApiError``) are
+    re-raised in the calling thread.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        pool_limit: int = 100,
+        pool_limit_per_host: int = 0,
+        keepalive_timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        request_timeout: float = 60.0,
+    ):
+        """
+        Args:
+            base_url: Root URL of the ADK API server
+            pool_limit: Maximum number of simultaneous connections (0 for unlimited)
+            pool_limit_per_host: Maximum connections to the same host (0 for unlimited)
+            keepalive_timeout: Seconds an idle connection is kept open for reuse
+            connect_timeout: Seconds allowed to establish a new connection
+            request_timeout: Default total seconds allowed for a non-streaming request
+        """
+        self.base_url = base_url.rstrip("/")
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="adk-client-loop", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, base_url: str) -> "AdkClient":
+        """Create a client whose pool limits and timeouts come from environment variables."""
+        return cls(
+            base_url,
+            pool_limit=int(os.getenv("ADK_POOL_LIMIT", "100")),
+            pool_limit_per_host=int(os.getenv("ADK_POOL_LIMIT_PER_HOST", "0")),
+            keepalive_timeout=float(os.getenv("ADK_KEEPALIVE_TIMEOUT", "30")),
+            connect_timeout=float(os.getenv("ADK_CONNECT_TIMEOUT", "5")),
+            request_timeout=float(os.getenv("ADK_REQUEST_TIMEOUT", "60")),
+        )
+
+    # --- Event loop plumbing ---
+
+    def _submit(self, coro) -> Any:
+        """Run a coroutine on the client's loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared ClientSession, creating it on first use (loop thread only)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout, connect=self.connect_timeout),
+            )
+        return self._session
+
+    def _timeout(self, total: Optional[float]) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=total or self.request_timeout, connect=self.connect_timeout)
+
+    # --- API calls ---
+
+    def create_session(self, app_name: str, user_id: str, session_id: str, state: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Create a session on the ADK API server.
+
+        Raises:
+            AdkApiError: If the server rejects the request
+        """
+        async def _create():
+            session = await self._get_session()
+            async with session.post(
+                f"{self.base_url}/apps/{app_name}/users/{user_id}/sessions/{session_id}",
+                json={"state": state or {}},
+                timeout=self._timeout(10),
+            ) as response:
+                if response.status not in (200, 201):
+                    raise AdkApiError(response.status, await response.text())
+
+        self._submit(_create())
+
+    def run(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """
+        POST a message to the blocking /run endpoint and return the decoded JSON body.
+
+        Raises:
+            AdkApiError: If the server answers with a non-200 status
+        """
+        async def _run():
+            session = await self._get_session()
+            async with session.post(f"{self.base_url}/run", json=payload, timeout=self._timeout(timeout)) as response:
+                if response.status != 200:
+                    raise AdkApiError(response.status, await response.text())
+                return await response.json()
+
+        return self._submit(_run())
+
+    def stream(
+        self,
+        payload: Dict[str, Any],
+        read_timeout: Optional[float] = None,
+        on_idle: Optional[Callable[[], None]] = None,
+        idle_interval: float = 2.0,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        POST a message to /run_sse and yield each event as soon as it arrives.
+
+        The response is consumed on the client's loop and handed to the calling thread
+        through a queue, so Streamlit can render each event from its own script thread.
+
+        Args:
+            payload: The run request body
+            read_timeout: Maximum seconds to wait between two events
+            on_idle: Called from the calling thread every ``idle_interval`` seconds without an event
+            idle_interval: Seconds between two ``on_idle`` calls
+
+        Raises:
+            StreamingUnavailable: If the server has no SSE endpoint
+            AdkApiError: If the server answers with another non-200 status
+        """
+        events: "queue.Queue[Any]" = queue.Queue()
+        cancelled = threading.Event()
+
+        async def _pump():
+            try:
+                session = await self._get_session()
+                async with session.post(
+                    f"{self.base_url}/run_sse",
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(
+                        total=None, connect=self.connect_timeout, sock_read=read_timeout or self.request_timeout
+                    ),
+                ) as response:
+                    content_type = response.headers.get("Content-Type", "")
+                    if response.status in (404, 405) or (
+                        response.status == 200 and "text/event-stream" not in content_type
+                    ):
+                        raise StreamingUnavailable(f"{self.base_url}/run_sse is not available")
+                    if response.status != 200:
+                        raise AdkApiError(response.status, await response.text())
+                    async for event in iter_sse_events(response):
+                        if cancelled.is_set():
+                            break
+                        events.put(event)
+                events.put(_STREAM_DONE)
+            except BaseException as e:
+                events.put(e)
+
+        future = asyncio.run_coroutine_threadsafe(_pump(), self._loop)
+        try:
+            while True:
+                try:
+                    item = events.get(timeout=idle_interval if on_idle else None)
+                except queue.Empty:
+                    on_idle()
+                    continue
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # Stop reading if the caller abandons the stream early
+            cancelled.set()
+            if not future.done():
+                future.cancel()
+
+    def queue_position(self, app_name: str, user_id: str, session_id: str, timeout: float = 2) -> Optional[Dict[str, Any]]:
+        """
+        Where the session's turn waits in the server's model call queue.
+
+        Returns:
+            The server's answer ('position' 0 when not waiting, 'queued', 'in_flight'),
+            or None if the server does not report it.
+        """
+        async def _position():
+            session = await self._get_session()
+            async with session.get(
+                f"{self.base_url}/apps/{app_name}/users/{user_id}/sessions/{session_id}/admission",
+                timeout=self._timeout(timeout),
+            ) as response:
+                return await response.json() if response.status == 200 else None
+
+        try:
+            return self._submit(_position())
+        except Exception:
+            return None
+
+    def ping(self, timeout: float = 5) -> Optional[int]:
+        """Return the HTTP status of the server root, or None if it is unreachable."""
+        async def _ping():
+            session = await self._get_session()
+            async with session.get(self.base_url, timeout=self._timeout(timeout)) as response:
+                return response.status
+
+        try:
+            return self._submit(_ping())
+        except Exception:
+            return None
+
+    def close(self) -> None:
+        """Close the connection pool and stop the background loop."""
+        if not self._loop.is_running():
+            return
+        if self._session is not None:
+            self._submit(self._session.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
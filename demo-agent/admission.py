@@ -0,0 +1,295 @@
+"""
+Admission control for model calls.
+
+When a whole class starts at once, every Guide turn and its nested subagent calls go
+to Gemini together and come back as 429s and long tails. Every agent model is wrapped
+in ``ScheduledLlm``, so each call first takes a slot from the process's
+``ModelScheduler``:
+
+- at most ``max_concurrency`` model calls run at once; the rest wait in one queue in
+  which a student's turn goes before background work (prefetch, bank generation);
+- each tenant (a school or class, see ``tenant_of``) gets a token bucket of
+  ``tenant_rpm`` calls per minute with bursts of ``tenant_burst``;
+- the queue is bounded: a call that would wait longer than ``queue_timeout``, or find
+  ``max_queue`` calls ahead of it, is refused at once with a RESOURCE_EXHAUSTED model
+  error instead of timing out at the frontend.
+
+``schedule_models`` installs the wrapper on the Guide and its subagents, and
+``position(session_id)`` tells the frontend where a student's turn is in the queue.
+"""
+import asyncio
+import bisect
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Dict, List, MutableMapping, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from .metrics import registry
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Who the model call in this task is made for. Set once per turn by the Guide's
+# before_agent_callback; subagent runs and prefetch tasks inherit it.
+_priority: ContextVar[int] = ContextVar("admission_priority", default=INTERACTIVE)
+_tenant: ContextVar[str] = ContextVar("admission_tenant", default="default")
+_session_id: ContextVar[Optional[str]] = ContextVar("admission_session_id", default=None)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a model call is refused instead of queued."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Too many students are learning right now ({reason}); please try again in {round(retry_after)} seconds.")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def tenant_of(state: MutableMapping[str, Any]) -> str:
+    """The rate-limit tenant of a session: its 'tenant' state, else its cohort, else "default"."""
+    return str(state.get("tenant") or state.get("cohort_id") or "default")
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_s: float, burst: float):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take one token, possibly ahead of time; return the seconds until it is due."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_s)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate_per_s)
+
+    def refund(self) -> None:
+        self.tokens += 1
+
+
+class ModelScheduler:
+    """
+    Global concurrency limit, per-tenant rate limits and a bounded priority queue.
+
+    Single event loop only; every method must be called from the loop serving requests.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_queue: int = 200,
+        queue_timeout: float = 30.0,
+        tenant_rpm: float = 0.0,
+        tenant_burst: Optional[float] = None,
+    ):
+        """
+        Args:
+            max_concurrency: Model calls in flight at once (0 for unlimited)
+            max_queue: Calls allowed to wait for a slot; further calls are refused
+            queue_timeout: Longest a call may wait, for a slot or for its tenant's rate limit
+            tenant_rpm: Model calls per minute per tenant (0 for unlimited)
+            tenant_burst: Calls a tenant may make at once before the rate applies (default: rpm / 6)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tenant_rpm = tenant_rpm
+        self.tenant_burst = tenant_burst if tenant_burst is not None else max(1.0, tenant_rpm / 6)
+        self.in_flight = 0
+        # (priority, arrival, future, session id), kept sorted: the head is served first
+        self._waiters: List[tuple] = []
+        self._arrivals = itertools.count()
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self.stats = {"admitted": 0, "queued": 0, "rejected_queue_full": 0, "rejected_rate_limit": 0, "rejected_timeout": 0}
+
+    @classmethod
+    def from_env(cls) -> "ModelScheduler":
+        """Configure from SLIMPAI_MAX_MODEL_CALLS, SLIMPAI_MAX_QUEUE, SLIMPAI_QUEUE_TIMEOUT, SLIMPAI_TENANT_RPM and SLIMPAI_TENANT_BURST."""
+        burst = os.getenv("SLIMPAI_TENANT_BURST")
+        return cls(
+            max_concurrency=int(os.getenv("SLIMPAI_MAX_MODEL_CALLS", "16")),
+            max_queue=int(os.getenv("SLIMPAI_MAX_QUEUE", "200")),
+            queue_timeout=float(os.getenv("SLIMPAI_QUEUE_TIMEOUT", "30")),
+            tenant_rpm=float(os.getenv("SLIMPAI_TENANT_RPM", "0")),
+            tenant_burst=float(burst) if burst else None,
+        )
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        self.stats[f"rejected_{reason}"] += 1
+        return AdmissionRejected(reason.replace("_", " "), retry_after)
+
+    async def acquire(self) -> None:
+        """
+        Wait for the tenant's rate limit and a free slot.
+
+        Raises:
+            AdmissionRejected: If the wait would exceed ``queue_timeout`` or the queue is full
+        """
+        delay = 0.0
+        if self.tenant_rpm > 0:
+            tenant = _tenant.get()
+            bucket = self._buckets.get(tenant)
+            if bucket is None:
+                bucket = self._buckets[tenant] = _TokenBucket(self.tenant_rpm / 60, self.tenant_burst)
+            delay = bucket.reserve()
+            if delay > self.queue_timeout:
+                bucket.refund()
+                raise self._reject("rate_limit", delay)
+            if delay:
+                try:
+                    await asyncio.sleep(delay)
+                except asyncio.CancelledError:
+                    # The reserved token was never used
+                    bucket.refund()
+                    raise
+
+        if not self.max_concurrency or (self.in_flight < self.max_concurrency and not self._waiters):
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full", self.queue_timeout)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (_priority.get(), next(self._arrivals), future, _session_id.get())
+        bisect.insort(self._waiters, waiter, key=lambda w: w[:2])
+        self.stats["queued"] += 1
+        try:
+            # The rate limit wait counts against the same bound
+            await asyncio.wait_for(future, self.queue_timeout - delay)
+        except asyncio.TimeoutError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise self._reject("timeout", self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release()
+            raise
+        self.stats["admitted"] += 1
+
+    def release(self) -> None:
+        """Free a slot, handing it to the first waiter if there is one."""
+        while self._waiters:
+            _, _, future, _ = self._waiters.pop(0)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def position(self, session_id: str) -> Dict[str, Any]:
+        """Queue position of a session's earliest waiting model call (0: not waiting)."""
+        position = next((i + 1 for i, waiter in enumerate(self._waiters) if waiter[3] == session_id), 0)
+        return {"position": position, "queued": len(self._waiters), "in_flight": self.in_flight}
+
+    def _samples(self):
+        for event, value in self.stats.items():
+            yield "slimpai_admission_events", "Model calls admitted, queued or refused by admission control", {"event": event}, value
+        yield "slimpai_admission_in_flight", "Model calls holding an admission slot", {}, self.in_flight
+        yield "slimpai_admission_queued", "Model calls waiting for an admission slot", {}, len(self._waiters)
+
+
+class ScheduledLlm(BaseLlm):
+    """
+    Runs ``inner`` only after the process's scheduler admits the call.
+
+    A refused call is answered with a RESOURCE_EXHAUSTED error response, which ends the
+    agent's turn with that message instead of raising. The slot is held until the model's
+    final response, not while the tools it calls run.
+    """
+
+    inner: BaseLlm
+
+    def __init__(self, **data):
+        data.setdefault("model", data["inner"].model)
+        super().__init__(**data)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        try:
+            await scheduler.acquire()
+        except AdmissionRejected as e:
+            yield LlmResponse(error_code="RESOURCE_EXHAUSTED", error_message=str(e))
+            return
+        released = False
+        try:
+            async for response in self.inner.generate_content_async(llm_request, stream=stream):
+                if not response.partial and not released:
+                    # ADK runs the response's function calls, subagents included, while this
+                    # generator is suspended at the yield: free the slot before, or the nested
+                    # calls wait for slots their caller is holding
+                    released = True
+                    scheduler.release()
+                yield response
+        finally:
+            if not released:
+                scheduler.release()
+
+
+def schedule_models(root_agent) -> None:
+    """
+    Wrap the model of ``root_agent`` and every subagent reachable through its tools in ScheduledLlm.
+
+    Agents configured with the same model id share one model instance. Wrapping an
+    agent twice has no effect.
+    """
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.agent_tool import AgentTool
+
+    from .models import _as_llm
+
+    shared: Dict[str, BaseLlm] = {}
+    pending, seen = [root_agent], set()
+    while pending:
+        agent = pending.pop()
+        if id(agent) in seen:
+            continue
+        seen.add(id(agent))
+        if isinstance(agent, LlmAgent) and agent.model and not isinstance(agent.model, ScheduledLlm):
+            if isinstance(agent.model, str):
+                if agent.model not in shared:
+                    shared[agent.model] = _as_llm(agent.model)
+                agent.model = ScheduledLlm(inner=shared[agent.model])
+            else:
+                agent.model = ScheduledLlm(inner=agent.model)
+        pending.extend(agent.sub_agents)
+        for tool in getattr(agent, "tools", []):
+            if isinstance(tool, AgentTool):
+                pending.append(tool.agent)
+
+
+def admission_context(callback_context: CallbackContext) -> None:
+    """before_agent_callback for the Guide: attribute this turn's model calls to its session and tenant."""
+    _priority.set(INTERACTIVE)
+    _session_id.set(callback_context.session.id)
+    _tenant.set(tenant_of(callback_context.state))
+    return None
+
+
+@contextmanager
+def background():
+    """Run the model calls made inside the block behind interactive turns."""
+    priority = _priority.set(BACKGROUND)
+    session_id = _session_id.set(None)
+    try:
+        yield
+    finally:
+        _priority.reset(priority)
+        _session_id.reset(session_id)
+
+
+# Shared by every agent model in this process
+scheduler = ModelScheduler.from_env()
+registry.add_collector(lambda: scheduler._samples())
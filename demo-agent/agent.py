@@ -1,17 +1,27 @@
-from google.adk.agents.llm_agent import Agent
-from google.adk.agents import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 import os
-import json
-from google.adk.agents import LlmAgent, SequentialAgent
-from google.adk.tools.agent_tool import AgentTool
-from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents import LlmAgent
 
 from .tools import submit_answer, start_quiz, store_user_info
+from .quiz import planner_request, quiz_fast_path
+from .compaction import compact_history
+from .metrics import instrument
+from .models import load_routes, model_for
+from .cache import CachedAgentTool, content_cache
+from .bank import curriculum_bank
+from .dedup import dedup_index
+from .workflow import GuideWorkflow
+from .prefetch import Prefetcher
+from .mastery import track_topic
+from .admission import admission_context, schedule_models
+from .recorder import record_sessions
 
 #  we need 1. instructions 2. tools 3. llm
 # tools
-GEMINI_MODEL = 'gemini-2.5-flash'
+# Per-agent models (see models.py): lite models for the short templated subagents,
+# escalating to a stronger model when their JSON output does not validate
+MODEL_ROUTES = load_routes()
+# "workflow": the code-driven Guide in workflow.py; "llm": the model decides each step
+GUIDE_MODE = os.getenv("SLIMPAI_GUIDE_MODE", "workflow")
 
 # --- 1. Define the Subagents (Tools) ---
 
@@ -24,16 +34,13 @@ tester_agent = LlmAgent(
     instruction="""
         You are the 'Warm-up Whiz,' a 2nd-grade math teacher. 
         Create a 3-question, multiple-choice baseline test for the topic.
-        After creating the test, you MUST call the `start_quiz` tool to store the quiz state.
-        Give the questions one at a time.
-        Wait for user response before the next question.
-        Whe user answer: Use submit_answer(answer="[user's answer]")
-        Even if the user fails a question, wait till last question to assess their performance overall.
+        Each question has exactly 3 options and a 'correct_answer_index' (0, 1 or 2).
+        After creating the test, you MUST call the `start_quiz` tool with the list of questions to store the quiz state.
         The questions should ramp in difficulty (easy, medium, hard).
         Return ONLY a valid JSON list of question objects. DO NOT add any extra text or prose.
     """,
-    model=GEMINI_MODEL,
-    tools=[start_quiz, submit_answer],
+    model=model_for("Tester", MODEL_ROUTES),
+    tools=[start_quiz],
 )
 
 # Agent 3: Planner (Tool)
@@ -47,7 +54,7 @@ planner_agent = LlmAgent(
         *Skip* any concepts they already know.
         Return ONLY a valid JSON list of lesson title strings. DO NOT add any extra text or prose.
     """,
-    model=GEMINI_MODEL
+    model=model_for("Planner", MODEL_ROUTES)
 )
 
 # Agent 4: Explainer (Tool)
@@ -59,7 +66,7 @@ explainer_agent = LlmAgent(
         Use a simple analogy (like food, animals, or blocks) to explain this concept: 'lesson_step'.
         Keep it under 50 words. Be very encouraging and use emojis! Return ONLY the text.
     """,
-    model=GEMINI_MODEL
+    model=model_for("Explainer", MODEL_ROUTES)
 )
 
 # Agent 5: Quizzer (Tool)
@@ -71,24 +78,41 @@ quizzer_agent = LlmAgent(
         Based *ONLY* on the following text: 'input_text', create one simple multiple-choice question to check for understanding.
         Return ONLY a valid JSON object. DO NOT add any extra text or prose.
     """,
-    model=GEMINI_MODEL
+    model=model_for("Quizzer", MODEL_ROUTES)
+)
+
+# Agent 6: Encourager (Tool, used by the workflow Guide for its free text)
+encourager_agent = LlmAgent(
+    name="Encourager",
+    description="Receives a short description of what a student just achieved and returns one or two warm, encouraging sentences.",
+    instruction="""
+        You are the 'Quest Guide,' a cheerful homeroom teacher for 7-year-olds.
+        Write ONE or TWO short, warm, encouraging sentences with an emoji about what the student just did.
+        Do not ask questions and do not explain any math. Return ONLY the text.
+    """,
+    model=model_for("Encourager", MODEL_ROUTES)
 )
 
 
 # --- 2. Wrap Subagents as Tools ---
 # This is the key step to allow the Guide Agent (an LlmAgent) to call them like functions.
-tester_tool = AgentTool(agent=tester_agent)
-planner_tool = AgentTool(agent=planner_agent)
-explainer_tool = AgentTool(agent=explainer_agent)
-quizzer_tool = AgentTool(agent=quizzer_agent)
+# The tools are cached, so a class asking for the same topic generates the material once;
+# topics pre-generated into the curriculum bank are served without any model call.
+# Topics and lesson steps are keyed on their canonical phrasing (dedup.py), so
+# "Halving numbers" reuses what was generated for "halving".
+tester_tool = CachedAgentTool(agent=tester_agent, cache=content_cache, bank=curriculum_bank, canonicalize=dedup_index.topic)
+planner_tool = CachedAgentTool(agent=planner_agent, cache=content_cache, bank=curriculum_bank, canonicalize=dedup_index.planner_request)
+explainer_tool = CachedAgentTool(agent=explainer_agent, cache=content_cache, bank=curriculum_bank, canonicalize=dedup_index.step)
+quizzer_tool = CachedAgentTool(agent=quizzer_agent, cache=content_cache, bank=curriculum_bank)
+encourager_tool = CachedAgentTool(agent=encourager_agent, cache=content_cache)
+# Generates upcoming lesson steps into the cache while the student answers the current one
+prefetcher = Prefetcher.from_env(explainer_tool, quizzer_tool)
 
 
 # --- 3. Define the Root Agent (The Orchestrator) ---
-# Agent 1: Guide (The Supervisor)
-root_agent = LlmAgent(
-    name="Guide",
-    description="The friendly, encouraging 'homeroom teacher' that guides the user through the lesson flow. Its sole job is to call the other specialized tools in the correct, sequential order.",
-    instruction="""
+# Only the Guide selected by GUIDE_MODE is built at import; the other one is built
+# the first time it is accessed (e.g. by bench_load --guide), see __getattr__ below.
+GUIDE_INSTRUCTION = """
 
         You are the 'Quest Guide' and 'Homeroom Teacher,' a highly encouraging and friendly AI assistant. Your **ONLY** job is to orchestrate the learning flow using your specialized tools and provide all the positive, connective text to the user.
 
@@ -103,17 +127,17 @@ root_agent = LlmAgent(
               Once you have the number, ask for their name; Once you have the name, ask for their group. Use the collected name in your next response to personalize the greeting.
             * **Third Action:** Wait for the user to provide current topic. Once received, store these details in the session state (e.g., 'name', 'student_number', 'group').
             * **Fourth Action:** Confirm the current topic with the student.
-            * **Fifth Action:** Immediately use the **`tester_tool()`** with the current topic to generate the diagnostic test. **Do NOT write the test yourself.**
-            * **Sixth Action:** Present the test questions to the user. State clearly that you are waiting for their answers to proceed.
+            * **Fifth Action:** Immediately use the **`tester_tool()`** with ONLY the topic name as the request (e.g. "halving") to generate the diagnostic test. **Do NOT write the test yourself.**
+            * **Sixth Action:** Present ONLY the first test question with its lettered options (A, B, C). State clearly that you are waiting for their answer to proceed.
 
         2.  **PROCESSING TEST RESULTS:**
-            * Once the user provides their answers, you will validate them and store the result (correct/incorrect for each question) in the session state as 'test_results_json'.
-            * For the question the user failed, next, you **MUST** use the **`planner_tool()`** at the end of the 3 questions on the areas the user got wrong  with the topic and the new 'test_results_json' to get the personalized list of lesson steps. Store this plan in the session state as 'lesson_plan'.
+            * Answers are graded by the system, never by you. Most answers are handled automatically; if the user's answer reaches you while the quiz is running, call **`submit_answer(answer=...)`** with their reply and present the `next_question` it returns, or ask them to pick a letter if the status is "unrecognized".
+            * When the quiz is finished, the system gives you its 'test_results_json' (in the grading note or the `submit_answer` result). Next, you **MUST** use the **`planner_tool()`** with the request formatted exactly as "Topic: <topic>\nResults: <test_results_json>" to get the personalized list of lesson steps for the areas the user got wrong. Store this plan in the session state as 'lesson_plan'.
             * Provide an encouraging transition (e.g., "Great job finishing the quiz, student_name! Based on that, I've designed your custom learning path.").
 
         3.  **THE LESSON LOOP (Iterating through 'lesson_plan'):**
             * For each lesson step in the 'lesson_plan', you must follow this sequence:
-                a. **EXPLAIN:** Use the **`explainer_tool()`** with the lesson step to get a fun, analogy-based explanation.
+                a. **EXPLAIN:** Use the **`explainer_tool()`** with the EXACT lesson step title as the request to get a fun, analogy-based explanation.
                 b. **PRESENT:** Print the explanation to the user. Add a comment like "Professor Pizza says:" to introduce it, and then be encouraging.
                 c. **QUIZ:** Immediately use the **`quizzer_tool()`** with the **EXACT text** from the Explainer's response to get a check-for-understanding question. **Do NOT write the question yourself.**
                 d. **EVALUATE:** Present the quiz question and wait for the user's answer. Provide feedback (e.g., "Perfect!" or "Let's review that pizza concept.") before moving to the next lesson step.
@@ -126,13 +150,68 @@ root_agent = LlmAgent(
         * **DO NOT GENERATE CONTENT:** Your core instruction is to use the four specialized tools for **all** testing, planning, explaining, and quizzing. Your words should only be for flow and encouragement.
 
 
-    """,
-    model=GEMINI_MODEL,
-    # Make all subagents available as tools
-    tools=[tester_tool, planner_tool, explainer_tool, quizzer_tool, store_user_info],
-    # The ADK automatically manages session state (current_topic, test_results, etc.)
-    # which the LlmAgent's prompt can reference when deciding which tool to call.
-)
+    """
+
+
+def _build_llm_guide() -> LlmAgent:
+    """Agent 1: Guide (The Supervisor), LLM-driven."""
+    return LlmAgent(
+        name="Guide",
+        description="The friendly, encouraging 'homeroom teacher' that guides the user through the lesson flow. Its sole job is to call the other specialized tools in the correct, sequential order.",
+        instruction=GUIDE_INSTRUCTION,
+        model=model_for("Guide", MODEL_ROUTES),
+        # Make all subagents available as tools
+        tools=[tester_tool, planner_tool, explainer_tool, quizzer_tool, store_user_info, submit_answer],
+        # Grade routine quiz answers locally instead of spending a model call on them
+        before_model_callback=[quiz_fast_path, compact_history],
+        # Attribute the turn's model calls to the session and its class for admission control
+        before_agent_callback=admission_context,
+        # Prefetch later lesson steps once the plan is known; remember the topic for the mastery log
+        before_tool_callback=prefetcher.before_tool_callback,
+        after_tool_callback=[prefetcher.after_tool_callback, track_topic],
+        # The ADK automatically manages session state (current_topic, test_results, etc.)
+        # which the LlmAgent's prompt can reference when deciding which tool to call.
+    )
+
+
+def _build_guide_workflow() -> GuideWorkflow:
+    """
+    Agent 1: Guide, code-driven: the same flow as an explicit state machine, with the
+    model used only for encouragement (about half the model calls per turn).
+    """
+    return GuideWorkflow(
+        name="Guide",
+        description="Guides the student through info collection, the diagnostic quiz, the lesson plan and the lesson loop.",
+        tester_tool=tester_tool,
+        planner_tool=planner_tool,
+        explainer_tool=explainer_tool,
+        quizzer_tool=quizzer_tool,
+        encourager_tool=encourager_tool,
+        prefetcher=prefetcher,
+        before_agent_callback=admission_context,
+    )
+
+
+_GUIDE_BUILDERS = {"llm_guide": _build_llm_guide, "guide_workflow": _build_guide_workflow}
+
+
+def __getattr__(name: str):
+    """Build ``llm_guide`` / ``guide_workflow`` on first access (PEP 562)."""
+    builder = _GUIDE_BUILDERS.get(name)
+    if builder is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    guide = builder()
+    # Record latency, tokens and tool calls for the Guide and every subagent
+    instrument(guide)
+    # Queue and rate-limit every model call behind one scheduler per process
+    schedule_models(guide)
+    # Append sampled sessions to SLIMPAI_RECORD_LOG for offline replay (replay.py)
+    record_sessions(guide, "llm" if name == "llm_guide" else "workflow")
+    globals()[name] = guide
+    return guide
+
+
+root_agent = __getattr__("llm_guide" if GUIDE_MODE == "llm" else "guide_workflow")
 
 # --- 4. System Usage (Conceptual) ---
 
@@ -4,11 +4,25 @@ import asyncio
 import os
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable
+
+from adk_client import AdkClient, AdkApiError, StreamingUnavailable
+from transcript import Transcript, TranscriptStore, page_markdown
 
 # Configuration
 ADK_API_URL = os.getenv("ADK_API_URL", "http://localhost:8000")
-API_ENDPOINT = f"{ADK_API_URL}/run"
+STREAMING_ENABLED = os.getenv("ADK_STREAMING", "true").lower() in ("1", "true", "yes")
+
+# Friendly progress labels shown while the Guide calls its subagent tools
+TOOL_PROGRESS_LABELS = {
+    "Tester": "📝 Preparing your warm-up quiz...",
+    "Planner": "🗺️ Designing your learning path...",
+    "Explainer": "🍕 Professor Pizza is thinking...",
+    "Quizzer": "❓ The Question Captain is writing a question...",
+    "store_user_info": "💾 Saving your details...",
+    "submit_answer": "✅ Checking your answer...",
+    "Encourager": "🌟 Cheering you on...",
+}
 
 # Page configuration
 st.set_page_config(
@@ -52,64 +66,78 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+
+@st.cache_resource
+def get_transcript_store() -> TranscriptStore:
+    """
+    Return the store of older chat messages shared by every browser session.
+    
+    Configured with CHAT_HISTORY_DB and CHAT_HISTORY_TTL.
+    """
+    return TranscriptStore.from_env()
+
+
 # Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
 if "session_id" not in st.session_state:
     st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+if "transcript" not in st.session_state:
+    st.session_state.transcript = Transcript.from_env(st.session_state.session_id, get_transcript_store())
+if "history_page" not in st.session_state:
+    st.session_state.history_page = 0
 if "user_id" not in st.session_state:
     st.session_state.user_id = "user_1"
 if "app_name" not in st.session_state:
     st.session_state.app_name = "demo-agent"
 if "session_created" not in st.session_state:
     st.session_state.session_created = False
+if "sse_supported" not in st.session_state:
+    st.session_state.sse_supported = STREAMING_ENABLED
+
+
+@st.cache_resource
+def get_adk_client() -> AdkClient:
+    """
+    Return the pooled ADK client shared by every script rerun and browser session.
+    
+    Pool size and timeouts are configured with ADK_POOL_LIMIT, ADK_POOL_LIMIT_PER_HOST,
+    ADK_KEEPALIVE_TIMEOUT, ADK_CONNECT_TIMEOUT and ADK_REQUEST_TIMEOUT.
+    """
+    return AdkClient.from_env(ADK_API_URL)
 
 
-async def create_session() -> bool:
+def create_session() -> bool:
     """
     Create a new session with the ADK API server.
     
     Returns:
         True if session was created successfully, False otherwise
     """
-    session_url = f"{ADK_API_URL}/apps/{st.session_state.app_name}/users/{st.session_state.user_id}/sessions/{st.session_state.session_id}"
-    
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                session_url,
-                json={"state": {}},
-                headers={"Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                if response.status in [200, 201]:
-                    return True
-                else:
-                    error_text = await response.text()
-                    st.error(f"Failed to create session ({response.status}): {error_text}")
-                    return False
+        get_adk_client().create_session(
+            st.session_state.app_name,
+            st.session_state.user_id,
+            st.session_state.session_id,
+        )
+        return True
+    except AdkApiError as e:
+        st.error(f"Failed to create session ({e.status}): {e.text}")
+        return False
     except Exception as e:
         st.error(f"Error creating session: {str(e)}")
         return False
 
 
-async def send_message_to_adk(message: str) -> Optional[str]:
-    """
-    Send a message to the ADK API server and return the response.
-    
-    Args:
-        message: The user's message to send
-        
-    Returns:
-        The agent's response text, or None if there was an error
-    """
-    # Create session if not already created
+def ensure_session() -> bool:
+    """Create the server-side session on the first message of a chat."""
     if not st.session_state.session_created:
-        success = await create_session()
-        if not success:
-            return None
+        if not create_session():
+            return False
         st.session_state.session_created = True
-    
+    return True
+
+
+def build_run_payload(message: str, streaming: bool = False) -> Dict[str, Any]:
+    """Build the request body shared by the /run and /run_sse endpoints."""
     payload = {
         "app_name": st.session_state.app_name,
         "user_id": st.session_state.user_id,
@@ -119,55 +147,169 @@ async def send_message_to_adk(message: str) -> Optional[str]:
             "parts": [{"text": message}]
         }
     }
+    if streaming:
+        payload["streaming"] = True
+    return payload
+
+
+def send_message_to_adk(message: str) -> Optional[str]:
+    """
+    Send a message to the ADK API server and return the response.
+    
+    Args:
+        message: The user's message to send
+        
+    Returns:
+        The agent's response text, or None if there was an error
+    """
+    if not ensure_session():
+        return None
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                API_ENDPOINT,
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=60)
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    # Handle event list response format from /run endpoint
-                    if isinstance(data, list):
-                        # Extract text from the last model response in the event list
-                        for event in reversed(data):
-                            if isinstance(event, dict) and "content" in event:
-                                content = event["content"]
-                                if "parts" in content and content.get("role") == "model":
-                                    parts = content["parts"]
-                                    # Collect all text parts
-                                    text_parts = []
-                                    for part in parts:
-                                        if "text" in part:
-                                            text_parts.append(part["text"])
-                                    if text_parts:
-                                        return "\n".join(text_parts)
-                        return "No response from agent"
-                    
-                    # Handle other possible response formats
-                    elif isinstance(data, dict):
-                        if "response" in data and "parts" in data["response"]:
-                            parts = data["response"]["parts"]
-                            if parts and len(parts) > 0 and "text" in parts[0]:
-                                return parts[0]["text"]
-                        elif "final_response" in data:
-                            return data["final_response"]
-                        elif "text" in data:
-                            return data["text"]
-                        else:
-                            st.error(f"Unexpected response format: {json.dumps(data, indent=2)}")
-                            return None
-                    else:
-                        st.error(f"Unexpected response type: {type(data)}")
-                        return None
-                else:
-                    error_text = await response.text()
-                    st.error(f"API Error ({response.status}): {error_text}")
-                    return None
+        data = get_adk_client().run(build_run_payload(message))
+        
+        # Handle event list response format from /run endpoint
+        if isinstance(data, list):
+            # Extract text from the last model response in the event list
+            for event in reversed(data):
+                if isinstance(event, dict) and "content" in event:
+                    content = event["content"]
+                    if "parts" in content and content.get("role") == "model":
+                        parts = content["parts"]
+                        # Collect all text parts
+                        text_parts = []
+                        for part in parts:
+                            if "text" in part:
+                                text_parts.append(part["text"])
+                        if text_parts:
+                            return "\n".join(text_parts)
+            return "No response from agent"
+        
+        # Handle other possible response formats
+        elif isinstance(data, dict):
+            if "response" in data and "parts" in data["response"]:
+                parts = data["response"]["parts"]
+                if parts and len(parts) > 0 and "text" in parts[0]:
+                    return parts[0]["text"]
+            elif "final_response" in data:
+                return data["final_response"]
+            elif "text" in data:
+                return data["text"]
+            else:
+                st.error(f"Unexpected response format: {json.dumps(data, indent=2)}")
+                return None
+        else:
+            st.error(f"Unexpected response type: {type(data)}")
+            return None
                     
+    except AdkApiError as e:
+        st.error(f"API Error ({e.status}): {e.text}")
+        return None
+    except aiohttp.ClientConnectorError:
+        st.error(f"❌ Cannot connect to ADK API server at {ADK_API_URL}")
+        st.info("Please ensure the ADK API server is running and accessible.")
+        return None
+    except asyncio.TimeoutError:
+        st.error("⏱️ Request timed out. The server took too long to respond.")
+        return None
+    except Exception as e:
+        st.error(f"❌ Error communicating with ADK API: {str(e)}")
+        return None
+
+
+def extract_model_text(event: Dict[str, Any]) -> Optional[str]:
+    """
+    Return the joined text parts of a model event, or None if it has no text.
+    """
+    content = event.get("content")
+    if not isinstance(content, dict) or content.get("role") != "model":
+        return None
+    text_parts = [part["text"] for part in content.get("parts", []) if part.get("text") and not part.get("thought")]
+    if not text_parts:
+        return None
+    return "".join(text_parts) if event.get("partial") else "\n".join(text_parts)
+
+
+def extract_tool_calls(event: Dict[str, Any]) -> list:
+    """
+    Return the names of the tools the agent is calling in this event.
+    """
+    content = event.get("content")
+    if not isinstance(content, dict):
+        return []
+    return [part["functionCall"].get("name", "") for part in content.get("parts", []) if "functionCall" in part]
+
+
+def stream_message_to_adk(
+    message: str,
+    on_text: Callable[[str], None],
+    on_progress: Callable[[str], None],
+) -> Optional[str]:
+    """
+    Send a message to the ADK /run_sse endpoint and render the response as it arrives.
+    
+    Partial model text is passed to ``on_text`` as it streams in, and tool calls made
+    by the Guide are reported through ``on_progress``. Falls back to the blocking
+    /run endpoint when the server does not support SSE.
+    
+    Args:
+        message: The user's message to send
+        on_text: Called with the full text of the current model message so far
+        on_progress: Called with a short status line whenever a tool is invoked
+        
+    Returns:
+        The agent's final response text, or None if there was an error
+    """
+    if not st.session_state.sse_supported:
+        return send_message_to_adk(message)
+    
+    if not ensure_session():
+        return None
+    
+    final_text = None
+    streaming_text = ""
+    client = get_adk_client()
+    
+    def show_queue_position():
+        # While the server is quiet, tell the student if their turn is waiting in line
+        status = client.queue_position(st.session_state.app_name, st.session_state.user_id, st.session_state.session_id)
+        if status and status.get("position"):
+            on_progress(f"⏳ Lots of students are learning right now! You're number {status['position']} in line...")
+    
+    try:
+        for event in client.stream(build_run_payload(message, streaming=True), on_idle=show_queue_position):
+            if "error" in event and "content" not in event:
+                st.error(f"❌ Agent error: {event['error']}")
+                return final_text
+            if event.get("errorCode") == "RESOURCE_EXHAUSTED":
+                # Refused by the server's admission control instead of timing out
+                st.warning(f"⏳ {event.get('errorMessage') or 'The class is very busy right now.'}")
+                return final_text
+            
+            for tool_name in extract_tool_calls(event):
+                on_progress(TOOL_PROGRESS_LABELS.get(tool_name, f"🔧 Working on {tool_name}..."))
+            
+            text = extract_model_text(event)
+            if text is None:
+                continue
+            if event.get("partial"):
+                streaming_text += text
+                on_text(streaming_text)
+            else:
+                # The aggregated, non-partial event carries the complete message
+                final_text = text
+                streaming_text = ""
+                on_text(final_text)
+        
+        return final_text if final_text is not None else (streaming_text or "No response from agent")
+    
+    except StreamingUnavailable:
+        # Older servers without SSE support: remember and use /run instead
+        st.session_state.sse_supported = False
+        return send_message_to_adk(message)
+    except AdkApiError as e:
+        st.error(f"API Error ({e.status}): {e.text}")
+        return None
     except aiohttp.ClientConnectorError:
         st.error(f"❌ Cannot connect to ADK API server at {ADK_API_URL}")
         st.info("Please ensure the ADK API server is running and accessible.")
@@ -182,8 +324,10 @@ async def send_message_to_adk(message: str) -> Optional[str]:
 
 def reset_session():
     """Reset the current session and start a new one."""
-    st.session_state.messages = []
+    st.session_state.transcript.clear()
     st.session_state.session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    st.session_state.transcript = Transcript.from_env(st.session_state.session_id, get_transcript_store())
+    st.session_state.history_page = 0
     st.session_state.session_created = False
     st.rerun()
 
@@ -197,7 +341,7 @@ with st.sidebar:
     st.subheader("📋 Session Info")
     st.text(f"Session ID: {st.session_state.session_id}")
     st.text(f"User ID: {st.session_state.user_id}")
-    st.text(f"Messages: {len(st.session_state.messages)}")
+    st.text(f"Messages: {len(st.session_state.transcript)}")
     
     st.markdown("---")
     
@@ -205,23 +349,12 @@ with st.sidebar:
     st.subheader("⚙️ API Configuration")
     st.text(f"API URL: {ADK_API_URL}")
     st.text(f"App Name: {st.session_state.app_name}")
-    st.text(f"Endpoint: /run")
+    st.text(f"Endpoint: {'/run_sse' if st.session_state.sse_supported else '/run'}")
     
     # Connection test
     if st.button("🔌 Test Connection"):
         with st.spinner("Testing connection..."):
-            async def test_connection():
-                try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(
-                            ADK_API_URL,
-                            timeout=aiohttp.ClientTimeout(total=5)
-                        ) as response:
-                            return response.status
-                except Exception as e:
-                    return None
-            
-            status = asyncio.run(test_connection())
+            status = get_adk_client().ping(timeout=5)
             if status:
                 st.success(f"✅ Server is reachable (Status: {status})")
             else:
@@ -235,7 +368,8 @@ with st.sidebar:
         reset_session()
     
     if st.button("🗑️ Clear Chat", use_container_width=True):
-        st.session_state.messages = []
+        st.session_state.transcript.clear()
+        st.session_state.history_page = 0
         st.rerun()
     
     st.markdown("---")
@@ -256,11 +390,41 @@ with st.sidebar:
     st.caption(f"ADK API Server: {ADK_API_URL}")
 
 
+def render_earlier_messages(transcript: Transcript):
+    """
+    Show messages that have left the window, one page at a time, only when asked for.
+    
+    Each page is read from the transcript store and rendered as a single markdown element.
+    """
+    if not transcript.archived:
+        return
+    page = st.session_state.history_page
+    if not page:
+        if st.button(f"⬆️ Show earlier messages ({transcript.archived})"):
+            st.session_state.history_page = 1
+            st.rerun()
+        return
+    with st.container(border=True):
+        columns = st.columns(3)
+        if page < transcript.pages and columns[0].button("⬆️ Older"):
+            st.session_state.history_page = page + 1
+            st.rerun()
+        if page > 1 and columns[1].button("⬇️ Newer"):
+            st.session_state.history_page = page - 1
+            st.rerun()
+        if columns[2].button("✖️ Hide earlier messages"):
+            st.session_state.history_page = 0
+            st.rerun()
+        st.caption(f"Earlier messages, page {page} of {transcript.pages}")
+        st.markdown(page_markdown(transcript.page(page)))
+
+
 # Main chat interface
 st.title("💬 Math Learning Chat")
+transcript = st.session_state.transcript
 
 # Display welcome message if no messages
-if len(st.session_state.messages) == 0:
+if len(transcript) == 0:
     st.markdown("""
     <div class="info-box">
         <h3>👋 Welcome to the Math Learning Assistant!</h3>
@@ -276,32 +440,45 @@ if len(st.session_state.messages) == 0:
     </div>
     """, unsafe_allow_html=True)
 
-# Display chat messages
-for message in st.session_state.messages:
+# Display chat messages: only the window is rendered on every rerun
+render_earlier_messages(transcript)
+for message in transcript.recent:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
 # Chat input
 if prompt := st.chat_input("Type your message here..."):
     # Add user message to chat
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    transcript.append("user", prompt)
     
     # Display user message
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Get assistant response
+    # Get assistant response, rendering partial text and tool progress as it streams in
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = asyncio.run(send_message_to_adk(prompt))
-            
-            if response:
-                st.markdown(response)
-                st.session_state.messages.append({"role": "assistant", "content": response})
-            else:
-                error_msg = "I'm having trouble connecting to the learning system. Please check the connection and try again."
-                st.error(error_msg)
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        progress_placeholder = st.empty()
+        text_placeholder = st.empty()
+        progress_placeholder.caption("💭 Thinking...")
+        
+        def on_text(text: str):
+            progress_placeholder.empty()
+            text_placeholder.markdown(text + " ▌")
+        
+        def on_progress(label: str):
+            progress_placeholder.caption(label)
+        
+        response = stream_message_to_adk(prompt, on_text, on_progress)
+        progress_placeholder.empty()
+        
+        if response:
+            text_placeholder.markdown(response)
+            transcript.append("assistant", response)
+        else:
+            text_placeholder.empty()
+            error_msg = "I'm having trouble connecting to the learning system. Please check the connection and try again."
+            st.error(error_msg)
+            transcript.append("assistant", error_msg)
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,217 @@
+"""
+Precomputed curriculum bank.
+
+The bank is built offline by running the Tester, Planner, Explainer and Quizzer
+agents over a list of topics, and is then served at runtime by the cached agent
+tools without calling the model. On disk it is a directory with two files:
+
+    bank.jsonl   one generated entry per line (agent, request, result, state delta and
+                 the questions it refers to)
+    index.json   cache key -> [byte offset, length] into bank.jsonl, plus a per-topic summary
+
+Usage:
+    python -m demo-agent.bank generate --topics topics.txt --out curriculum_bank --concurrency 4
+    python -m demo-agent.bank show --bank curriculum_bank
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from . import progress
+from . import quiz as quiz_engine
+
+BANK_FILE = "bank.jsonl"
+INDEX_FILE = "index.json"
+
+
+class CurriculumBank:
+    """
+    Read-only view of a generated bank directory.
+
+    The index is loaded on first lookup; entries are read by seeking into the JSONL
+    file, so only the small index is held in memory.
+    """
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self._index: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def from_env(cls) -> "CurriculumBank":
+        """Open the bank named by SLIMPAI_BANK_DIR (default: ./curriculum_bank)."""
+        return cls(os.getenv("SLIMPAI_BANK_DIR", "curriculum_bank") or None)
+
+    def _load_index(self) -> Dict[str, Any]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    path = os.path.join(self.directory, INDEX_FILE) if self.directory else None
+                    if path and os.path.exists(path):
+                        with open(path, encoding="utf-8") as f:
+                            self._index = json.load(f)
+                    else:
+                        self._index = {"entries": {}, "topics": {}}
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self._load_index()["entries"])
+
+    @property
+    def topics(self) -> Dict[str, Any]:
+        """Per-topic summary: question count, plan count and lesson steps."""
+        return self._load_index()["topics"]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the entry stored under a cache key, or None if the bank has none."""
+        location = self._load_index()["entries"].get(key)
+        if location is None:
+            self.stats["misses"] += 1
+            return None
+        offset, length = location
+        with open(os.path.join(self.directory, BANK_FILE), "rb") as f:
+            f.seek(offset)
+            entry = json.loads(f.read(length))
+        self.stats["hits"] += 1
+        return entry
+
+
+class BankWriter:
+    """Appends generated entries to a new bank directory and writes its index."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, BANK_FILE)
+        self._file = open(self._path + ".tmp", "wb")
+        self._entries: Dict[str, List[int]] = {}
+        self.topics: Dict[str, Any] = {}
+
+    def add(self, key: str, agent: str, request: str, result: Any, state_delta: Dict[str, Any]) -> None:
+        if key in self._entries:
+            return
+        line = json.dumps(
+            {"key": key, "agent": agent, "request": request, "result": result, **progress.share(state_delta)},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        self._entries[key] = [self._file.tell(), len(line)]
+        self._file.write(line + b"\n")
+
+    def close(self) -> None:
+        """Flush the entries and atomically replace any previous bank in the directory."""
+        self._file.close()
+        os.replace(self._path + ".tmp", self._path)
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"entries": self._entries, "topics": self.topics}, f, separators=(",", ":"))
+        os.replace(index_path + ".tmp", index_path)
+
+
+def result_patterns(questions: List[Dict[str, Any]]) -> List[str]:
+    """Every possible 'test_results_json' for a quiz (2^n right/wrong combinations)."""
+    patterns = []
+    for outcome in itertools.product([False, True], repeat=len(questions)):
+        results = [{"question": q["question"], "is_correct": ok} for q, ok in zip(questions, outcome)]
+        patterns.append(quiz_engine.format_results(results))
+    return patterns
+
+
+async def generate_bank(topics: List[str], out_dir: str, concurrency: int = 4) -> Dict[str, Any]:
+    """
+    Generate diagnostics, lesson plans, explanations and check questions for topics.
+
+    Every model call goes through one semaphore, so at most ``concurrency`` calls are
+    in flight across all topics. Entries are keyed exactly like the cached agent
+    tools key their runtime calls, so the Guide finds them without calling the model.
+
+    Returns:
+        Dict[str, Any]: The per-topic summary written to the index.
+    """
+    from . import agent as agents
+    from .admission import background
+    from .runner import run_agent_once
+
+    writer = BankWriter(out_dir)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(tool, request: str) -> Any:
+        async with semaphore:
+            with background():
+                result, state_delta = await run_agent_once(tool.agent, request)
+        if tool.cacheable(result):
+            writer.add(tool.cache_key({"request": request}, canonical=False), tool.agent.name, request, result, state_delta)
+        return result
+
+    async def explain_and_check(step: str) -> None:
+        explanation = await generate(agents.explainer_tool, step)
+        if explanation:
+            await generate(agents.quizzer_tool, explanation)
+
+    async def build_topic(topic: str) -> None:
+        try:
+            questions = quiz_engine.validate_quiz(await generate(agents.tester_tool, topic))
+        except quiz_engine.QuizError as e:
+            print(f"Skipping '{topic}': diagnostic quiz is invalid ({e})")
+            return
+
+        plans = await asyncio.gather(*(
+            generate(agents.planner_tool, agents.planner_request(topic, pattern))
+            for pattern in result_patterns(questions)
+        ))
+        steps = []
+        for plan in plans:
+            try:
+                for step in json.loads(plan):
+                    if isinstance(step, str) and step not in steps:
+                        steps.append(step)
+            except (json.JSONDecodeError, TypeError):
+                continue
+
+        await asyncio.gather(*(explain_and_check(step) for step in steps))
+        writer.topics[topic] = {"questions": len(questions), "plans": len(plans), "steps": steps}
+        print(f"Generated '{topic}': {len(plans)} plans, {len(steps)} lesson steps")
+
+    try:
+        await asyncio.gather(*(build_topic(topic) for topic in topics))
+    finally:
+        writer.close()
+    return writer.topics
+
+
+# Shared by the cached agent tools in this process
+curriculum_bank = CurriculumBank.from_env()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.bank", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_cmd = commands.add_parser("generate", help="Pre-generate content for a list of topics")
+    generate_cmd.add_argument("--topics", required=True, help="Text file with one topic per line")
+    generate_cmd.add_argument("--out", default="curriculum_bank", help="Bank directory to write")
+    generate_cmd.add_argument("--concurrency", type=int, default=4, help="Maximum model calls in flight")
+
+    show_cmd = commands.add_parser("show", help="Summarize an existing bank")
+    show_cmd.add_argument("--bank", default="curriculum_bank", help="Bank directory to read")
+
+    args = parser.parse_args(argv)
+    if args.command == "generate":
+        import dotenv
+        dotenv.load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
+        with open(args.topics, encoding="utf-8") as f:
+            topics = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        asyncio.run(generate_bank(topics, args.out, args.concurrency))
+    else:
+        bank = CurriculumBank(args.bank)
+        print(f"{len(bank)} entries in {args.bank}")
+        for topic, summary in bank.topics.items():
+            print(f"- {topic}: {summary['plans']} plans, {len(summary['steps'])} lesson steps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Load and latency benchmark for the Guide flow, run against a local fake model.
+
+Drives many concurrent simulated students through info collection, the diagnostic
+quiz, planning and the lesson loop via Runner.run_async, and reports turn latency
+percentiles, throughput, tool calls, model calls and prompt tokens per session, the
+bytes of session state written per turn and kept per session, and memory per session.
+No network access or credentials are needed.
+
+Usage:
+    python -m demo-agent.bench_load --students 30 --latency 0.2 --jitter 0.1
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from . import agent as agents
+from . import mastery, progress
+from .cache import ContentCache, coalesce_stats
+from .compaction import compaction_stats
+from .metrics import percentile
+from .fake_llm import FakeLlm, install_fake_llm
+
+APP_NAME = "slimpai_bench"
+
+
+def student_script(number: int, rng: random.Random) -> List[str]:
+    """The messages one simulated student sends, in order."""
+    messages = ["Hi!", f"S{number:04d}, Student {number}, group 2", "halving"]
+    messages += [rng.choice("ABC") for _ in range(3)]
+    # One answer per lesson step (the fake Planner returns at most three steps)
+    messages += [rng.choice("ABC") for _ in range(3)]
+    return messages
+
+
+async def run_student(runner: Runner, number: int, rng: random.Random, think_time: float = 0.0) -> Dict[str, Any]:
+    """Play one student's conversation; return per-turn latencies, tool calls and state sizes."""
+    user_id = f"student_{number}"
+    session = await runner.session_service.create_session(app_name=APP_NAME, user_id=user_id)
+    latencies = []
+    tool_calls: Counter = Counter()
+    delta_bytes = 0
+    for turn, message in enumerate(student_script(number, rng)):
+        if turn and think_time:
+            # Time the student spends reading and answering (not counted as latency)
+            await asyncio.sleep(think_time)
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+        started = time.perf_counter()
+        async for event in runner.run_async(user_id=user_id, session_id=session.id, new_message=content):
+            for call in event.get_function_calls():
+                tool_calls[call.name] += 1
+            if event.actions and event.actions.state_delta:
+                delta_bytes += len(json.dumps(event.actions.state_delta, default=str))
+        latencies.append(time.perf_counter() - started)
+    session = await runner.session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session.id)
+    state_bytes = len(json.dumps(session.state, default=str))
+    return {"latencies": latencies, "tool_calls": tool_calls, "delta_bytes": delta_bytes, "state_bytes": state_bytes}
+
+
+async def run_benchmark(
+    students: int,
+    latency: float,
+    jitter: float,
+    concurrency: int,
+    use_cache: bool,
+    seed: int,
+    trace_memory: bool = False,
+    guide: str = "workflow",
+    think_time: float = 0.0,
+    coalesce: bool = True,
+) -> Dict[str, Any]:
+    """Run ``students`` simulated conversations and aggregate their measurements."""
+    root_agent = agents.llm_guide if guide == "llm" else agents.guide_workflow
+    fake = FakeLlm(latency=latency, jitter=jitter)
+    install_fake_llm(root_agent, fake)
+    cache = ContentCache(path=None, memory_size=512 if use_cache else 0)
+    for tool in (agents.tester_tool, agents.planner_tool, agents.explainer_tool, agents.quizzer_tool, agents.encourager_tool):
+        tool.cache = cache
+        tool.bank = None
+        tool.coalesce = coalesce
+    coalesce_before = dict(coalesce_stats)
+    prefetch_before = dict(agents.prefetcher.stats)
+    # Keep simulated students out of the real answer history
+    mastery.mastery_store = mastery.MasteryStore(path=None)
+    progress.question_store = progress.QuestionStore(path=None)
+
+    runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=InMemorySessionService())
+    semaphore = asyncio.Semaphore(concurrency or students)
+    rng = random.Random(seed)
+
+    async def bounded(number: int) -> Dict[str, Any]:
+        async with semaphore:
+            return await run_student(runner, number, random.Random(rng.random()), think_time)
+
+    gc.collect()
+    if trace_memory:
+        # Exact, but tracing slows every allocation and inflates the latency numbers
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    else:
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    started = time.perf_counter()
+    results = await asyncio.gather(*(bounded(n) for n in range(students)))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    if trace_memory:
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+    else:
+        retained = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - baseline
+
+    latencies = [t for r in results for t in r["latencies"]]
+    tool_calls: Counter = sum((r["tool_calls"] for r in results), Counter())
+    return {
+        "guide": guide,
+        "students": students,
+        "turns": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "tool_calls_per_session": {name: round(count / students, 2) for name, count in sorted(tool_calls.items())},
+        "model_calls_per_session": {name: round(count / students, 2) for name, count in sorted(fake.calls.items())},
+        "prompt_tokens_per_turn": {name: round(count / len(latencies), 1) for name, count in sorted(fake.prompt_tokens.items())},
+        "state_bytes": {
+            "delta_per_turn": round(sum(r["delta_bytes"] for r in results) / len(latencies)),
+            "per_session": round(sum(r["state_bytes"] for r in results) / students),
+        },
+        "cache": dict(cache.stats),
+        "coalesced_calls": {
+            f"{agent}:{outcome}": value - coalesce_before.get((agent, outcome), 0)
+            for (agent, outcome), value in sorted(coalesce_stats.items())
+            if value > coalesce_before.get((agent, outcome), 0)
+        },
+        "history_compaction": dict(compaction_stats),
+        "prefetch": {k: v - prefetch_before[k] for k, v in agents.prefetcher.stats.items()},
+        "memory_per_session_kb": round(retained / students / 1024, 1),
+        "memory_method": "tracemalloc" if trace_memory else "peak_rss_delta",
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.bench_load", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--students", type=int, default=30, help="Number of simulated students")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per fake model call")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Extra random seconds per model call")
+    parser.add_argument("--concurrency", type=int, default=0, help="Students in flight at once (0 = all)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the content cache")
+    parser.add_argument("--no-coalesce", action="store_true", help="Let identical concurrent subagent calls each call the model")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for student answers")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure memory with tracemalloc (slower)")
+    parser.add_argument("--guide", choices=("workflow", "llm"), default="workflow", help="Which Guide to drive")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds each student waits before replying")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_benchmark(
+        args.students, args.latency, args.jitter, args.concurrency, not args.no_cache, args.seed,
+        args.trace_memory, args.guide, args.think_time, not args.no_coalesce,
+    ))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
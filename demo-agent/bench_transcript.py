@@ -0,0 +1,90 @@
+"""
+Rerun-time benchmark for the Streamlit chat, against transcript length.
+
+For each transcript length, fills a chat with that many messages and times script
+reruns of app.py (Streamlit's AppTest, no browser or backend needed) twice: with the
+windowed transcript, and with every message rendered (window 0, the old behaviour).
+Reports the median rerun time, the elements rendered per rerun and the message bytes
+kept in the browser session's state.
+
+Usage:
+    python -m demo-agent.bench_transcript --lengths 20 200 2000 --window 40
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict
+
+from streamlit.testing.v1 import AppTest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# app.py imports its helpers as top-level modules (streamlit puts the script's
+# directory on sys.path); the benchmark must share that module, not a copy
+sys.path.insert(0, HERE)
+from transcript import Transcript, TranscriptStore  # noqa: E402
+
+APP_PATH = os.path.join(HERE, "app.py")
+
+SAMPLE_REPLY = (
+    "Great job! 🍕 Think of a fraction like a pizza cut into **equal slices**.\n\n"
+    "- The bottom number says how many slices the pizza has\n"
+    "- The top number says how many slices you take\n\n"
+    "So 3/8 means the pizza has 8 slices and you take 3. Ready for a quick check?"
+)
+
+
+def filled_transcript(length: int, window: int, store: TranscriptStore) -> Transcript:
+    """A chat of ``length`` alternating student and assistant messages."""
+    transcript = Transcript(f"bench_{length}_{window}", store, window=window)
+    for i in range(length):
+        if i % 2:
+            transcript.append("assistant", SAMPLE_REPLY)
+        else:
+            transcript.append("user", f"My answer to question {i // 2 + 1} is B")
+    return transcript
+
+
+def time_reruns(transcript: Transcript, runs: int) -> Dict[str, Any]:
+    """Median and worst time of ``runs`` reruns of the app showing ``transcript``."""
+    app = AppTest.from_file(APP_PATH, default_timeout=60)
+    app.session_state["session_id"] = transcript.session_id
+    app.session_state["transcript"] = transcript
+    app.run()  # first run imports the app's modules
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+    return {
+        "rerun_ms_p50": round(statistics.median(times) * 1000, 2),
+        "rerun_ms_max": round(max(times) * 1000, 2),
+        "chat_messages_rendered": len(app.chat_message),
+        "session_state_bytes": sum(len(m["content"].encode("utf-8")) for m in transcript.recent),
+    }
+
+
+def run_benchmark(lengths, window: int, runs: int) -> Dict[str, Any]:
+    store = TranscriptStore(path=None)
+    report: Dict[str, Any] = {"window": window, "runs": runs, "lengths": {}}
+    for length in lengths:
+        windowed = time_reruns(filled_transcript(length, window, store), runs)
+        full = time_reruns(filled_transcript(length, 0, store), runs)
+        windowed["speedup"] = round(full["rerun_ms_p50"] / windowed["rerun_ms_p50"], 2) if windowed["rerun_ms_p50"] else None
+        report["lengths"][length] = {"windowed": windowed, "full": full}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[20, 200, 2000], help="Transcript lengths, in messages")
+    parser.add_argument("--window", type=int, default=40, help="Messages rendered on each rerun by the windowed transcript")
+    parser.add_argument("--runs", type=int, default=5, help="Timed reruns per length")
+    args = parser.parse_args()
+    print(json.dumps(run_benchmark(args.lengths, args.window, args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
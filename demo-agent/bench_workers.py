@@ -0,0 +1,177 @@
+"""
+Throughput benchmark for multi-worker serving, run against a local fake model.
+
+For each worker count, starts ``demo-agent.dispatcher`` with every agent routed to the
+fake model, drives simulated students through it over HTTP (/run, one session each)
+and reports turn throughput and latency percentiles, so the scaling from one worker to
+several can be compared on the same machine. No network access or credentials are
+needed.
+
+Usage:
+    python -m demo-agent.bench_workers --workers 1 2 4 --students 40 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from .bench_load import student_script
+from .dispatcher import REPO_DIR, pick_worker
+from .metrics import percentile
+from .models import DEFAULT_ROUTES
+
+APP_NAME = "demo-agent"
+
+
+def fake_env(latency: float, jitter: float, use_cache: bool) -> Dict[str, str]:
+    """Environment for server processes that run every agent on the fake model."""
+    env = dict(os.environ)
+    for agent in DEFAULT_ROUTES:
+        env[f"SLIMPAI_MODEL_{agent.upper()}"] = "fake"
+        env[f"SLIMPAI_ESCALATE_{agent.upper()}"] = ""
+    env.update({
+        "SLIMPAI_FAKE_LATENCY": str(latency),
+        "SLIMPAI_FAKE_JITTER": str(jitter),
+        "SLIMPAI_CACHE_DB": "",
+        "SLIMPAI_CACHE_MEMORY_SIZE": "512" if use_cache else "0",
+        "SLIMPAI_BANK_DIR": "",
+        "SLIMPAI_MASTERY_DB": "",
+        "SLIMPAI_METRICS_LOG": "",
+    })
+    return env
+
+
+async def run_student(client: aiohttp.ClientSession, url: str, number: int, rng: random.Random) -> List[float]:
+    """Play one student's conversation over HTTP; return per-turn latencies."""
+    user_id = f"student_{number}"
+    async with client.post(f"{url}/apps/{APP_NAME}/users/{user_id}/sessions", json={}) as response:
+        response.raise_for_status()
+        session_id = (await response.json())["id"]
+    latencies = []
+    for message in student_script(number, rng):
+        payload = {
+            "app_name": APP_NAME,
+            "user_id": user_id,
+            "session_id": session_id,
+            "new_message": {"role": "user", "parts": [{"text": message}]},
+        }
+        started = time.perf_counter()
+        async with client.post(f"{url}/run", json=payload) as response:
+            response.raise_for_status()
+            await response.read()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def warm_up(client: aiohttp.ClientSession, url: str, workers: int) -> None:
+    """Send one turn to every worker, so agent loading is not counted in the measurements."""
+    for index in range(workers):
+        session_id = next(f"warmup_{n}" for n in range(1000) if pick_worker(f"warmup_{n}", workers) == index)
+        async with client.post(f"{url}/apps/{APP_NAME}/users/warmup/sessions/{session_id}", json={}) as response:
+            response.raise_for_status()
+        payload = {
+            "app_name": APP_NAME,
+            "user_id": "warmup",
+            "session_id": session_id,
+            "new_message": {"role": "user", "parts": [{"text": "Hi!"}]},
+        }
+        async with client.post(f"{url}/run", json=payload) as response:
+            response.raise_for_status()
+
+
+async def run_with_workers(workers: int, port: int, students: int, concurrency: int, env: Dict[str, str], seed: int) -> Dict[str, Any]:
+    """Start a dispatcher with ``workers`` workers, run the students through it and stop it."""
+    dispatcher = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "demo-agent.dispatcher", "--workers", str(workers), "--port", str(port),
+        "--session_service_uri", "memory://",
+        cwd=REPO_DIR, env=env, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as client:
+            deadline = time.monotonic() + 180
+            while True:
+                try:
+                    async with client.get(url + "/healthz") as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                if dispatcher.returncode is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"Dispatcher with {workers} workers did not start")
+                await asyncio.sleep(0.5)
+
+            await warm_up(client, url, workers)
+            semaphore = asyncio.Semaphore(concurrency or students)
+            rng = random.Random(seed)
+
+            async def bounded(number: int) -> List[float]:
+                async with semaphore:
+                    return await run_student(client, url, number, random.Random(rng.random()))
+
+            started = time.perf_counter()
+            results = await asyncio.gather(*(bounded(n) for n in range(students)))
+            elapsed = time.perf_counter() - started
+            async with client.get(url + "/metrics") as response:
+                metrics = await response.text()
+    finally:
+        dispatcher.terminate()
+        await dispatcher.wait()
+
+    latencies = [t for r in results for t in r]
+    per_worker = [line.split()[-1] for line in metrics.splitlines() if line.startswith("slimpai_dispatcher_requests{")]
+    return {
+        "workers": workers,
+        "turns": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "mean": round(statistics.fmean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "requests_per_worker": [int(float(n)) for n in per_worker],
+    }
+
+
+async def run_benchmark(
+    worker_counts: List[int], students: int, latency: float, jitter: float, concurrency: int, use_cache: bool, seed: int, port: int
+) -> Dict[str, Any]:
+    env = fake_env(latency, jitter, use_cache)
+    runs = []
+    for i, workers in enumerate(worker_counts):
+        # A fresh port range per run, in case the previous workers are still releasing theirs
+        runs.append(await run_with_workers(workers, port + i * 100, students, concurrency, env, seed))
+    base = runs[0]["throughput_turns_per_s"] or 1.0
+    for run in runs:
+        run["speedup"] = round(run["throughput_turns_per_s"] / base, 2)
+    return {"students": students, "latency_s": latency, "cpu_count": os.cpu_count(), "runs": runs}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.bench_workers", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("--students", type=int, default=40, help="Number of simulated students per run")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per fake model call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random seconds per model call")
+    parser.add_argument("--concurrency", type=int, default=0, help="Students in flight at once (0 = all)")
+    parser.add_argument("--cache", action="store_true", help="Enable the content cache in the workers")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for student answers")
+    parser.add_argument("--port", type=int, default=18100, help="Dispatcher port of the first run")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_benchmark(
+        args.workers, args.students, args.latency, args.jitter, args.concurrency, args.cache, args.seed, args.port,
+    ))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
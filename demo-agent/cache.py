@@ -0,0 +1,386 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from google.adk.agents import LlmAgent
+from google.adk.tools.agent_tool import AgentTool
+from google.adk.tools.tool_context import ToolContext
+
+from .runner import run_agent_once
+from .schemas import AGENT_SCHEMAS, parse_output
+
+
+# Where the current tool call's result came from: "cache", "bank", "coalesced" or "model".
+# Each tool call runs in its own task, so callbacks of the same call see its value.
+lookup_source: ContextVar[Optional[str]] = ContextVar("lookup_source", default=None)
+
+# Seconds a call waits for an identical generation already in flight
+COALESCE_TIMEOUT = float(os.getenv("SLIMPAI_COALESCE_TIMEOUT", "120"))
+# Calls that waited for an identical in-flight generation, per agent and outcome
+# ("coalesced", "failed", "timeout"), e.g. {("Tester", "coalesced"): 29}
+coalesce_stats: Dict[tuple, int] = {}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize free text for use in a cache key.
+
+    Case, surrounding punctuation and runs of whitespace are ignored, so
+    "Halving!" and "  halving " map to the same entry.
+    """
+    text = str(text).casefold()
+    text = re.sub(r"[^\w\s%+\-*/=.,']", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" .,'")
+
+
+class ContentCache:
+    """
+    Two-tier cache for generated lesson content.
+
+    The memory tier is a small LRU kept per process; the disk tier is a SQLite file
+    shared by every process on the host, with a TTL and a maximum entry count
+    (least recently used entries are evicted first). Values must be JSON serializable.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_size: int = 512,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 5000,
+    ):
+        """
+        Args:
+            path: SQLite file for the disk tier, or None to keep entries in memory only
+            memory_size: Number of entries kept in the in-process LRU
+            ttl_seconds: Age after which an entry is considered stale
+            max_entries: Maximum number of entries kept in the disk tier
+        """
+        self.path = path
+        self.memory_size = memory_size
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "ContentCache":
+        """Create a cache configured by the SLIMPAI_CACHE_* environment variables."""
+        return cls(
+            path=os.getenv("SLIMPAI_CACHE_DB", "content_cache.db") or None,
+            memory_size=int(os.getenv("SLIMPAI_CACHE_MEMORY_SIZE", "512")),
+            ttl_seconds=float(os.getenv("SLIMPAI_CACHE_TTL", str(7 * 24 * 3600))),
+            max_entries=int(os.getenv("SLIMPAI_CACHE_MAX_ENTRIES", "5000")),
+        )
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open the disk tier on first use (caller holds the lock)."""
+        if self.path is None:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        return self._db
+
+    def open(self) -> None:
+        """Open the disk tier now instead of on the first lookup (see startup.py)."""
+        with self._lock:
+            self._connection()
+
+    @property
+    def enabled(self) -> bool:
+        """False when neither tier can hold an entry (memory_size 0 and no disk file)."""
+        return self.memory_size > 0 or bool(self.path)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for ``key``, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            db = self._connection()
+            if db is not None:
+                row = db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if now - row[1] <= self.ttl_seconds:
+                        db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.stats["disk_hits"] += 1
+                        return value
+                    db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        """Store ``value`` under ``key`` in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self.stats["writes"] += 1
+            db = self._connection()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._evict(db, now)
+
+    def _remember(self, key: str, created: float, value: Any) -> None:
+        """Insert into the memory tier, dropping the least recently used entry if full."""
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        """Drop expired entries, then the least recently used ones beyond ``max_entries``."""
+        expired = db.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,)).rowcount
+        overflow = db.execute(
+            "DELETE FROM entries WHERE key IN ("
+            " SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        self.stats["evictions"] += max(expired, 0) + max(overflow, 0)
+
+    def clear(self) -> None:
+        """Remove every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM entries")
+
+
+def prompt_version(agent: LlmAgent) -> str:
+    """Short hash of an agent's prompt, so editing a prompt invalidates its entries."""
+    instruction = agent.instruction if isinstance(agent.instruction, str) else agent.instruction.__qualname__
+    digest = hashlib.sha256(f"{agent.description}\n{instruction}".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def model_name(agent: LlmAgent) -> str:
+    """Name of the model an agent runs on, whether configured as a string or an instance."""
+    return agent.model if isinstance(agent.model, str) else agent.model.model
+
+
+class CachedAgentTool(AgentTool):
+    """
+    An AgentTool that reuses earlier results for the same input.
+
+    Entries are keyed on the subagent's name, model and prompt version plus the
+    normalized request text, passed through ``canonicalize`` if given (see dedup.py) so
+    rephrasings of a topic or lesson step share one entry. Besides the returned text, the session state the subagent
+    wrote (e.g. the quiz stored by ``start_quiz``, with its questions) is cached and replayed
+    on a hit, so a cached call starts the same quiz a fresh generation would; the rest of
+    the generating student's progress is not part of the entry (see ``progress.share``).
+    Empty results and output that fails the agent's schema (schemas.py) are not cached.
+
+    On a cache miss the precomputed curriculum bank, if one is given, is consulted
+    before the model is called. Concurrent misses on the same key are coalesced: the
+    first call generates, the others wait up to ``coalesce_timeout`` seconds for its
+    result (or its error), so a class starting on one topic costs one model call.
+    """
+
+    def __init__(
+        self,
+        agent: LlmAgent,
+        cache: ContentCache,
+        bank=None,
+        skip_summarization: bool = False,
+        coalesce: bool = True,
+        coalesce_timeout: float = COALESCE_TIMEOUT,
+        canonicalize: Optional[Callable[[str], str]] = None,
+    ):
+        super().__init__(agent=agent, skip_summarization=skip_summarization)
+        self.cache = cache
+        self.bank = bank
+        self.canonicalize = canonicalize
+        self.coalesce = coalesce
+        self.coalesce_timeout = coalesce_timeout
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def cache_key(self, args: Dict[str, Any], canonical: bool = True) -> str:
+        """
+        Build the cache key for a call with the given tool arguments.
+
+        With ``canonical=False`` the request is keyed as written, which is how the
+        curriculum bank stores its entries: its topics and steps are canonical already.
+        """
+        request = args.get("request", json.dumps(args, sort_keys=True))
+        if canonical and self.canonicalize is not None:
+            request = self.canonicalize(request)
+        material = [self.agent.name, model_name(self.agent), prompt_version(self.agent), normalize_text(request)]
+        return hashlib.sha256(json.dumps(material).encode("utf-8")).hexdigest()
+
+    def cacheable(self, result: Any) -> bool:
+        """Whether a generated result may be cached: non-empty and, for agents with an output schema, usable."""
+        if not result:
+            return False
+        schema = AGENT_SCHEMAS.get(self.agent.name)
+        return schema is None or parse_output(schema, result).outcome != "invalid"
+
+    async def run_async(self, *, args: Dict[str, Any], tool_context: ToolContext) -> Any:
+        key = self.cache_key(args)
+        entry = self.cache.get(key)
+        lookup_source.set("cache")
+        if entry is None and self.bank is not None:
+            entry = self.bank.get(key)
+            lookup_source.set("bank")
+        if entry is not None:
+            if self.skip_summarization:
+                tool_context.actions.skip_summarization = True
+            _replay(tool_context.state, entry)
+            return entry["result"]
+
+        run_agent = super().run_async
+
+        async def generate() -> Dict[str, Any]:
+            lookup_source.set("model")
+            before = dict(tool_context.actions.state_delta)
+            result = await run_agent(args=args, tool_context=tool_context)
+            state_delta = {
+                k: v for k, v in tool_context.actions.state_delta.items()
+                if k not in before or before[k] != v
+            }
+            entry = _entry(result, state_delta)
+            if self.cacheable(result):
+                self.cache.put(key, entry)
+            return entry
+
+        entry, shared = await self._single_flight(key, generate)
+        if shared:
+            lookup_source.set("coalesced")
+            if self.skip_summarization:
+                tool_context.actions.skip_summarization = True
+            _replay(tool_context.state, entry)
+        return entry["result"]
+
+    async def _single_flight(self, key: str, generate: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Run ``generate`` unless an identical generation is in flight, then share its entry.
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: The entry and whether it came from another call's generation.
+
+        Raises:
+            asyncio.TimeoutError: If the shared generation takes longer than ``coalesce_timeout``
+            Exception: Whatever the shared generation raised
+        """
+        while self.coalesce and key in self._in_flight:
+            future = self._in_flight[key]
+            try:
+                entry = await asyncio.wait_for(asyncio.shield(future), self.coalesce_timeout)
+            except asyncio.CancelledError:
+                # The generating call was cancelled, not this one: generate here instead
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+            except asyncio.TimeoutError:
+                _count(self.agent.name, "timeout")
+                raise
+            except Exception:
+                _count(self.agent.name, "failed")
+                raise
+            _count(self.agent.name, "coalesced")
+            return entry, True
+        if not self.coalesce:
+            return await generate(), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            entry = await generate()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the error as retrieved when nobody else was waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(entry)
+            return entry, False
+        finally:
+            del self._in_flight[key]
+
+    async def generate(self, request: str, limiter: Optional[asyncio.Semaphore] = None, app_name: str = "slimpai_batch") -> Dict[str, Any]:
+        """
+        The result for a request made outside a student conversation, generated if needed.
+
+        Looks in the cache and the bank like a tool call would, and otherwise runs the
+        subagent in a throwaway session and caches the result under the same key.
+
+        Args:
+            request: The request text, as the Guide would pass it
+            limiter: Semaphore held only while the model runs
+            app_name: App name of the throwaway session
+
+        Returns:
+            Dict[str, Any]: The cache entry, with "result", "state_delta" and "questions".
+        """
+        key = self.cache_key({"request": request})
+        entry = self.cache.get(key)
+        if entry is None and self.bank is not None:
+            entry = self.bank.get(key)
+        if entry is not None:
+            return entry
+
+        async def generate() -> Dict[str, Any]:
+            async with limiter or contextlib.nullcontext():
+                text, state_delta = await run_agent_once(self.agent, request, app_name=app_name)
+            entry = _entry(text, state_delta)
+            if self.cacheable(text):
+                self.cache.put(key, entry)
+            return entry
+
+        entry, _ = await self._single_flight(key, generate)
+        return entry
+
+
+def _entry(result: Any, state_delta: Dict[str, Any]) -> Dict[str, Any]:
+    """A cache entry for a generated result: what other sessions may replay of its state delta (progress.share)."""
+    from . import progress  # progress.py imports this module
+    return {"result": result, **progress.share(state_delta)}
+
+
+def _replay(state, entry: Dict[str, Any]) -> None:
+    from . import progress
+    progress.replay(state, entry)
+
+
+def _count(agent_name: str, outcome: str) -> None:
+    coalesce_stats[(agent_name, outcome)] = coalesce_stats.get((agent_name, outcome), 0) + 1
+
+
+# Shared by every cached tool in this process
+content_cache = ContentCache.from_env()
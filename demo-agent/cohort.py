@@ -0,0 +1,150 @@
+"""
+Start a whole class on the same topic at once.
+
+When a teacher starts a topic for a class, every student would otherwise ask the Guide
+for a topic and trigger their own Tester generation. ``start_cohort`` generates the
+diagnostic once (or a few variants, handed out round-robin so neighbours get different
+questions) and creates every student's session in bulk, already in the state
+``start_quiz`` leaves behind. A class start costs ``variants`` Tester calls instead of
+one per student; the first of them shares its cache entry with single students who pick
+the same topic.
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Union
+
+from google.adk.sessions.base_session_service import BaseSessionService
+
+from . import progress
+from . import quiz as quiz_engine
+from .schemas import parse_output
+from .workflow import PHASE_KEY
+
+logger = logging.getLogger(__name__)
+
+MAX_VARIANTS = 5
+
+
+class CohortError(ValueError):
+    """Raised when a cohort request is malformed or its diagnostic cannot be generated."""
+
+
+def variant_request(topic: str, variant: int) -> str:
+    """The Tester request for one variant; variant 0 is the plain topic a student would send."""
+    if variant == 0:
+        return topic
+    return f"{topic}\n(Version {variant + 1}: use different numbers and wording from other versions of this quiz.)"
+
+
+async def generate_variants(tester_tool, topic: str, variants: int) -> List[List[Dict[str, Any]]]:
+    """
+    Generate (or look up) ``variants`` diagnostic quizzes for a topic, concurrently.
+
+    Raises:
+        CohortError: If no variant yields a valid quiz.
+    """
+    entries = await asyncio.gather(*(tester_tool.generate(variant_request(topic, i), app_name="slimpai_cohort") for i in range(variants)))
+    quizzes = []
+    for entry in entries:
+        # The Tester stores the validated quiz via start_quiz; fall back to its text
+        state: Dict[str, Any] = {}
+        progress.replay(state, entry)
+        quiz = quiz_engine.questions(state) or parse_output("quiz", entry["result"]).value
+        if quiz:
+            quizzes.append(quiz_engine.validate_quiz(quiz))
+    if not quizzes:
+        raise CohortError(f"Could not generate a quiz about {topic!r}")
+    return quizzes
+
+
+def student_state(
+    student: Dict[str, Any], topic: str, quiz: List[Dict[str, Any]], cohort_id: str, variant: int, tenant: Optional[str] = None
+) -> Dict[str, Any]:
+    """Initial session state of one student: their details plus a started diagnostic."""
+    state: Dict[str, Any] = {"student_number": str(student["student_number"])}
+    for field in ("name", "grade"):
+        if student.get(field) is not None:
+            state[field] = student[field]
+    # The first question reaches the student whenever their client shows it, so its answer time is unknown
+    quiz_engine.start(state, quiz, shown=False)
+    state["current_topic"] = topic
+    state[PHASE_KEY] = "diagnostic"
+    state["cohort_id"] = cohort_id
+    state["quiz_variant"] = variant
+    if tenant:
+        state["tenant"] = tenant
+    return state
+
+
+async def start_cohort(
+    session_service: BaseSessionService,
+    tester_tool,
+    app_name: str,
+    topic: str,
+    students: List[Union[str, Dict[str, Any]]],
+    variants: int = 1,
+    tenant: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Generate a topic's diagnostic once and create a started session for every student.
+
+    Args:
+        session_service: Where the sessions are created (in one transaction if it
+            supports ``create_sessions``)
+        tester_tool: The cached Tester tool
+        app_name: App the sessions belong to
+        topic: The math topic for the whole class
+        students: Student numbers, or dicts with 'student_number' and optionally
+            'name', 'grade' and 'user_id' (defaults to the student number)
+        variants: Number of different quizzes to hand out round-robin
+        tenant: School or class whose model call rate limit the sessions share
+            (default: the cohort itself, see admission.py)
+
+    Returns:
+        Dict[str, Any]: cohort_id, topic, the number of variants and, per student, the
+        user/session ids, variant and formatted first question.
+
+    Raises:
+        CohortError: If the request is malformed or no quiz could be generated.
+    """
+    topic = str(topic or "").strip()
+    if not topic:
+        raise CohortError("A topic is required")
+    students = [s if isinstance(s, dict) else {"student_number": s} for s in students or []]
+    if not students or any(not str(s.get("student_number") or "").strip() for s in students):
+        raise CohortError("Every student needs a student_number")
+    variants = max(1, min(int(variants), MAX_VARIANTS, len(students)))
+
+    quizzes = await generate_variants(tester_tool, topic, variants)
+    cohort_id = uuid.uuid4().hex[:12]
+    specs = []
+    for i, student in enumerate(students):
+        variant = i % len(quizzes)
+        user_id = str(student.get("user_id") or student["student_number"])
+        session_id = f"cohort_{cohort_id}_{i:03d}"
+        specs.append((user_id, session_id, student_state(student, topic, quizzes[variant], cohort_id, variant, tenant), variant))
+
+    if hasattr(session_service, "create_sessions"):
+        await session_service.create_sessions(app_name=app_name, sessions=[spec[:3] for spec in specs])
+    else:
+        await asyncio.gather(*(
+            session_service.create_session(app_name=app_name, user_id=user_id, session_id=session_id, state=state)
+            for user_id, session_id, state, _ in specs
+        ))
+    logger.info("Cohort %s: %d students on %r with %d quiz variant(s)", cohort_id, len(specs), topic, len(quizzes))
+    return {
+        "cohort_id": cohort_id,
+        "topic": topic,
+        "variants": len(quizzes),
+        "sessions": [
+            {
+                "student_number": state["student_number"],
+                "user_id": user_id,
+                "session_id": session_id,
+                "variant": variant,
+                "first_question": quiz_engine.format_question(quizzes[variant][0], 1, len(quizzes[variant])),
+            }
+            for user_id, session_id, state, variant in specs
+        ],
+    }
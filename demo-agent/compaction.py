@@ -0,0 +1,157 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from . import progress as progress_record
+
+# Approximate prompt budget for the conversation history, in tokens
+HISTORY_TOKEN_BUDGET = int(os.getenv("SLIMPAI_HISTORY_TOKEN_BUDGET", "4000"))
+# Student turns that are always sent verbatim, however small the budget
+HISTORY_KEEP_TURNS = int(os.getenv("SLIMPAI_HISTORY_KEEP_TURNS", "2"))
+
+SUMMARY_MARKER = "[Summary of earlier conversation]"
+
+# Counters for observability: how often history was compacted and how much it saved
+compaction_stats = {"compactions": 0, "tokens_before": 0, "tokens_after": 0}
+
+
+def _part_chars(part: types.Part) -> int:
+    if part.text:
+        return len(part.text)
+    if part.function_call:
+        return len(part.function_call.name or "") + len(json.dumps(part.function_call.args or {}, default=str))
+    if part.function_response:
+        return len(part.function_response.name or "") + len(json.dumps(part.function_response.response or {}, default=str))
+    return 0
+
+
+def estimate_tokens(contents: List[types.Content]) -> int:
+    """Rough token count of a list of contents (about four characters per token)."""
+    return sum(_part_chars(part) for content in contents for part in content.parts or []) // 4
+
+
+def _is_student_turn(content: types.Content) -> bool:
+    """True for a message typed by the student (not a tool result, which is also role 'user')."""
+    return content.role == "user" and any(
+        part.text for part in content.parts or []
+    ) and not any(part.function_response for part in content.parts or [])
+
+
+def _tool_result(response: Optional[Dict[str, Any]]) -> Any:
+    result = (response or {}).get("result")
+    if isinstance(result, str):
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            return result
+    return result
+
+
+def lesson_progress(contents: List[types.Content]) -> Dict[str, Any]:
+    """
+    Recover lesson progress from the Guide's tool calls.
+
+    Returns:
+        Dict[str, Any]: 'lesson_plan' (latest Planner output) and 'explained_steps'
+        (lesson steps sent to the Explainer since that plan, in order).
+    """
+    plan: List[str] = []
+    explained: List[str] = []
+    for content in contents:
+        for part in content.parts or []:
+            if part.function_response and part.function_response.name == "Planner":
+                result = _tool_result(part.function_response.response)
+                if isinstance(result, list):
+                    plan = [str(step) for step in result]
+                    explained = []
+            elif part.function_call and part.function_call.name == "Explainer":
+                step = (part.function_call.args or {}).get("request")
+                if step and step not in explained:
+                    explained.append(step)
+    return {"lesson_plan": plan, "explained_steps": explained}
+
+
+def build_summary(state: Any, progress: Dict[str, Any]) -> str:
+    """Describe what happened in the compacted turns using session state and lesson progress."""
+    lines = [SUMMARY_MARKER]
+    if state.get("student_number"):
+        lines.append(
+            f"Student: {state.get('name', 'unknown')} (number {state.get('student_number')}, "
+            f"grade {state.get('grade', '?')}). Their details are already stored."
+        )
+    quiz = progress_record.load(state).quiz
+    if quiz is not None and quiz.finished:
+        marks = ", ".join(f"Q{i + 1} {'correct' if ok else 'wrong'}" for i, ok in enumerate(quiz.outcomes()))
+        lines.append(
+            f"Diagnostic quiz finished: {quiz.correct_answers}/{quiz.at} correct "
+            f"({quiz.score_percentage}%): {marks}."
+        )
+    plan = progress["lesson_plan"]
+    if plan:
+        explained = progress["explained_steps"]
+        done = explained[:-1]
+        current = explained[-1] if explained else None
+        remaining = [step for step in plan if step not in explained]
+        lines.append(f"Lesson plan: {json.dumps(plan)}.")
+        if done:
+            lines.append(f"Completed lesson steps: {json.dumps(done)}.")
+        if current:
+            lines.append(f"Current lesson step: {json.dumps(current)}.")
+        lines.append(f"Remaining lesson steps: {json.dumps(remaining)}.")
+    lines.append("Continue the workflow from where the recent messages below leave off.")
+    return "\n".join(lines)
+
+
+def compact_history(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """
+    before_model_callback that keeps the Guide's prompt size roughly constant.
+
+    When the conversation exceeds HISTORY_TOKEN_BUDGET, the oldest student turns (and
+    the tool calls made during them) are dropped from the request and replaced with a
+    short summary built from session state: student details, per-question quiz results
+    and lesson-plan progress. The lesson plan and current step are also written to the
+    session's progress record (progress.py) so they survive independently of the event
+    history. The events themselves are not modified; only what is sent to the model shrinks.
+    """
+    contents = llm_request.contents
+    before = estimate_tokens(contents)
+    if before <= HISTORY_TOKEN_BUDGET:
+        return None
+
+    turn_starts = [i for i, content in enumerate(contents) if _is_student_turn(content)]
+    if len(turn_starts) <= HISTORY_KEEP_TURNS:
+        return None
+
+    # Drop whole student turns from the front until the rest fits (or only the minimum is left)
+    candidates = turn_starts[1:len(turn_starts) - HISTORY_KEEP_TURNS + 1]
+    cut = candidates[-1]
+    for start in candidates:
+        if estimate_tokens(contents[start:]) <= HISTORY_TOKEN_BUDGET:
+            cut = start
+            break
+
+    progress = lesson_progress(contents)
+    state = callback_context.state
+    if progress["lesson_plan"]:
+        record = progress_record.load(state)
+        if record.lesson is None or record.lesson.plan != progress["lesson_plan"]:
+            record.lesson = progress_record.LessonProgress(plan=progress["lesson_plan"])
+        explained = [step for step in progress["lesson_plan"] if step in progress["explained_steps"]]
+        record.lesson.at = max(0, len(explained) - 1)
+        progress_record.save(state, record)
+
+    kept = contents[cut:]
+    first = kept[0].model_copy(deep=True)
+    first.parts.insert(0, types.Part(text=build_summary(state, progress)))
+    llm_request.contents = [first] + kept[1:]
+
+    after = estimate_tokens(llm_request.contents)
+    compaction_stats["compactions"] += 1
+    compaction_stats["tokens_before"] += before
+    compaction_stats["tokens_after"] += after
+    return None
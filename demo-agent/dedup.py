@@ -0,0 +1,373 @@
+"""
+Semantic deduplication of topics and lesson steps.
+
+Students ask for the same topic in many ways ("halving", "Halving numbers", "learn
+about halving", "multiplicaton") and the Planner words the same lesson step slightly differently each
+time, so exact cache keys miss content that was already generated. ``DedupIndex``
+maps each topic and lesson step onto a canonical phrasing seen before, and the cached
+agent tools key their entries on that canonical text: a Tester diagnostic, Planner
+plan, Explainer explanation (and therefore the Quizzer check built from it) generated
+for one phrasing is reused for its variants.
+
+Texts are compared as hashed character n-gram vectors (3-grams of each word, after
+dropping filler words like "learn" or "about"), held in one NumPy matrix per kind of
+text, so a lookup is a single matrix-vector product. A text is mapped onto the most
+similar canonical entry if their cosine similarity reaches ``threshold``, both mention
+the same numbers ("halving 10" is never "halving 12", "counting in 5s" is "counting by
+fives") and at least ``WORD_OVERLAP`` of the content words of each, after stemming, have
+a counterpart (up to misspellings) in the other ("subtracting fractions" is never
+"adding fractions", "division" is not "long division"); otherwise it becomes a canonical
+entry itself. Canonical entries are stored next to the content cache, so every process
+on the host agrees on them; topics and steps of the curriculum bank are loaded first,
+so variants map onto bank content.
+
+Character n-grams catch rewordings, plurals and typos, not synonyms. A short table of
+the curriculum's everyday synonyms (``SYNONYMS``: "dividing by 2" and "half of" are
+"halving", "like denominators" are "same denominators") is applied before comparing;
+other synonyms stay separate.
+
+Usage:
+    python -m demo-agent.dedup match "half of numbers" --kind topic
+    python -m demo-agent.dedup show --kind step
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import normalize_text
+from .metrics import registry
+
+TOPIC = "topic"
+STEP = "step"
+
+DIMENSIONS = 1024
+NGRAM = 3
+STOPWORDS = frozenset(
+    "a about an and are basic basics by do does find finding for how i in intro introduction into is it "
+    "learn learning lesson me mean meaning means number numbers of on please practice practise "
+    "teach the to understand understanding what with".split()
+)
+# Two words of at least FUZZY_LENGTH letters are the same word if their spelling
+# similarity (difflib ratio) reaches WORD_SIMILARITY; shorter words must be equal
+WORD_SIMILARITY = 0.75
+FUZZY_LENGTH = 5
+# Share of each text's content words that must have a counterpart in the other
+WORD_OVERLAP = 0.8
+
+# Rewrites of normalized text applied before comparing: everyday synonyms of the curriculum
+SYNONYMS = [
+    (re.compile(r"\b(?:divid|split|shar)\w*(?: equally)? (?:by|in|into|between) (?:2|two|half)\b"), "halving"),
+    (re.compile(r"\bhal(?:f|ves) of\b|\bhalf\b"), "halving"),
+    (re.compile(r"\bunlike denominators?\b"), "different denominators"),
+    (re.compile(r"\blike denominators?\b"), "same denominators"),
+]
+_NUMBER_NAMES = "zero one two three four five six seven eight nine ten eleven twelve".split()
+# Number words (and their plurals, as in "counting in fives") compared as numbers
+NUMBER_WORDS = {
+    **{name: str(i) for i, name in enumerate(_NUMBER_NAMES)},
+    **{name + ("es" if name.endswith("x") else "s"): str(i) for i, name in enumerate(_NUMBER_NAMES)},
+}
+
+_PLANNER_REQUEST = re.compile(r"^Topic:\s*(?P<topic>.*?)\s*\nResults:", re.DOTALL)
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping, so "halve", "halves" and "halving" share a stem."""
+    for suffix in ("ing", "es", "ed", "s"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix) and not word.endswith("ss"):
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def _tokens(text: str) -> Tuple[List[str], frozenset]:
+    """Stemmed content words of normalized ``text`` and the numbers it mentions."""
+    for pattern, replacement in SYNONYMS:
+        text = pattern.sub(replacement, text)
+    words, numbers = [], set()
+    for word in re.findall(r"[^\W_]+", text):
+        # "5", "5s" and "fives" all mention 5
+        digits = re.fullmatch(r"(\d+)(?:s|st|nd|rd|th)?", word)
+        if digits or word in NUMBER_WORDS:
+            numbers.add(digits[1] if digits else NUMBER_WORDS[word])
+        else:
+            words.append(word)
+    content = [_stem(word) for word in words if word not in STOPWORDS]
+    return content or [_stem(word) for word in words], frozenset(numbers)
+
+
+def _similar(a: str, b: str) -> bool:
+    return min(len(a), len(b)) >= FUZZY_LENGTH and SequenceMatcher(None, a, b).ratio() >= WORD_SIMILARITY
+
+
+def _same_words(a: List[str], b: List[str]) -> bool:
+    """Whether at least WORD_OVERLAP of the words of each text have a counterpart, allowing for misspellings, in the other."""
+    def covered(words: List[str], others: List[str]) -> float:
+        if not words:
+            return 1.0 if not others else 0.0
+        return sum(any(w == o or _similar(w, o) for o in others) for w in words) / len(words)
+
+    return min(covered(a, b), covered(b, a)) >= WORD_OVERLAP
+
+
+def vectorize(text: str) -> np.ndarray:
+    """Unit-length hashed character n-gram vector of normalized ``text``."""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    for word in _tokens(text)[0]:
+        padded = f" {word} "
+        for i in range(max(1, len(padded) - NGRAM + 1)):
+            # crc32 rather than hash(): vectors must agree across processes
+            vector[zlib.crc32(padded[i:i + NGRAM].encode("utf-8")) % DIMENSIONS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Entries:
+    """The canonical texts of one kind and their vectors, in a matrix grown by doubling."""
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.tokens: List[Tuple[List[str], frozenset]] = []
+        self.matrix = np.zeros((64, DIMENSIONS), dtype=np.float32)
+        # Variants already mapped, so repeated lookups skip the matrix
+        self.known: Dict[str, str] = {}
+
+    def add(self, text: str) -> None:
+        if text in self.known:
+            return
+        if len(self.texts) == len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, np.zeros_like(self.matrix)])
+        self.matrix[len(self.texts)] = vectorize(text)
+        self.texts.append(text)
+        self.tokens.append(_tokens(text))
+        self.known[text] = text
+
+    def nearest(self, text: str, threshold: float) -> Optional[str]:
+        """
+        The most similar canonical text at or above ``threshold`` that is the same text.
+
+        Sharing most n-grams is not enough: both texts must mention the same numbers and
+        mostly the same words, so "division" is not "long division".
+        """
+        if not self.texts:
+            return None
+        scores = self.matrix[:len(self.texts)] @ vectorize(text)
+        words, numbers = _tokens(text)
+        for i in np.argsort(scores)[::-1][:8]:
+            if scores[i] < threshold:
+                break
+            if self.tokens[i][1] == numbers and _same_words(words, self.tokens[i][0]):
+                return self.texts[i]
+        return None
+
+
+class DedupIndex:
+    """
+    Maps topics and lesson steps onto canonical phrasings.
+
+    Thread safe. Canonical entries are shared with other processes through a SQLite
+    table; entries another process added are picked up before a text is made canonical.
+    """
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.7, max_entries: int = 5000, bank=None):
+        """
+        Args:
+            path: SQLite file holding the canonical entries, or None to keep them in memory only
+            threshold: Cosine similarity at which a text is mapped onto an entry (above 1 disables mapping)
+            max_entries: Canonical entries kept per kind; beyond it new texts are not added
+            bank: Curriculum bank whose topics and steps are loaded as the first entries
+        """
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.bank = bank
+        self._entries: Optional[Dict[str, _Entries]] = None
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_row = 0
+        self.stats: Dict[Tuple[str, str], int] = {}
+
+    @classmethod
+    def from_env(cls, bank=None) -> "DedupIndex":
+        """Configure from SLIMPAI_DEDUP_THRESHOLD and SLIMPAI_DEDUP_MAX_ENTRIES; entries live in SLIMPAI_CACHE_DB."""
+        return cls(
+            path=os.getenv("SLIMPAI_CACHE_DB", "content_cache.db") or None,
+            threshold=float(os.getenv("SLIMPAI_DEDUP_THRESHOLD", "0.7")),
+            max_entries=int(os.getenv("SLIMPAI_DEDUP_MAX_ENTRIES", "5000")),
+            bank=bank,
+        )
+
+    def _load(self) -> Dict[str, _Entries]:
+        """Build the index on first use (caller holds the lock)."""
+        if self._entries is None:
+            self._entries = {TOPIC: _Entries(), STEP: _Entries()}
+            if self.bank is not None:
+                for topic, summary in self.bank.topics.items():
+                    self._entries[TOPIC].add(normalize_text(topic))
+                    for step in summary.get("steps", []):
+                        self._entries[STEP].add(normalize_text(step))
+            if self.path is not None:
+                self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS canonical_texts ("
+                    " kind TEXT NOT NULL, text TEXT NOT NULL, PRIMARY KEY (kind, text))"
+                )
+            self._sync()
+        return self._entries
+
+    def _sync(self) -> None:
+        """Add the entries other processes stored since the last sync (caller holds the lock)."""
+        if self._db is None:
+            return
+        rows = self._db.execute(
+            "SELECT rowid, kind, text FROM canonical_texts WHERE rowid > ? ORDER BY rowid", (self._last_row,)
+        ).fetchall()
+        for rowid, kind, text in rows:
+            if kind in self._entries:
+                self._entries[kind].add(text)
+            self._last_row = rowid
+
+    def open(self) -> None:
+        """Build the index now instead of on the first lookup (see startup.py)."""
+        with self._lock:
+            self._load()
+
+    def canonical(self, kind: str, text: str) -> str:
+        """
+        The canonical phrasing of ``text``.
+
+        Args:
+            kind: TOPIC or STEP; texts are only compared with texts of the same kind
+            text: A topic or lesson step as the Guide or Planner phrased it
+
+        Returns:
+            str: The normalized canonical text (``text`` itself, normalized, if it is new).
+        """
+        text = normalize_text(text)
+        if not text:
+            return text
+        with self._lock:
+            entries = self._load()[kind]
+            if text in entries.known:
+                self._count(kind, "known")
+                return entries.known[text]
+            match = self._match(entries, text)
+            if match is None:
+                self._sync()
+                match = self._match(entries, text)
+            if match is not None:
+                entries.known[text] = match
+                self._count(kind, "mapped")
+                return match
+            self._count(kind, "new")
+            if len(entries.texts) < self.max_entries:
+                entries.add(text)
+                if self._db is not None:
+                    self._db.execute("INSERT OR IGNORE INTO canonical_texts (kind, text) VALUES (?, ?)", (kind, text))
+            return text
+
+    def lookup(self, kind: str, text: str) -> str:
+        """
+        Like ``canonical``, but a text that matches no entry is not added: for reads
+        (e.g. mastery queries), which must not create canonical entries.
+        """
+        text = normalize_text(text)
+        if not text:
+            return text
+        with self._lock:
+            entries = self._load()[kind]
+            match = self._match(entries, text)
+            if match is None:
+                self._sync()
+                match = self._match(entries, text)
+            if match is None:
+                return text
+            entries.known[text] = match
+            return match
+
+    def _match(self, entries: _Entries, text: str) -> Optional[str]:
+        if text in entries.known:
+            return entries.known[text]
+        return entries.nearest(text, self.threshold)
+
+    def topic(self, request: str) -> str:
+        """Canonical form of a Tester request (a topic)."""
+        return self.canonical(TOPIC, request)
+
+    def step(self, request: str) -> str:
+        """Canonical form of an Explainer request (a lesson step)."""
+        return self.canonical(STEP, request)
+
+    def planner_request(self, request: str) -> str:
+        """A Planner request ("Topic: <topic>\\nResults: <json>") with its topic made canonical."""
+        match = _PLANNER_REQUEST.match(request)
+        if match is None:
+            return request
+        return f"Topic: {self.topic(match['topic'])}{request[match.end('topic'):]}"
+
+    def entries(self, kind: str) -> List[str]:
+        """The canonical texts of one kind, oldest first."""
+        with self._lock:
+            return list(self._load()[kind].texts)
+
+    def _count(self, kind: str, outcome: str) -> None:
+        self.stats[(kind, outcome)] = self.stats.get((kind, outcome), 0) + 1
+
+    def _samples(self) -> Iterable[Tuple[str, str, Dict[str, str], float]]:
+        for (kind, outcome), value in sorted(self.stats.items()):
+            yield "slimpai_dedup_lookups", "Topic and lesson step lookups by kind and outcome (known/mapped/new)", {"kind": kind, "outcome": outcome}, value
+        for kind, entries in (self._entries or {}).items():
+            yield "slimpai_dedup_entries", "Canonical topics and lesson steps in the deduplication index", {"kind": kind}, len(entries.texts)
+
+
+def _build_index() -> DedupIndex:
+    from .bank import curriculum_bank
+
+    index = DedupIndex.from_env(bank=curriculum_bank)
+    registry.add_collector(index._samples)
+    return index
+
+
+# Shared by the cached agent tools in this process
+dedup_index = _build_index()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.dedup", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    match_cmd = commands.add_parser("match", help="Show the canonical entry a text maps onto, and the closest ones")
+    match_cmd.add_argument("text")
+    match_cmd.add_argument("--kind", choices=[TOPIC, STEP], default=TOPIC)
+    match_cmd.add_argument("--top", type=int, default=5)
+    show_cmd = commands.add_parser("show", help="List the canonical entries")
+    show_cmd.add_argument("--kind", choices=[TOPIC, STEP], default=TOPIC)
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        for text in dedup_index.entries(args.kind):
+            print(text)
+        return
+    texts = dedup_index.entries(args.kind)
+    text = normalize_text(args.text)
+    closest = []
+    if texts:
+        scores = np.stack([vectorize(t) for t in texts]) @ vectorize(text)
+        closest = [(texts[i], round(float(scores[i]), 3)) for i in np.argsort(scores)[::-1][:args.top]]
+    # Only look up after ranking, as a lookup may add the text itself
+    canonical = dedup_index.canonical(args.kind, text)
+    print(json.dumps({"text": text, "canonical": canonical, "threshold": dedup_index.threshold, "closest": closest}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Multi-worker serving: N ``demo-agent.server`` processes behind a local dispatcher.
+
+A single server process runs every student's model calls, tool calls and session
+writes on one event loop and one core. The dispatcher starts ``--workers`` server
+processes on local ports and proxies the public port to them. Every request that names
+a session (in the URL or in the /run and /run_sse body) goes to the worker that owns
+that session, chosen by rendezvous hashing of the session id, so each worker's
+in-memory sessions and session cache stay authoritative. Sessions created without an
+id get one from the dispatcher first. Listing a user's sessions and /metrics are
+answered by all workers and merged.
+
+On SIGTERM (e.g. a Cloud Run scale-down) the dispatcher reports unhealthy on /healthz,
+lets in-flight requests (including open /run_sse streams) finish for up to
+``--drain-timeout`` seconds, then stops the workers. Workers that exit on their own
+are restarted.
+
+Usage:
+    python -m demo-agent.dispatcher --workers 4 --host 0.0.0.0 --port 8080 \
+        --session_service_uri "slimpai-sqlite:////app/data/agent_store.db?ttl=86400"
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import signal
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# The repository root, from which ``-m demo-agent.server`` resolves
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SESSION_PATH = re.compile(r"^/apps/[^/]+/users/[^/]+/sessions/([^/]+)")
+SESSION_LIST_PATH = re.compile(r"^/apps/[^/]+/users/[^/]+/sessions/?$")
+TRACE_PATH = re.compile(r"^/debug/trace/session/([^/]+)")
+
+# Headers that describe one hop of the connection rather than the message
+HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+    "trailer", "transfer-encoding", "upgrade", "content-length", "host",
+}
+
+
+def pick_worker(session_id: str, workers: int) -> int:
+    """
+    The index of the worker that owns a session.
+
+    Rendezvous (highest random weight) hashing: the choice is stable for a given
+    worker count, and changing the count only moves the sessions of added or removed
+    workers.
+    """
+    return max(range(workers), key=lambda i: hashlib.blake2b(f"{i}:{session_id}".encode(), digest_size=8).digest())
+
+
+def session_key(method: str, path: str, body: bytes) -> Optional[str]:
+    """The session id a request is about, if it names one."""
+    match = SESSION_PATH.match(path) or TRACE_PATH.match(path)
+    if match:
+        return match.group(1)
+    if path in ("/run", "/run_sse") and body:
+        try:
+            return str(json.loads(body).get("session_id") or "") or None
+        except (ValueError, AttributeError):
+            return None
+    return None
+
+
+class Worker:
+    """One ``demo-agent.server`` child process."""
+
+    def __init__(self, index: int, port: int, args: List[str]):
+        self.index = index
+        self.port = port
+        self.url = f"http://127.0.0.1:{port}"
+        self.args = args
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.restarts = 0
+
+    async def start(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "demo-agent.server", "--host", "127.0.0.1", "--port", str(self.port), *self.args,
+            cwd=REPO_DIR,
+        )
+
+    async def wait_ready(self, client: aiohttp.ClientSession, timeout: float) -> None:
+        """Poll the worker until it answers, or raise RuntimeError after ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process is not None and self.process.returncode is not None:
+                raise RuntimeError(f"Worker {self.index} exited with code {self.process.returncode} during startup")
+            try:
+                async with client.get(self.url + "/list-apps", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status == 200:
+                        return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.2)
+        raise RuntimeError(f"Worker {self.index} did not become ready within {timeout:.0f}s")
+
+    async def stop(self, timeout: float) -> None:
+        """SIGTERM the worker (uvicorn finishes its open requests), then SIGKILL after ``timeout``."""
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+
+class Dispatcher:
+    """Routes requests to workers by session and supervises the worker processes."""
+
+    def __init__(self, workers: int, worker_port: int, worker_args: List[str], drain_timeout: float = 8.0, startup_timeout: float = 120.0):
+        """
+        Args:
+            workers: Number of server processes
+            worker_port: Port of the first worker; the others use the following ports
+            worker_args: Extra command-line arguments for every worker (e.g. the session store)
+            drain_timeout: Longest time to wait for in-flight requests on shutdown
+            startup_timeout: Longest time to wait for each worker to come up
+        """
+        self.workers = [Worker(i, worker_port + i, worker_args) for i in range(workers)]
+        self.drain_timeout = drain_timeout
+        self.startup_timeout = startup_timeout
+        self.draining = False
+        self.in_flight = 0
+        self.requests = [0] * workers
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._client: Optional[aiohttp.ClientSession] = None
+        self._supervisors: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        # No total timeout: /run_sse streams last as long as the agent runs
+        self._client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0),
+            timeout=aiohttp.ClientTimeout(total=None, connect=10),
+            auto_decompress=False,
+        )
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+        await asyncio.gather(*(worker.wait_ready(self._client, self.startup_timeout) for worker in self.workers))
+        self._supervisors = [asyncio.create_task(self._supervise(worker)) for worker in self.workers]
+        logger.info("%d workers ready on ports %d-%d", len(self.workers), self.workers[0].port, self.workers[-1].port)
+
+    async def _supervise(self, worker: Worker) -> None:
+        """Restart a worker that exits while the dispatcher is not shutting down."""
+        while not self.draining:
+            code = await worker.process.wait()
+            if self.draining:
+                return
+            worker.restarts += 1
+            logger.warning("Worker %d exited with code %s, restarting", worker.index, code)
+            await asyncio.sleep(1.0)
+            await worker.start()
+            try:
+                await worker.wait_ready(self._client, self.startup_timeout)
+            except RuntimeError as e:
+                logger.error("%s", e)
+
+    async def shutdown(self) -> None:
+        """Drain in-flight requests, then stop every worker."""
+        self.draining = True
+        logger.info("Draining %d in-flight requests", self.in_flight)
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d requests still running after %.0fs", self.in_flight, self.drain_timeout)
+        for task in self._supervisors:
+            task.cancel()
+        await asyncio.gather(*(worker.stop(timeout=5.0) for worker in self.workers))
+        if self._client is not None:
+            await self._client.close()
+
+    def worker_for(self, session_id: Optional[str]) -> Worker:
+        if session_id is None:
+            # Not tied to a session: spread by load
+            return self.workers[min(range(len(self.workers)), key=lambda i: self.requests[i])]
+        return self.workers[pick_worker(session_id, len(self.workers))]
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        path = request.path
+        if path == "/healthz":
+            return web.Response(status=503 if self.draining else 200, text="draining" if self.draining else "ok")
+        if path == "/metrics":
+            return await self._merged_metrics()
+
+        body = await request.read()
+        if SESSION_LIST_PATH.match(path):
+            if request.method == "GET":
+                return await self._merged_sessions(request)
+            if request.method == "POST":
+                # Give new sessions their id here, so the owner is known before creation
+                try:
+                    data = json.loads(body) if body else {}
+                    data["session_id"] = data.get("session_id") or str(uuid.uuid4())
+                except (ValueError, AttributeError, TypeError):
+                    # Not a JSON object: pass it on unchanged for the worker to reject
+                    return await self._proxy(request, self.worker_for(None), body)
+                body = json.dumps(data).encode()
+                return await self._proxy(request, self.worker_for(data["session_id"]), body)
+        return await self._proxy(request, self.worker_for(session_key(request.method, path, body)), body)
+
+    async def _proxy(self, request: web.Request, worker: Worker, body: bytes) -> web.StreamResponse:
+        self.in_flight += 1
+        self._idle.clear()
+        self.requests[worker.index] += 1
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_HEADERS}
+        response: Optional[web.StreamResponse] = None
+        try:
+            async with self._client.request(request.method, worker.url + request.path_qs, headers=headers, data=body) as upstream:
+                response = web.StreamResponse(
+                    status=upstream.status,
+                    headers={k: v for k, v in upstream.headers.items() if k.lower() not in HOP_HEADERS},
+                )
+                await response.prepare(request)
+                async for chunk in upstream.content.iter_any():
+                    await response.write(chunk)
+                await response.write_eof()
+                return response
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError):
+            if response is None or not response.prepared:
+                return web.Response(status=502, text=f"Worker {worker.index} is unavailable")
+            # The worker went away mid-stream and the status is already sent: end the
+            # stream and close the connection, so the client sees it cut short
+            response.force_close()
+            return response
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.set()
+
+    async def _fan_out(self, method: str, path_qs: str) -> List[Optional[bytes]]:
+        async def fetch(worker: Worker) -> Optional[bytes]:
+            try:
+                async with self._client.request(method, worker.url + path_qs) as response:
+                    return await response.read() if response.status == 200 else None
+            except aiohttp.ClientError:
+                return None
+
+        return await asyncio.gather(*(fetch(worker) for worker in self.workers))
+
+    async def _merged_sessions(self, request: web.Request) -> web.Response:
+        sessions: Dict[str, dict] = {}
+        for body in await self._fan_out("GET", request.path_qs):
+            for session in json.loads(body) if body else []:
+                sessions.setdefault(session["id"], session)
+        return web.json_response(list(sessions.values()))
+
+    async def _merged_metrics(self) -> web.Response:
+        """Every worker's samples with a ``worker`` label, plus the dispatcher's own."""
+        lines: List[str] = []
+        seen_comments = set()
+        for index, body in enumerate(await self._fan_out("GET", "/metrics")):
+            for line in (body or b"").decode().splitlines():
+                if line.startswith("#"):
+                    if line not in seen_comments:
+                        seen_comments.add(line)
+                        lines.append(line)
+                elif line:
+                    name, _, rest = line.partition(" ")
+                    if "{" in name:
+                        name = name.replace("{", f'{{worker="{index}",', 1)
+                    else:
+                        name = f'{name}{{worker="{index}"}}'
+                    lines.append(f"{name} {rest}")
+        lines.append("# HELP slimpai_dispatcher_requests Requests proxied by the dispatcher, by worker")
+        lines.append("# TYPE slimpai_dispatcher_requests counter")
+        lines.extend(f'slimpai_dispatcher_requests{{worker="{i}"}} {n}' for i, n in enumerate(self.requests))
+        lines.append("# HELP slimpai_dispatcher_worker_restarts Workers restarted after exiting, by worker")
+        lines.append("# TYPE slimpai_dispatcher_worker_restarts counter")
+        lines.extend(f'slimpai_dispatcher_worker_restarts{{worker="{w.index}"}} {w.restarts}' for w in self.workers)
+        lines.append("# HELP slimpai_dispatcher_in_flight Requests currently being proxied")
+        lines.append("# TYPE slimpai_dispatcher_in_flight gauge")
+        lines.append(f"slimpai_dispatcher_in_flight {self.in_flight}")
+        return web.Response(text="\n".join(lines) + "\n", content_type="text/plain")
+
+
+async def serve(dispatcher: Dispatcher, host: str, port: int) -> None:
+    """Run the dispatcher until SIGTERM/SIGINT, then drain and stop."""
+    await dispatcher.start()
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_route("*", "/{tail:.*}", dispatcher.handle)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info("Dispatcher listening on http://%s:%d", host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    await dispatcher.shutdown()
+    await runner.cleanup()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.dispatcher", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SLIMPAI_WORKERS", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--worker-port", type=int, default=0, help="Port of the first worker (default: --port + 1)")
+    parser.add_argument(
+        "--session_service_uri",
+        default=os.getenv("SLIMPAI_SESSION_URI", "slimpai-sqlite:///./agent_store.db"),
+        help="Session store URI passed to every worker",
+    )
+    parser.add_argument("--drain-timeout", type=float, default=float(os.getenv("SLIMPAI_DRAIN_TIMEOUT", "8")), help="Seconds to let in-flight requests finish on shutdown")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    dispatcher = Dispatcher(
+        workers=args.workers,
+        worker_port=args.worker_port or args.port + 1,
+        worker_args=["--session_service_uri", args.session_service_uri],
+        drain_timeout=args.drain_timeout,
+    )
+    asyncio.run(serve(dispatcher, args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import random
+import re
+from collections import Counter
+from typing import AsyncGenerator, Callable, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+# The diagnostic every fake Tester generates (correct answers: B, A, C)
+FAKE_QUIZ = [
+    {"question": "What is half of 4?", "options": ["1", "2", "3"], "correct_answer_index": 1},
+    {"question": "What is half of 10?", "options": ["5", "2", "20"], "correct_answer_index": 0},
+    {"question": "What is half of 18?", "options": ["6", "8", "9"], "correct_answer_index": 2},
+]
+
+FAKE_CHECK_QUESTION = {
+    "question": "If you share 6 cookies equally between 2 friends, how many does each get?",
+    "options": ["2", "3", "6"],
+    "correct_answer_index": 1,
+}
+
+
+def _text(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def _call(tool_name: str, **args) -> LlmResponse:
+    return LlmResponse(content=types.Content(
+        role="model", parts=[types.Part(function_call=types.FunctionCall(name=tool_name, args=args))]
+    ))
+
+
+def _last_part(llm_request: LlmRequest) -> Optional[types.Part]:
+    if not llm_request.contents or not llm_request.contents[-1].parts:
+        return None
+    return llm_request.contents[-1].parts[0]
+
+
+def _function_responses(llm_request: LlmRequest, name: str) -> list:
+    """All responses the agent has received from tool ``name`` so far, oldest first."""
+    return [
+        part.function_response.response
+        for content in llm_request.contents
+        for part in content.parts or []
+        if part.function_response and part.function_response.name == name
+    ]
+
+
+def _tool_result_text(response: dict) -> str:
+    result = response.get("result", "")
+    return result if isinstance(result, str) else json.dumps(result)
+
+
+def _summary_progress(llm_request: LlmRequest) -> Optional[tuple]:
+    """(lesson plan, steps explained so far) from a compacted-history summary, if present."""
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            plan = re.search(r"^Lesson plan: (.*)\.$", part.text or "", re.MULTILINE)
+            if plan:
+                done = re.search(r"^Completed lesson steps: (.*)\.$", part.text, re.MULTILINE)
+                current = "Current lesson step:" in part.text
+                completed = len(json.loads(done.group(1))) if done else 0
+                return json.loads(plan.group(1)), completed + current
+    return None
+
+
+def scripted_response(agent_name: str, llm_request: LlmRequest) -> LlmResponse:
+    """
+    Default script for the fake model, imitating each agent of the Guide flow.
+
+    The Guide follows the same protocol as the simulated students in bench_load.py:
+    greeting -> "<number>, <name>, group <n>" -> topic -> quiz answers -> one answer per
+    lesson step. Subagents return well-formed JSON/text for their role.
+    """
+    last = _last_part(llm_request)
+
+    if agent_name == "Tester":
+        if last is not None and last.function_response:
+            return _text(json.dumps(FAKE_QUIZ))
+        return _call("start_quiz", quiz=FAKE_QUIZ)
+    if agent_name == "Planner":
+        results = re.search(r"Results: (.*)", last.text or "", re.DOTALL) if last is not None else None
+        wrong = results.group(1).count("false") if results else 2
+        return _text(json.dumps([f"Halving step {i + 1}" for i in range(max(wrong, 1))]))
+    if agent_name == "Explainer":
+        step = last.text if last is not None else "halving"
+        return _text(f"Imagine a pizza 🍕 cut into two equal parts to learn {step}. Each half is the same size! 🎉")
+    if agent_name == "Quizzer":
+        return _text(json.dumps(FAKE_CHECK_QUESTION))
+    if agent_name == "Encourager":
+        return _text("You're a math superstar! 🌟 Keep up the amazing work!")
+
+    # Guide
+    if last is not None and last.function_response:
+        name = last.function_response.name
+        response = last.function_response.response or {}
+        if name == "store_user_info":
+            return _text("Thanks! Which math topic would you like to learn today?")
+        if name == "Tester":
+            quiz = json.loads(_tool_result_text(response))
+            return _text("Let's warm up! Question 1 of 3: " + quiz[0]["question"])
+        if name == "Planner":
+            plan = json.loads(_tool_result_text(response))
+            return _call("Explainer", request=plan[0])
+        if name == "Explainer":
+            return _call("Quizzer", request=_tool_result_text(response))
+        if name == "Quizzer":
+            question = json.loads(_tool_result_text(response))
+            return _text("Professor Pizza says... Now try this: " + question["question"])
+        return _text("Great job!")
+
+    text = (last.text or "") if last is not None else ""
+    if "[Quiz graded by the system]" in "".join(p.text or "" for p in llm_request.contents[-1].parts):
+        results = re.search(r"test_results_json: (.*)", llm_request.contents[-1].parts[-1].text, re.DOTALL)
+        return _call("Planner", request=f"Topic: halving\nResults: {results.group(1) if results else '[]'}")
+    summary = _summary_progress(llm_request)
+    if summary or _function_responses(llm_request, "Planner"):
+        if summary:
+            plan, explained = summary
+        else:
+            plan = json.loads(_tool_result_text(_function_responses(llm_request, "Planner")[-1]))
+            explained = len(_function_responses(llm_request, "Explainer"))
+        if explained < len(plan):
+            return _call("Explainer", request=plan[explained])
+        return _text("🎉 Fantastic! You finished every lesson step. Try another topic next time!")
+    if _function_responses(llm_request, "Tester"):
+        return _call("submit_answer", answer=text)
+    if _function_responses(llm_request, "store_user_info"):
+        return _call("Tester", request=text.strip())
+    match = re.match(r"\s*(\w+)\s*,\s*([^,]+),\s*group\s*(\d+)", text)
+    if match:
+        return _call("store_user_info", student_number=match.group(1), name=match.group(2).strip(), grade=int(match.group(3)))
+    return _text("Welcome, math explorer! Please tell me your student number, name and group.")
+
+
+class FakeLlm(BaseLlm):
+    """
+    A local stand-in for Gemini that returns scripted responses after a configurable delay.
+
+    One instance can serve every agent; responses are chosen from the agent name ADK
+    puts in the request labels. Call counts per agent are kept in ``calls`` and prompt
+    tokens (whitespace-separated words) per agent in ``prompt_tokens``.
+    """
+
+    latency: float = 0.0
+    """Seconds each call takes."""
+
+    jitter: float = 0.0
+    """Extra uniformly distributed delay, in seconds, added to each call."""
+
+    script: Callable[[str, LlmRequest], LlmResponse] = scripted_response
+    """Maps (agent name, request) to the response to return."""
+
+    calls: Counter = Counter()
+
+    prompt_tokens: Counter = Counter()
+
+    def __init__(self, **data):
+        data.setdefault("model", "fake-llm")
+        data.setdefault("calls", Counter())
+        data.setdefault("prompt_tokens", Counter())
+        super().__init__(**data)
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        agent_name = (llm_request.config.labels or {}).get("adk_agent_name", "") if llm_request.config else ""
+        self.calls[agent_name] += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        response = self.script(agent_name, llm_request)
+        prompt_tokens = sum(len((p.text or "").split()) for c in llm_request.contents for p in c.parts or [])
+        self.prompt_tokens[agent_name] += prompt_tokens
+        response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=sum(len((p.text or "").split()) for p in response.content.parts),
+        )
+        yield response
+
+
+def install_fake_llm(root_agent, llm: BaseLlm) -> None:
+    """Point the Guide and every subagent reachable through its tools at ``llm``."""
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.agent_tool import AgentTool
+
+    pending = [root_agent]
+    while pending:
+        agent = pending.pop()
+        if isinstance(agent, LlmAgent):
+            agent.model = llm
+        for sub_agent in agent.sub_agents:
+            pending.append(sub_agent)
+        for tool in getattr(agent, "tools", []):
+            if isinstance(tool, AgentTool):
+                pending.append(tool.agent)
@@ -0,0 +1,386 @@
+"""
+Per-student answer history and mastery aggregates.
+
+Session state only keeps the running score of the current quiz, so a student's past
+answers could only be recovered by replaying session events. Every graded answer
+(diagnostic questions and lesson check questions, from either Guide) is appended to a
+local SQLite log, and a per (student, topic, skill) aggregate row is updated in the
+same transaction: attempts, correct answers, total answer time, an exponentially
+weighted accuracy and the outcomes of the last ``RECENT_WINDOW`` answers. The skill of
+a diagnostic answer is the topic itself; a check question's skill is its lesson step.
+The row with skill "" sums up the whole topic. Topics are kept under their canonical
+phrasing (``topic_key``), the same one the cached Tester is keyed on, and queries
+look a topic up under it, so any phrasing of a topic finds its history.
+
+Reading a student's mastery or a class summary is an indexed lookup on the aggregate
+table, not a scan of the log.
+
+The store also remembers each student's latest lesson plan per topic. When a student
+comes back to a topic and their recent answers on it reach ``skip_threshold``, the
+Guide workflow skips the diagnostic and the Planner and resumes that plan at the first
+step not yet mastered (see ``remaining_steps``).
+
+Usage:
+    python -m demo-agent.mastery student S001 --topic halving
+    python -m demo-agent.mastery topic halving
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, MutableMapping, Optional
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+from . import progress
+from .cache import normalize_text
+from .progress import question_id
+from .schemas import parse_output
+
+RECENT_WINDOW = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    student_number TEXT NOT NULL, topic TEXT NOT NULL, skill TEXT NOT NULL,
+    question_id TEXT NOT NULL, kind TEXT NOT NULL,
+    chosen_index INTEGER NOT NULL, is_correct INTEGER NOT NULL,
+    latency_ms INTEGER, answered_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_student ON answers (student_number, topic, answered_at);
+CREATE INDEX IF NOT EXISTS answers_question ON answers (question_id);
+CREATE TABLE IF NOT EXISTS mastery (
+    student_number TEXT NOT NULL, topic TEXT NOT NULL, skill TEXT NOT NULL,
+    attempts INTEGER NOT NULL, correct INTEGER NOT NULL, latency_ms_total INTEGER NOT NULL,
+    ewma REAL NOT NULL, recent TEXT NOT NULL, last_answered_at REAL NOT NULL,
+    PRIMARY KEY (student_number, topic, skill)
+);
+CREATE INDEX IF NOT EXISTS mastery_topic ON mastery (topic, skill);
+CREATE TABLE IF NOT EXISTS lesson_plans (
+    student_number TEXT NOT NULL, topic TEXT NOT NULL,
+    plan TEXT NOT NULL, planned_at REAL NOT NULL,
+    PRIMARY KEY (student_number, topic)
+);
+"""
+
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    attempts = row["attempts"]
+    recent = row["recent"]
+    return {
+        "student_number": row["student_number"],
+        "topic": row["topic"],
+        "skill": row["skill"],
+        "attempts": attempts,
+        "correct": row["correct"],
+        "accuracy": round(row["correct"] / attempts, 3) if attempts else 0.0,
+        "ewma": round(row["ewma"], 3),
+        "recent_accuracy": round(recent.count("1") / len(recent), 3) if recent else 0.0,
+        "recent": len(recent),
+        "avg_latency_ms": round(row["latency_ms_total"] / attempts) if attempts else 0,
+        "last_answered_at": row["last_answered_at"],
+    }
+
+
+class MasteryStore:
+    """
+    Append-only answer log with incrementally maintained mastery aggregates.
+
+    Safe to share between threads; several processes can share one database file.
+    """
+
+    def __init__(self, path: Optional[str] = "mastery.db", alpha: float = 0.3, skip_threshold: float = 0.8, min_answers: int = 5):
+        """
+        Args:
+            path: SQLite database file (None keeps the store in memory)
+            alpha: Weight of the newest answer in the exponentially weighted accuracy
+            skip_threshold: Recent accuracy on a topic from which its diagnostic is skipped (above 1: never)
+            min_answers: Recent answers on a topic needed before the diagnostic can be skipped
+        """
+        self.path = path
+        self.alpha = alpha
+        self.skip_threshold = skip_threshold
+        self.min_answers = min_answers
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls) -> "MasteryStore":
+        """Create a store configured by the SLIMPAI_MASTERY_* environment variables (empty DB: in memory)."""
+        return cls(
+            path=os.getenv("SLIMPAI_MASTERY_DB", "mastery.db") or None,
+            alpha=float(os.getenv("SLIMPAI_MASTERY_ALPHA", "0.3")),
+            skip_threshold=float(os.getenv("SLIMPAI_MASTERY_SKIP_THRESHOLD", "0.8")),
+            min_answers=int(os.getenv("SLIMPAI_MASTERY_MIN_ANSWERS", "5")),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database on first use (caller holds the lock)."""
+        if self._db is None:
+            self._db = sqlite3.connect(self.path or ":memory:", check_same_thread=False, isolation_level=None, timeout=30)
+            self._db.row_factory = sqlite3.Row
+            if self.path:
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def open(self) -> None:
+        """Open the database now instead of on the first answer (see startup.py)."""
+        with self._lock:
+            self._connection()
+
+    def record(
+        self,
+        student_number: str,
+        topic: str,
+        skill: str,
+        question: Dict[str, Any],
+        chosen_index: int,
+        is_correct: bool,
+        latency_ms: Optional[int] = None,
+        kind: str = "diagnostic",
+        answered_at: Optional[float] = None,
+    ) -> None:
+        """
+        Append one graded answer and update the skill and topic aggregates.
+
+        Args:
+            student_number: The student's identification number
+            topic: The topic being studied (normalized before storing)
+            skill: The skill the question tests (the topic for diagnostic questions)
+            question: The question object ('question', 'options', ...)
+            chosen_index: The option the student picked
+            is_correct: Whether it was the right one
+            latency_ms: Time from showing the question to the answer, if known
+            kind: "diagnostic" or "check"
+            answered_at: Unix time of the answer (default: now)
+        """
+        topic = normalize_text(topic)
+        skill = normalize_text(skill)
+        now = answered_at or time.time()
+        outcome = "1" if is_correct else "0"
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "INSERT INTO answers (student_number, topic, skill, question_id, kind, chosen_index, is_correct, latency_ms, answered_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (student_number, topic, skill, question_id(question), kind, chosen_index, int(is_correct), latency_ms, now),
+                )
+                for key in {skill, ""}:
+                    row = db.execute(
+                        "SELECT ewma, recent FROM mastery WHERE student_number = ? AND topic = ? AND skill = ?",
+                        (student_number, topic, key),
+                    ).fetchone()
+                    ewma = float(is_correct) if row is None else (1 - self.alpha) * row["ewma"] + self.alpha * float(is_correct)
+                    recent = ((row["recent"] if row else "") + outcome)[-RECENT_WINDOW:]
+                    db.execute(
+                        "INSERT INTO mastery VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT (student_number, topic, skill) DO UPDATE SET"
+                        " attempts = attempts + 1, correct = correct + excluded.correct,"
+                        " latency_ms_total = latency_ms_total + excluded.latency_ms_total,"
+                        " ewma = excluded.ewma, recent = excluded.recent, last_answered_at = excluded.last_answered_at",
+                        (student_number, topic, key, int(is_correct), latency_ms or 0, ewma, recent, now),
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def student_mastery(self, student_number: str, topic: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Aggregates of one student, per topic and skill (skill "" is the whole topic)."""
+        query = "SELECT * FROM mastery WHERE student_number = ?"
+        params: List[Any] = [student_number]
+        if topic is not None:
+            query += " AND topic = ?"
+            params.append(topic_key(topic, add=False))
+        with self._lock:
+            rows = self._connection().execute(query + " ORDER BY topic, skill", params).fetchall()
+        return [_row_to_dict(row) for row in rows]
+
+    def topic_mastery(self, student_number: str, topic: str) -> Optional[Dict[str, Any]]:
+        """A student's topic-level aggregate, or None if they never answered on the topic."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT * FROM mastery WHERE student_number = ? AND topic = ? AND skill = ''",
+                (student_number, topic_key(topic, add=False)),
+            ).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def topic_summary(self, topic: str) -> List[Dict[str, Any]]:
+        """Class view of a topic: per skill, the number of students and their mean accuracy and EWMA."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT skill, COUNT(*) AS students, SUM(attempts) AS attempts,"
+                " AVG(CAST(correct AS REAL) / attempts) AS accuracy, AVG(ewma) AS ewma,"
+                " SUM(latency_ms_total) * 1.0 / SUM(attempts) AS avg_latency_ms"
+                " FROM mastery WHERE topic = ? GROUP BY skill ORDER BY skill",
+                (topic_key(topic, add=False),),
+            ).fetchall()
+        return [
+            {
+                "skill": row["skill"],
+                "students": row["students"],
+                "attempts": row["attempts"],
+                "accuracy": round(row["accuracy"], 3),
+                "ewma": round(row["ewma"], 3),
+                "avg_latency_ms": round(row["avg_latency_ms"] or 0),
+            }
+            for row in rows
+        ]
+
+    def save_plan(self, student_number: str, topic: str, plan: List[str]) -> None:
+        """Remember the lesson plan a student was given for a topic (replacing the previous one)."""
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO lesson_plans VALUES (?, ?, ?, ?)",
+                (student_number, normalize_text(topic), json.dumps(plan), time.time()),
+            )
+
+    def remaining_steps(self, student_number: str, topic: str) -> Optional[List[str]]:
+        """
+        The steps of a student's last plan on a topic they have not mastered yet.
+
+        Returns None, meaning the diagnostic should run, unless the student's last
+        ``min_answers`` or more answers on the topic are at least ``skip_threshold``
+        correct and a plan was saved for them. A step counts as mastered when its
+        weighted accuracy reaches the threshold; an empty list means every step is.
+        """
+        topic = topic_key(topic, add=False)
+        with self._lock:
+            db = self._connection()
+            plan_row = db.execute(
+                "SELECT plan FROM lesson_plans WHERE student_number = ? AND topic = ?", (student_number, topic)
+            ).fetchone()
+            rows = db.execute("SELECT * FROM mastery WHERE student_number = ? AND topic = ?", (student_number, topic)).fetchall()
+        skills = {row["skill"]: row for row in rows}
+        overall = skills.get("")
+        if plan_row is None or overall is None:
+            return None
+        recent = overall["recent"]
+        if len(recent) < self.min_answers or recent.count("1") / len(recent) < self.skip_threshold:
+            return None
+        mastered = {skill for skill, row in skills.items() if row["ewma"] >= self.skip_threshold}
+        return [step for step in json.loads(plan_row["plan"]) if normalize_text(step) not in mastered]
+
+    def history(self, student_number: str, topic: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """A student's most recent answers, newest first."""
+        query = "SELECT * FROM answers WHERE student_number = ?"
+        params: List[Any] = [student_number]
+        if topic is not None:
+            query += " AND topic = ?"
+            params.append(topic_key(topic, add=False))
+        with self._lock:
+            rows = self._connection().execute(query + " ORDER BY answered_at DESC, id DESC LIMIT ?", params + [limit]).fetchall()
+        return [{key: row[key] for key in row.keys() if key != "id"} for row in rows]
+
+
+def topic_key(topic: str, add: bool = True) -> str:
+    """
+    The topic a student's answers and plans are kept under: its canonical phrasing
+    (dedup.py), so "halving" and "Halving numbers" share one history.
+
+    With ``add=False`` (queries) a topic that matches no canonical entry is only
+    normalized, not added to the index.
+    """
+    from .dedup import TOPIC, dedup_index  # dedup.py loads the bank, which imports this module
+    if not topic:
+        return ""
+    return dedup_index.canonical(TOPIC, topic) if add else dedup_index.lookup(TOPIC, topic)
+
+
+def _latency_ms(state: MutableMapping[str, Any]) -> Optional[int]:
+    shown_at = progress.load(state).shown_at
+    return round((time.time() - shown_at) * 1000) if shown_at else None
+
+
+def record_quiz_answer(state: MutableMapping[str, Any], result: Dict[str, Any]) -> None:
+    """
+    Log a diagnostic answer just graded by ``quiz.answer``.
+
+    Call after ``quiz.answer``, with its result; answers that were not graded, or from
+    sessions without a student number, are ignored.
+    """
+    student_number = state.get("student_number")
+    if result.get("status") not in ("answered", "finished") or not student_number:
+        return
+    question = progress.question_store.get(progress.load(state).quiz.ids[result["question_index"]])
+    if question is None:
+        return
+    topic = topic_key(state.get("current_topic") or "")
+    mastery_store.record(
+        str(student_number), topic, topic, question, result["chosen_index"], result["is_correct"],
+        latency_ms=result.get("latency_ms"),
+    )
+
+
+def record_check_answer(state: MutableMapping[str, Any], step: str, question: Dict[str, Any], chosen_index: int, is_correct: bool) -> None:
+    """Log the answer to a lesson step's check question."""
+    student_number = state.get("student_number")
+    if not student_number:
+        return
+    mastery_store.record(
+        str(student_number), topic_key(state.get("current_topic") or ""), step, question, chosen_index, is_correct,
+        latency_ms=_latency_ms(state), kind="check",
+    )
+
+
+def record_plan(state: MutableMapping[str, Any], plan: List[str]) -> None:
+    """Remember the lesson plan just made for the session's student and topic."""
+    student_number = state.get("student_number")
+    if student_number and state.get("current_topic") and plan:
+        mastery_store.save_plan(str(student_number), topic_key(state["current_topic"]), plan)
+
+
+def remaining_steps(state: MutableMapping[str, Any], topic: str) -> Optional[List[str]]:
+    """``MasteryStore.remaining_steps`` for the session's student (None without a student number)."""
+    student_number = state.get("student_number")
+    if not student_number:
+        return None
+    return mastery_store.remaining_steps(str(student_number), topic_key(topic))
+
+
+def track_topic(tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Any) -> None:
+    """after_tool_callback for the LLM Guide: remember the Tester's topic and the Planner's plan."""
+    if tool.name == "Tester" and args.get("request"):
+        tool_context.state["current_topic"] = str(args["request"])
+    elif tool.name == "Planner":
+        plan = parse_output("lesson_plan", str(tool_response or "")).value
+        if plan:
+            record_plan(tool_context.state, plan)
+    return None
+
+
+# Shared by every writer in this process
+mastery_store = MasteryStore.from_env()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.mastery", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", default=os.getenv("SLIMPAI_MASTERY_DB", "mastery.db"), help="Mastery database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    student = commands.add_parser("student", help="One student's mastery per topic and skill")
+    student.add_argument("student_number")
+    student.add_argument("--topic")
+    student.add_argument("--history", type=int, default=0, help="Also show the last N answers")
+    topic = commands.add_parser("topic", help="Class summary of a topic per skill")
+    topic.add_argument("topic")
+    args = parser.parse_args(argv)
+
+    store = MasteryStore(args.db)
+    if args.command == "student":
+        report: Any = {"mastery": store.student_mastery(args.student_number, args.topic)}
+        if args.history:
+            report["history"] = store.history(args.student_number, args.topic, args.history)
+    else:
+        report = store.topic_summary(args.topic)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
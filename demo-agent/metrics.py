@@ -0,0 +1,466 @@
+"""
+Token, latency and tool-call instrumentation for every agent of the Guide flow.
+
+``instrument(root_agent)`` adds model and tool callbacks to the Guide and to every
+subagent reachable through its tools. Each model call records its latency and
+input/output tokens; each tool call records its latency and, for cached agent tools,
+whether the result came from the cache, the curriculum bank, an identical call in
+flight or the model. Records are labelled with the agent name and the student's
+session id (nested subagent runs are attributed to the Guide session that called them).
+
+Measurements are exposed in the Prometheus text format (served at ``/metrics`` by
+server.py) and, when SLIMPAI_METRICS_LOG is set, appended as JSON lines to that file.
+
+Usage:
+    python -m demo-agent.metrics report metrics.jsonl
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+from .cache import lookup_source
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# USD per million (input, output) tokens, used by the report to estimate cost
+MODEL_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+# Prices assumed for models not listed above (gemini-2.5-flash list prices)
+INPUT_PRICE_PER_M = float(os.getenv("SLIMPAI_INPUT_PRICE_PER_M", "0.30"))
+OUTPUT_PRICE_PER_M = float(os.getenv("SLIMPAI_OUTPUT_PRICE_PER_M", "2.50"))
+
+# Start times of the model/tool call in flight. ADK runs every tool call in its own
+# task and each agent's model calls sequentially, so a context variable is per call.
+_model_started: ContextVar[Optional[float]] = ContextVar("model_started", default=None)
+_model_name: ContextVar[str] = ContextVar("model_name", default="")
+_model_request: ContextVar[Optional[LlmRequest]] = ContextVar("model_request", default=None)
+_tool_started: ContextVar[Optional[float]] = ContextVar("tool_started", default=None)
+# Session id of the Guide conversation; subagent runs inherit it through their task
+_session_id: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 < pct <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class MetricsRegistry:
+    """
+    A minimal, thread-safe registry of labelled counters and histograms.
+
+    Rendering follows the Prometheus text exposition format. Collectors registered with
+    ``add_collector`` are called at render time to export values owned by other modules
+    (e.g. cache statistics) as gauges.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: Dict[str, Dict[Tuple, List[float]]] = defaultdict(dict)
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def inc(self, name: str, help_text: str, labels: Dict[str, str], amount: float = 1.0) -> None:
+        """Add ``amount`` to a counter."""
+        with self._lock:
+            self._help.setdefault(name, ("counter", help_text))
+            self._counters[name][tuple(sorted(labels.items()))] += amount
+
+    def observe(self, name: str, help_text: str, labels: Dict[str, str], value: float) -> None:
+        """Record one observation in a histogram."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help_text))
+            # Per label set: one count per bucket, then +Inf count, then sum
+            series = self._histograms[name].setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]) -> None:
+        """Register a callable yielding (name, help, labels, value) gauge samples at render time."""
+        self._collectors.append(collector)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(dict(key))} {_number(value)}" for key, value in sorted(series.items())]
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {self._help[name][1]}", f"# TYPE {name} histogram"]
+                for key, values in sorted(series.items()):
+                    labels = dict(key)
+                    for bound, count in zip(self.buckets, values):
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {_number(count)}")
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {_number(values[-2])}")
+                    lines.append(f"{name}_count{_labels(labels)} {_number(values[-2])}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(values[-1])}")
+        gauges: Dict[str, List[str]] = {}
+        for collector in self._collectors:
+            for name, help_text, labels, value in collector():
+                if name not in gauges:
+                    gauges[name] = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                gauges[name].append(f"{name}{_labels(labels)} {_number(value)}")
+        for samples in gauges.values():
+            lines += samples
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class JsonLog:
+    """Appends one JSON object per line to a file; a no-op when no path is configured."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line)
+
+
+registry = MetricsRegistry()
+json_log = JsonLog(os.getenv("SLIMPAI_METRICS_LOG") or None)
+# Called with (record, detail) for every model and tool call; see add_listener
+_listeners: List[Callable[[Dict[str, Any], Dict[str, Any]], None]] = []
+
+
+def _shared_stats() -> Iterable[Tuple[str, str, Dict[str, str], float]]:
+    """Statistics kept by the content cache, curriculum bank, history compaction, routing and output schemas."""
+    from .bank import curriculum_bank
+    from .cache import coalesce_stats, content_cache
+    from .compaction import compaction_stats
+    from .models import escalation_stats
+    from .schemas import outcome_stats
+
+    for event, value in content_cache.stats.items():
+        yield "slimpai_content_cache_events", "Content cache lookups and writes in this process", {"event": event}, value
+    for (agent, outcome), value in sorted(coalesce_stats.items()):
+        yield "slimpai_coalesced_calls", "Agent tool calls that waited for an identical generation in flight, by agent and outcome", {"agent": agent, "outcome": outcome}, value
+    for event, value in curriculum_bank.stats.items():
+        yield "slimpai_curriculum_bank_events", "Curriculum bank lookups in this process", {"event": event}, value
+    for field, value in compaction_stats.items():
+        yield "slimpai_history_compaction", "Guide history compactions and estimated prompt tokens before/after", {"field": field}, value
+    for (agent, reason), value in sorted(escalation_stats.items()):
+        yield "slimpai_model_escalations", "Requests retried on a stronger model, by agent and reason", {"agent": agent, "reason": reason}, value
+    for (agent, outcome), value in sorted(outcome_stats.items()):
+        yield "slimpai_structured_output", "Subagent JSON output by agent and outcome (valid/repaired/retried/failed)", {"agent": agent, "outcome": outcome}, value
+
+
+registry.add_collector(_shared_stats)
+
+
+def add_listener(listener: Callable[[Dict[str, Any], Dict[str, Any]], None]) -> None:
+    """
+    Call ``listener(entry, detail)`` for every model and tool call recorded from now on.
+
+    ``entry`` is the record written to the JSON log; ``detail`` holds what the log leaves
+    out: the LlmRequest and LlmResponse of a model call ("request", "response"), the
+    arguments and result of a tool call ("args", "result").
+    """
+    _listeners.append(listener)
+
+
+def current_session_id() -> Optional[str]:
+    """Session id of the Guide conversation the current model or tool call belongs to."""
+    return _session_id.get()
+
+
+def record(entry: Dict[str, Any], detail: Optional[Dict[str, Any]] = None) -> None:
+    """Add one model or tool call to the metrics, the JSON log and the listeners."""
+    agent = entry["agent"]
+    if entry["kind"] == "model":
+        registry.inc("slimpai_model_calls_total", "Model calls per agent and model", {"agent": agent, "model": entry.get("model", "")})
+        registry.observe("slimpai_model_latency_seconds", "Model call latency per agent", {"agent": agent}, entry["latency_ms"] / 1000)
+        registry.inc("slimpai_model_tokens_total", "Tokens per agent and direction", {"agent": agent, "direction": "input"}, entry["input_tokens"])
+        registry.inc("slimpai_model_tokens_total", "Tokens per agent and direction", {"agent": agent, "direction": "output"}, entry["output_tokens"])
+    else:
+        labels = {"agent": agent, "tool": entry["tool"]}
+        registry.inc("slimpai_tool_calls_total", "Tool calls per calling agent and tool", labels)
+        registry.observe("slimpai_tool_latency_seconds", "Tool call latency per calling agent and tool", labels, entry["latency_ms"] / 1000)
+        if entry.get("source"):
+            registry.inc(
+                "slimpai_tool_results_total", "Cached agent tool results by source (cache, bank, coalesced or model)",
+                {"tool": entry["tool"], "source": entry["source"]},
+            )
+    json_log.write(entry)
+    for listener in _listeners:
+        listener(entry, detail or {})
+
+
+@contextmanager
+def track_tool(agent_name: str, tool_name: str, session_id: str, args: Optional[Dict[str, Any]] = None):
+    """
+    Record a tool call made directly from code rather than through the model.
+
+    Usage:
+        with track_tool("Guide", tool.name, session.id, args) as call:
+            call["result"] = await tool.run_async(args=args, tool_context=tool_context)
+    """
+    _session_id.set(session_id)
+    lookup_source.set(None)
+    call: Dict[str, Any] = {"args": args}
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        record({
+            "ts": time.time(),
+            "kind": "tool",
+            "agent": agent_name,
+            "tool": tool_name,
+            "session_id": session_id,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "source": lookup_source.get(),
+        }, call)
+
+
+def _session(context: CallbackContext, is_root: bool) -> str:
+    if is_root or _session_id.get() is None:
+        _session_id.set(context.session.id)
+    return _session_id.get()
+
+
+def _callbacks(is_root: bool):
+    def before_model(callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+        _session(callback_context, is_root)
+        _model_name.set(llm_request.model or "")
+        _model_request.set(llm_request)
+        _model_started.set(time.perf_counter())
+
+    def after_model(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
+        started = _model_started.get()
+        if started is None or llm_response.partial:
+            return None
+        _model_started.set(None)
+        usage = llm_response.usage_metadata
+        record({
+            "ts": time.time(),
+            "kind": "model",
+            "agent": callback_context.agent_name,
+            "model": _model_name.get(),
+            "session_id": _session(callback_context, is_root),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "input_tokens": (usage.prompt_token_count or 0) if usage else 0,
+            "output_tokens": (usage.candidates_token_count or 0) if usage else 0,
+        }, {"request": _model_request.get(), "response": llm_response})
+        return None
+
+    def before_tool(tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext) -> None:
+        _session(tool_context, is_root)
+        lookup_source.set(None)
+        _tool_started.set(time.perf_counter())
+
+    def after_tool(tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Any) -> None:
+        started = _tool_started.get()
+        if started is None:
+            return None
+        record({
+            "ts": time.time(),
+            "kind": "tool",
+            "agent": tool_context.agent_name,
+            "tool": tool.name,
+            "session_id": _session(tool_context, is_root),
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "source": lookup_source.get(),
+        }, {"args": args, "result": tool_response})
+        return None
+
+    return before_model, after_model, before_tool, after_tool
+
+
+# ids of agents that already carry the metric callbacks
+_instrumented: set = set()
+
+
+def _as_list(callback) -> list:
+    if callback is None:
+        return []
+    return list(callback) if isinstance(callback, list) else [callback]
+
+
+def instrument(root_agent) -> None:
+    """
+    Add the metric callbacks to ``root_agent`` and every subagent reachable through its tools.
+
+    The timing callbacks go first in each callback list, so they run even when a later
+    before-callback (such as the quiz fast path) answers without calling the model.
+    Agents that are not LlmAgents (the code-driven Guide workflow) are only searched for
+    subagents; they record their own tool calls with ``track_tool``. Instrumenting an
+    agent twice has no effect.
+    """
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.agent_tool import AgentTool
+
+    pending = [(root_agent, True)]
+    while pending:
+        agent, is_root = pending.pop()
+        if id(agent) in _instrumented:
+            continue
+        _instrumented.add(id(agent))
+        if isinstance(agent, LlmAgent):
+            before_model, after_model, before_tool, after_tool = _callbacks(is_root)
+            agent.before_model_callback = [before_model] + _as_list(agent.before_model_callback)
+            agent.after_model_callback = [after_model] + _as_list(agent.after_model_callback)
+            agent.before_tool_callback = [before_tool] + _as_list(agent.before_tool_callback)
+            agent.after_tool_callback = [after_tool] + _as_list(agent.after_tool_callback)
+        for sub_agent in agent.sub_agents:
+            pending.append((sub_agent, False))
+        for tool in getattr(agent, "tools", []):
+            if isinstance(tool, AgentTool):
+                pending.append((tool.agent, False))
+
+
+def load_records(path: str) -> List[Dict[str, Any]]:
+    """Read a JSON-lines metrics log, skipping lines that are not valid JSON."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def summarize(records: List[Dict[str, Any]], input_price: float = INPUT_PRICE_PER_M, output_price: float = OUTPUT_PRICE_PER_M) -> Dict[str, Any]:
+    """
+    Aggregate log records into a per-agent latency/cost breakdown and per-tool statistics.
+
+    Costs use MODEL_PRICES for known models and ``input_price``/``output_price`` otherwise.
+
+    Returns:
+        Dict[str, Any]: 'agents' (model calls, latency percentiles, tokens and estimated
+        cost per agent), 'tools' (calls, latency percentiles and result sources per tool)
+        and 'sessions' (number of distinct session ids).
+    """
+    models: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    tools: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for entry in records:
+        if entry.get("kind") == "model":
+            models[entry["agent"]].append(entry)
+        elif entry.get("kind") == "tool":
+            tools[entry["tool"]].append(entry)
+
+    def cost(call: Dict[str, Any]) -> float:
+        in_price, out_price = MODEL_PRICES.get(call.get("model", ""), (input_price, output_price))
+        return (call.get("input_tokens", 0) * in_price + call.get("output_tokens", 0) * out_price) / 1_000_000
+
+    agents = {}
+    for agent, calls in sorted(models.items()):
+        latencies = [c["latency_ms"] for c in calls]
+        input_tokens = sum(c.get("input_tokens", 0) for c in calls)
+        output_tokens = sum(c.get("output_tokens", 0) for c in calls)
+        agents[agent] = {
+            "models": sorted({c.get("model", "") for c in calls if c.get("model")}),
+            "calls": len(calls),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "total_s": round(sum(latencies) / 1000, 2),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": round(sum(cost(c) for c in calls), 6),
+        }
+    tool_stats = {}
+    for tool, calls in sorted(tools.items()):
+        latencies = [c["latency_ms"] for c in calls]
+        sources: Dict[str, int] = defaultdict(int)
+        for c in calls:
+            if c.get("source"):
+                sources[c["source"]] += 1
+        tool_stats[tool] = {
+            "calls": len(calls),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "total_s": round(sum(latencies) / 1000, 2),
+            "sources": dict(sources),
+        }
+    sessions = {entry.get("session_id") for entry in records if entry.get("session_id")}
+    return {"agents": agents, "tools": tool_stats, "sessions": len(sessions)}
+
+
+def format_report(summary: Dict[str, Any]) -> str:
+    """Render a summary from ``summarize`` as plain-text tables."""
+    lines = [f"Sessions: {summary['sessions']}", "", "Model calls per agent:"]
+    lines.append(f"  {'agent':<12}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}{'tokens in':>11}{'tokens out':>11}{'cost $':>11}  models")
+    for agent, s in summary["agents"].items():
+        lines.append(
+            f"  {agent:<12}{s['calls']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['total_s']:>10.2f}"
+            f"{s['input_tokens']:>11}{s['output_tokens']:>11}{s['cost_usd']:>11.4f}  {', '.join(s['models']) or '-'}"
+        )
+    total_cost = sum(s["cost_usd"] for s in summary["agents"].values())
+    lines += [f"  Total estimated cost: ${total_cost:.4f}", "", "Tool calls:"]
+    lines.append(f"  {'tool':<16}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'total s':>10}  sources")
+    for tool, s in summary["tools"].items():
+        sources = ", ".join(f"{k}={v}" for k, v in sorted(s["sources"].items())) or "-"
+        lines.append(f"  {tool:<16}{s['calls']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['total_s']:>10.2f}  {sources}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.metrics", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="Per-agent latency/cost breakdown of a JSON metrics log")
+    report.add_argument("log", help="File written via SLIMPAI_METRICS_LOG")
+    report.add_argument("--input-price", type=float, default=INPUT_PRICE_PER_M, help="USD per million input tokens for models without a known price")
+    report.add_argument("--output-price", type=float, default=OUTPUT_PRICE_PER_M, help="USD per million output tokens for models without a known price")
+    report.add_argument("--json", action="store_true", help="Print the breakdown as JSON")
+    args = parser.parse_args(argv)
+
+    summary = summarize(load_records(args.log), args.input_price, args.output_price)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_report(summary))
+
+
+if __name__ == "__main__":
+    main()
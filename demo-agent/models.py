@@ -0,0 +1,268 @@
+"""
+Per-agent model routing.
+
+Each agent runs on the cheapest model that meets its bar: the short, templated
+Explainer and Quizzer output goes to a lite model, while the Guide's multi-step
+orchestration stays on a larger one. Agents whose output is machine-read (Tester,
+Planner, Quizzer) have their answers checked against a schema and repaired locally
+where possible (schemas.py); if the answer cannot be repaired, or its average
+log-probability is below a threshold, the same request is retried once, on the
+stronger ``escalate_to`` model if one is configured.
+
+Routes are configured per agent name, from (later entries win):
+    1. DEFAULT_ROUTES below
+    2. SLIMPAI_MODEL_ROUTES: a JSON object, inline or the path of a JSON file, e.g.
+       {"Quizzer": {"model": "local/llama3.1", "escalate_to": "gemini-2.5-flash"}}
+    3. SLIMPAI_MODEL_<AGENT> / SLIMPAI_ESCALATE_<AGENT>, e.g. SLIMPAI_MODEL_EXPLAINER
+
+Model names are Gemini model ids, any LiteLLM "<provider>/<model>" id, "local/<model>"
+for an OpenAI-compatible endpoint at SLIMPAI_LOCAL_API_BASE (e.g. Ollama or vLLM), or
+"fake" for the offline scripted model in fake_llm.py (delay per call from
+SLIMPAI_FAKE_LATENCY / SLIMPAI_FAKE_JITTER seconds).
+"""
+import json
+import os
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple, Union
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from .schemas import AGENT_SCHEMAS, parse_output, record_outcome
+
+DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "Guide": {"model": "gemini-2.5-flash"},
+    "Tester": {"model": "gemini-2.5-flash", "escalate_to": "gemini-2.5-pro"},
+    "Planner": {"model": "gemini-2.5-flash-lite", "escalate_to": "gemini-2.5-flash"},
+    "Explainer": {"model": "gemini-2.5-flash-lite"},
+    "Quizzer": {"model": "gemini-2.5-flash-lite", "escalate_to": "gemini-2.5-flash"},
+    "Encourager": {"model": "gemini-2.5-flash-lite"},
+}
+
+LOCAL_API_BASE = os.getenv("SLIMPAI_LOCAL_API_BASE", "http://localhost:11434/v1")
+LOCAL_API_KEY = os.getenv("SLIMPAI_LOCAL_API_KEY", "not-needed")
+
+# Escalations per agent and reason, e.g. {("Quizzer", "invalid"): 3}
+escalation_stats: Dict[tuple, int] = {}
+
+
+class EscalatingLlm(BaseLlm):
+    """
+    Calls ``primary`` and, if its answer is unusable, repeats the request on ``fallback``.
+
+    When the agent has an ``output_schema`` (see schemas.py), the answer is first
+    validated and, if needed, repaired locally; the repaired JSON replaces the model's
+    text. Only output that cannot be repaired is retried. An answer is also unusable when
+    it is an error or when its average log-probability is below ``min_avg_logprob``.
+    Responses that call a tool are always accepted. Streaming requests are passed to the
+    primary model unchanged, as partial output cannot be taken back.
+    """
+
+    primary: BaseLlm
+    fallback: BaseLlm
+    output_schema: Optional[str] = None
+    min_avg_logprob: Optional[float] = None
+
+    def __init__(self, **data):
+        data.setdefault("model", data["primary"].model)
+        super().__init__(**data)
+
+    def _check(self, response: LlmResponse) -> Tuple[Optional[str], Optional[str]]:
+        """Return (escalation reason or None, schema outcome or None) and repair ``response`` in place."""
+        if response.error_code or response.content is None:
+            return "error", None
+        parts = response.content.parts or []
+        if any(part.function_call for part in parts):
+            return None, None
+        outcome = None
+        if self.output_schema is not None:
+            text = "".join(part.text or "" for part in parts if not part.thought)
+            result = parse_output(self.output_schema, text)
+            outcome = result.outcome
+            if result.outcome == "invalid":
+                return "invalid", outcome
+            if result.outcome == "repaired":
+                repaired = types.Part(text=json.dumps(result.value))
+                response.content.parts = [part for part in parts if part.thought] + [repaired]
+        if self.min_avg_logprob is not None and response.avg_logprobs is not None and response.avg_logprobs < self.min_avg_logprob:
+            return "low_confidence", outcome
+        return None, outcome
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if stream:
+            llm_request.model = self.primary.model
+            async for response in self.primary.generate_content_async(llm_request, stream=True):
+                yield response
+            return
+
+        agent = (llm_request.config.labels or {}).get("adk_agent_name", "") if llm_request.config else ""
+        retry_request = llm_request.model_copy(deep=True)
+        llm_request.model = self.primary.model
+        responses = [r async for r in self.primary.generate_content_async(llm_request)]
+        reason, outcome = self._check(responses[-1]) if responses else ("error", None)
+        if reason is None:
+            if outcome is not None:
+                record_outcome(agent, outcome)
+            for response in responses:
+                yield response
+            return
+
+        escalation_stats[(agent, reason)] = escalation_stats.get((agent, reason), 0) + 1
+        retry_request.model = self.fallback.model
+        responses = [r async for r in self.fallback.generate_content_async(retry_request)]
+        if self.output_schema is not None and reason == "invalid":
+            _, outcome = self._check(responses[-1]) if responses else (None, "invalid")
+            record_outcome(agent, "failed" if outcome == "invalid" else "retried")
+        for response in responses:
+            yield response
+
+
+def build_model(name: str, api_base: Optional[str] = None, api_key: Optional[str] = None) -> Union[str, BaseLlm]:
+    """
+    Turn a model name from the routing configuration into something LlmAgent accepts.
+
+    Args:
+        name: Gemini model id, LiteLLM "<provider>/<model>" id, "local/<model>" or "fake"
+        api_base: Endpoint for LiteLLM models (defaults to SLIMPAI_LOCAL_API_BASE for "local/")
+        api_key: API key for that endpoint
+
+    Returns:
+        Union[str, BaseLlm]: The Gemini model id itself, or a model instance.
+    """
+    if name == "fake":
+        from .fake_llm import FakeLlm
+
+        return FakeLlm(
+            latency=float(os.getenv("SLIMPAI_FAKE_LATENCY", "0")),
+            jitter=float(os.getenv("SLIMPAI_FAKE_JITTER", "0")),
+        )
+    if name.startswith("local/"):
+        from google.adk.models.lite_llm import LiteLlm
+
+        return LiteLlm(model="openai/" + name[len("local/"):], api_base=api_base or LOCAL_API_BASE, api_key=api_key or LOCAL_API_KEY)
+    if "/" in name:
+        from google.adk.models.lite_llm import LiteLlm
+
+        extra = {k: v for k, v in (("api_base", api_base), ("api_key", api_key)) if v}
+        return LiteLlm(model=name, **extra)
+    return name
+
+
+def _as_llm(model: Union[str, BaseLlm]) -> BaseLlm:
+    if isinstance(model, BaseLlm):
+        return model
+    from google.adk.models.registry import LLMRegistry
+
+    return LLMRegistry.new_llm(model)
+
+
+def load_routes() -> Dict[str, Dict[str, Any]]:
+    """The routing table: defaults, overlaid with SLIMPAI_MODEL_ROUTES and per-agent variables."""
+    routes = {agent: dict(route) for agent, route in DEFAULT_ROUTES.items()}
+    configured = os.getenv("SLIMPAI_MODEL_ROUTES", "").strip()
+    if configured:
+        if not configured.startswith("{"):
+            with open(configured, encoding="utf-8") as f:
+                configured = f.read()
+        for agent, route in json.loads(configured).items():
+            routes.setdefault(agent, {}).update({"model": route} if isinstance(route, str) else route)
+    for agent, route in routes.items():
+        if os.getenv(f"SLIMPAI_MODEL_{agent.upper()}"):
+            route["model"] = os.environ[f"SLIMPAI_MODEL_{agent.upper()}"]
+        if f"SLIMPAI_ESCALATE_{agent.upper()}" in os.environ:
+            # An empty value turns escalation off
+            route["escalate_to"] = os.environ[f"SLIMPAI_ESCALATE_{agent.upper()}"] or None
+    return routes
+
+
+def model_for(agent_name: str, routes: Optional[Dict[str, Dict[str, Any]]] = None) -> Union[str, BaseLlm]:
+    """
+    The model an agent should be constructed with.
+
+    Args:
+        agent_name: Name of the agent (a key of the routing table)
+        routes: Routing table; defaults to ``load_routes()``
+
+    Returns:
+        Union[str, BaseLlm]: A model id or instance, wrapped in EscalatingLlm when the
+        route has an ``escalate_to`` model or the agent has an output schema.
+    """
+    routes = routes if routes is not None else load_routes()
+    route = routes.get(agent_name, DEFAULT_ROUTES["Guide"])
+    primary = build_model(route["model"], route.get("api_base"), route.get("api_key"))
+    schema = AGENT_SCHEMAS.get(agent_name)
+    if not route.get("escalate_to") and schema is None:
+        return primary
+    primary = _as_llm(primary)
+    if route.get("escalate_to"):
+        fallback = _as_llm(build_model(route["escalate_to"], route.get("escalate_api_base"), route.get("escalate_api_key")))
+    else:
+        # No stronger model configured: retry unrepairable output on the same one
+        fallback = primary
+    return EscalatingLlm(
+        primary=primary,
+        fallback=fallback,
+        output_schema=schema,
+        min_avg_logprob=route.get("min_avg_logprob"),
+    )
+
+
+def warm_up_models(root_agent) -> Dict[str, str]:
+    """
+    Create the model clients of ``root_agent`` and every subagent before the first request.
+
+    Agents configured with a Gemini model id would otherwise build a new model object,
+    and with it a new API client (credentials lookup, connection pool), on every call.
+    Each id is replaced by one shared model instance whose client is created now.
+    Wrapped models (escalation, admission control) are prepared through to the models
+    they call.
+
+    Returns:
+        Dict[str, str]: Per model name, "ready" or the error that prevented creating its client.
+    """
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.agent_tool import AgentTool
+
+    from .admission import ScheduledLlm
+
+    shared: Dict[str, BaseLlm] = {}
+    status: Dict[str, str] = {}
+
+    def prepare(llm: BaseLlm) -> None:
+        if isinstance(llm, EscalatingLlm):
+            prepare(llm.primary)
+            prepare(llm.fallback)
+            return
+        if isinstance(llm, ScheduledLlm):
+            prepare(llm.inner)
+            return
+        if llm.model in status:
+            return
+        try:
+            # Gemini creates its google.genai client on first access
+            if hasattr(type(llm), "api_client"):
+                llm.api_client
+            status[llm.model] = "ready"
+        except Exception as e:
+            status[llm.model] = f"error: {e}"
+
+    pending, seen = [root_agent], set()
+    while pending:
+        agent = pending.pop()
+        if id(agent) in seen:
+            continue
+        seen.add(id(agent))
+        if isinstance(agent, LlmAgent) and agent.model:
+            if isinstance(agent.model, str):
+                if agent.model not in shared:
+                    shared[agent.model] = _as_llm(agent.model)
+                agent.model = shared[agent.model]
+            prepare(agent.model)
+        pending.extend(agent.sub_agents)
+        for tool in getattr(agent, "tools", []):
+            if isinstance(tool, AgentTool):
+                pending.append(tool.agent)
+    return status
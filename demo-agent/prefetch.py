@@ -0,0 +1,149 @@
+"""
+Speculative prefetch of upcoming lesson steps.
+
+In the lesson loop the Explainer and then the Quizzer run only after the student has
+answered the previous check question, so every step costs two back-to-back model calls
+of waiting. As soon as a lesson plan is known, the Prefetcher generates the explanation
+and check question of every later step in the background (asyncio tasks sharing a
+concurrency limit) and parks them in the content cache under the exact keys the
+Explainer/Quizzer tools will look up. When the Guide reaches a step whose prefetch is
+still running, it waits for that task instead of generating the same content twice.
+A new plan for the session (e.g. a new topic) cancels the prefetches of the old one.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+
+from .admission import background
+from .metrics import registry
+from .schemas import parse_output
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Background generation of lesson content, keyed by session and lesson step.
+
+    Use ``schedule`` when a plan is known, ``wait`` before teaching a step and
+    ``cancel`` when the session's plan is abandoned. For the LLM Guide, the same is
+    done by ``after_tool_callback`` / ``before_tool_callback``.
+    """
+
+    def __init__(self, explainer_tool, quizzer_tool, concurrency: int = 4, wait_timeout: float = 60.0, enabled: bool = True):
+        """
+        Args:
+            explainer_tool: The cached Explainer tool whose cache receives the explanations
+            quizzer_tool: The cached Quizzer tool whose cache receives the check questions
+            concurrency: Maximum prefetch model calls in flight, across all sessions
+            wait_timeout: Longest time a step waits for its prefetch before generating itself
+            enabled: When False, every method is a no-op
+        """
+        self.explainer_tool = explainer_tool
+        self.quizzer_tool = quizzer_tool
+        self.wait_timeout = wait_timeout
+        self.enabled = enabled
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # session id -> (plan, {lesson step: task})
+        self._sessions: Dict[str, Tuple[Tuple[str, ...], Dict[str, asyncio.Task]]] = {}
+        self.stats = {"scheduled": 0, "completed": 0, "cancelled": 0, "failed": 0, "waited": 0}
+        registry.add_collector(self._samples)
+
+    @classmethod
+    def from_env(cls, explainer_tool, quizzer_tool) -> "Prefetcher":
+        """Configure from SLIMPAI_PREFETCH, SLIMPAI_PREFETCH_CONCURRENCY and SLIMPAI_PREFETCH_WAIT."""
+        return cls(
+            explainer_tool,
+            quizzer_tool,
+            concurrency=int(os.getenv("SLIMPAI_PREFETCH_CONCURRENCY", "4")),
+            wait_timeout=float(os.getenv("SLIMPAI_PREFETCH_WAIT", "60")),
+            enabled=os.getenv("SLIMPAI_PREFETCH", "true").lower() in ("1", "true", "yes"),
+        )
+
+    def schedule(self, session_id: str, plan: List[str], start: int = 1) -> None:
+        """
+        Start prefetching the steps of ``plan`` from index ``start`` on.
+
+        Steps already being prefetched for the same plan are left alone; if the session
+        had a different plan, its outstanding prefetches are cancelled first.
+        """
+        if not self.enabled or not self.explainer_tool.cache.enabled:
+            # Nowhere to park the results
+            return
+        plan_key = tuple(plan)
+        current = self._sessions.get(session_id)
+        if current is not None and current[0] != plan_key:
+            self.cancel(session_id)
+        tasks = self._sessions.setdefault(session_id, (plan_key, {}))[1]
+        for step in plan[start:]:
+            if step in tasks:
+                continue
+            task = asyncio.create_task(self._warm(step))
+            tasks[step] = task
+            task.add_done_callback(lambda t, step=step: self._done(session_id, step, t))
+            self.stats["scheduled"] += 1
+
+    async def wait(self, session_id: str, step: str) -> None:
+        """Wait (up to wait_timeout) for a running prefetch of ``step``, if there is one."""
+        task = self._sessions.get(session_id, ((), {}))[1].get(step)
+        if task is None or task.done():
+            return
+        self.stats["waited"] += 1
+        # asyncio.wait leaves the task running if the timeout expires
+        await asyncio.wait({task}, timeout=self.wait_timeout)
+
+    def cancel(self, session_id: str) -> None:
+        """Cancel every outstanding prefetch of a session."""
+        _, tasks = self._sessions.pop(session_id, ((), {}))
+        for task in tasks.values():
+            if not task.done():
+                task.cancel()
+
+    def _done(self, session_id: str, step: str, task: asyncio.Task) -> None:
+        if task.cancelled():
+            self.stats["cancelled"] += 1
+        elif task.exception() is not None:
+            self.stats["failed"] += 1
+            logger.warning("Prefetch of %r failed: %s", step, task.exception())
+        else:
+            self.stats["completed"] += 1
+        entry = self._sessions.get(session_id)
+        if entry is not None and entry[1].get(step) is task:
+            del entry[1][step]
+            if not entry[1]:
+                del self._sessions[session_id]
+
+    async def _warm(self, step: str) -> None:
+        # Students' own turns get model call slots first (admission.py)
+        with background():
+            explanation = await self._generate(self.explainer_tool, step)
+            if explanation:
+                await self._generate(self.quizzer_tool, explanation)
+
+    async def _generate(self, tool, request: str) -> Optional[str]:
+        """Return the tool's result for ``request`` from its cache, generating and storing it if needed."""
+        entry = await tool.generate(request, limiter=self._semaphore, app_name="slimpai_prefetch")
+        return entry["result"]
+
+    def after_tool_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext, tool_response: Any) -> None:
+        """LLM Guide hook: start prefetching as soon as the Planner returns a plan."""
+        if tool.name != "Planner" or not self.enabled:
+            return None
+        plan = parse_output("lesson_plan", str(tool_response)).value
+        if plan:
+            self.schedule(tool_context.session.id, plan)
+        return None
+
+    async def before_tool_callback(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext) -> None:
+        """LLM Guide hook: let the Explainer wait for an in-flight prefetch of its step."""
+        if tool.name == "Explainer" and self.enabled:
+            await self.wait(tool_context.session.id, str(args.get("request", "")))
+        return None
+
+    def _samples(self):
+        for event, value in self.stats.items():
+            yield "slimpai_prefetch_events", "Lesson step prefetches by outcome", {"event": event}, value
@@ -0,0 +1,528 @@
+"""
+Compact, versioned session state for quiz and lesson progress.
+
+Session state is copied into the state delta of every event that changes it and
+stored with the session, so its size is paid on every turn. Before version 1 the
+quiz and lesson were spread over many keys: the full question list under 'quiz', a
+growing 'quiz_results' list repeating each question's text, the last 'question' and
+'answer', 'test_results_json', 'lesson_plan', 'lesson_results', 'check_question' and
+five counters.
+
+Version 1 keeps one small typed record under 'progress':
+
+    {"v": 1,
+     "quiz": {"ids": ["3f2a9c0d1e4b5a67", ...], "at": 2, "correct": 1},
+     "lesson": {"plan": ["Halving even numbers", ...], "at": 1, "answered": 1, "correct": 1, "check": "9c1e..."},
+     "shown_at": 1760000000.123}
+
+Questions are kept once, addressed by a hash of their content, in a ``QuestionStore``
+shared by every session and process on the host (a table in SLIMPAI_QUESTION_DB, by default
+the mastery database). State only holds their ids. Outcomes are bit-packed: bit i of
+``correct`` is set when question (or lesson step) i was answered correctly, and the
+score, counts and the Planner's 'test_results_json' are derived from it.
+
+Sessions written with the old keys keep working: ``load`` reads them into a
+``Progress`` record, and ``save`` writes the record and clears the old keys, so a
+session is migrated on its first write. ``migrate`` rewrites the sessions in a
+SQLite session database up front.
+
+Usage:
+    python -m demo-agent.progress bench --questions 3 --steps 3
+    python -m demo-agent.progress migrate --db agent_store.db
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, MutableMapping, Optional
+
+from pydantic import BaseModel
+
+from .cache import normalize_text
+
+STATE_VERSION = 1
+PROGRESS_KEY = "progress"
+
+# Keys of the unversioned layout, cleared when a session is saved in version 1
+LEGACY_KEYS = (
+    "quiz", "quiz_started", "quiz_finished", "current_question_index", "correct_answers", "total_answered",
+    "score_percentage", "quiz_results", "test_results_json", "question", "answer", "question_shown_at",
+    "lesson_plan", "lesson_step_index", "lesson_results", "lesson_progress", "check_question",
+)
+
+
+def question_id(question: Dict[str, Any]) -> str:
+    """Stable short id of a question, from its text and options."""
+    material = json.dumps([normalize_text(question["question"]), [normalize_text(o) for o in question["options"]]])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def stored_id(question: Dict[str, Any]) -> str:
+    """Id of a question in the question store: a hash of its exact text, options and answer."""
+    return hashlib.sha256(json.dumps(question, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _bits(outcomes: List[bool]) -> int:
+    return sum(1 << i for i, ok in enumerate(outcomes) if ok)
+
+
+class QuizProgress(BaseModel):
+    """A diagnostic quiz: its question ids, how far the student is and what they got right."""
+
+    ids: List[str]
+    at: int = 0
+    """Questions answered so far, which is also the index of the current question."""
+    correct: int = 0
+    """Bit i set: question i was answered correctly."""
+
+    @property
+    def finished(self) -> bool:
+        return self.at >= len(self.ids)
+
+    @property
+    def correct_answers(self) -> int:
+        return bin(self.correct).count("1")
+
+    @property
+    def score_percentage(self) -> int:
+        return round(100 * self.correct_answers / self.at) if self.at else 0
+
+    def outcomes(self) -> List[bool]:
+        """Correctness of each answered question, in order."""
+        return [bool(self.correct >> i & 1) for i in range(self.at)]
+
+
+class LessonProgress(BaseModel):
+    """A lesson plan, the step being taught and the outcomes of its check questions."""
+
+    plan: List[str]
+    at: int = 0
+    """Index of the current lesson step."""
+    answered: int = 0
+    """Bit i set: the check question of step i was answered."""
+    correct: int = 0
+    """Bit i set: it was answered correctly."""
+    check: Optional[str] = None
+    """Question id of the current step's check question, if it has one."""
+
+    @property
+    def step(self) -> str:
+        return self.plan[self.at]
+
+    @property
+    def checks_answered(self) -> int:
+        return bin(self.answered).count("1")
+
+    @property
+    def checks_correct(self) -> int:
+        return bin(self.correct).count("1")
+
+    def record_check(self, is_correct: bool) -> None:
+        self.answered |= 1 << self.at
+        if is_correct:
+            self.correct |= 1 << self.at
+
+
+class Progress(BaseModel):
+    """Everything a session tracks about the current quiz and lesson."""
+
+    v: int = STATE_VERSION
+    quiz: Optional[QuizProgress] = None
+    lesson: Optional[LessonProgress] = None
+    shown_at: Optional[float] = None
+    """Unix time the current quiz or check question was shown (for answer times)."""
+
+
+class QuestionStore:
+    """
+    Content-addressed store of quiz and check questions.
+
+    Questions are written once and never change, so an in-process LRU answers most
+    lookups; the SQLite table is shared by every process using the same file. A question
+    not stored again (``put``) for ``ttl`` seconds is purged, like expired cache entries;
+    storing it again, which every new quiz and replayed cache entry does, keeps it.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 4096, ttl: float = 7 * 24 * 3600, purge_interval: float = 3600.0):
+        """
+        Args:
+            path: SQLite database file, or None to keep questions in memory only
+            memory_size: Questions kept in the in-process LRU (everything, without a file)
+            ttl: Seconds a question is kept after it was last stored; keep it above the
+                session store's TTL, or old sessions lose their quiz
+            purge_interval: Seconds between purges of expired questions (and between
+                refreshes of a question's storage time)
+        """
+        self.path = path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        # question id -> (time last stored, question)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._purged_at = 0.0
+
+    @classmethod
+    def from_env(cls) -> "QuestionStore":
+        """Open SLIMPAI_QUESTION_DB (default: the SLIMPAI_MASTERY_DB file; empty keeps questions in memory) with SLIMPAI_QUESTION_TTL."""
+        return cls(
+            os.getenv("SLIMPAI_QUESTION_DB", os.getenv("SLIMPAI_MASTERY_DB", "mastery.db")) or None,
+            ttl=float(os.getenv("SLIMPAI_QUESTION_TTL", str(7 * 24 * 3600))),
+        )
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """Open the database on first use (caller holds the lock)."""
+        if self.path is None:
+            return None
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS questions (id TEXT PRIMARY KEY, body TEXT NOT NULL, created REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS questions_created ON questions (created)")
+        return self._db
+
+    def open(self) -> None:
+        """Open the database now instead of on the first question (see startup.py)."""
+        with self._lock:
+            self._connection()
+
+    def _remember(self, qid: str, stored: float, question: Dict[str, Any]) -> None:
+        self._memory[qid] = (stored, question)
+        self._memory.move_to_end(qid)
+        if self.path is not None:
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def put(self, question: Dict[str, Any]) -> str:
+        """Store a validated question and return its id."""
+        qid = stored_id(question)
+        now = time.time()
+        with self._lock:
+            known = self._memory.get(qid)
+            if known is not None and now - known[0] < self.purge_interval:
+                self._memory.move_to_end(qid)
+                return qid
+            db = self._connection()
+            if db is not None:
+                db.execute(
+                    "INSERT INTO questions VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE SET created = excluded.created",
+                    (qid, json.dumps(question), now),
+                )
+            self._remember(qid, now, question)
+            if now - self._purged_at >= self.purge_interval:
+                self._purge(now)
+        return qid
+
+    def get(self, qid: str) -> Optional[Dict[str, Any]]:
+        """The question with id ``qid``, or None if it is not in the store (or expired)."""
+        now = time.time()
+        with self._lock:
+            known = self._memory.get(qid)
+            if known is not None and now - known[0] <= self.ttl:
+                self._memory.move_to_end(qid)
+                return known[1]
+            db = self._connection()
+            row = db.execute("SELECT body, created FROM questions WHERE id = ? AND created >= ?", (qid, now - self.ttl)).fetchone() if db is not None else None
+            if row is None:
+                return None
+            question = json.loads(row[0])
+            self._remember(qid, row[1], question)
+            return question
+
+    def purge(self) -> int:
+        """Delete the questions not stored for ``ttl`` seconds; return how many were removed."""
+        with self._lock:
+            return self._purge(time.time())
+
+    def _purge(self, now: float) -> int:
+        """Delete expired questions from both tiers (caller holds the lock)."""
+        self._purged_at = now
+        cutoff = now - self.ttl
+        expired = [qid for qid, (stored, _) in self._memory.items() if stored < cutoff]
+        for qid in expired:
+            del self._memory[qid]
+        db = self._connection()
+        if db is None:
+            return len(expired)
+        return db.execute("DELETE FROM questions WHERE created < ?", (cutoff,)).rowcount
+
+    def get_many(self, ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """The questions with the given ids, in order, or None if any is missing."""
+        questions = [self.get(qid) for qid in ids]
+        return None if any(q is None for q in questions) else questions
+
+
+def _from_legacy(state: MutableMapping[str, Any], progress: Progress) -> Progress:
+    """Overlay the values found under the unversioned keys onto ``progress``."""
+    progress = progress.model_copy(deep=True)
+    quiz = state.get("quiz")
+    if quiz:
+        results = state.get("quiz_results") or []
+        progress.quiz = QuizProgress(
+            ids=[question_store.put(question) for question in quiz],
+            at=int(state.get("current_question_index") or len(results)),
+            correct=_bits([bool(r.get("is_correct")) for r in results]),
+        )
+    plan = state.get("lesson_plan")
+    if plan:
+        lesson = LessonProgress(plan=[str(step) for step in plan])
+        if state.get("lesson_step_index") is not None:
+            lesson.at = int(state["lesson_step_index"])
+        elif state.get("lesson_progress"):
+            # Written by history compaction in the LLM Guide
+            lesson.at = max(0, len(state["lesson_progress"].get("explained_steps") or []) - 1)
+        for result in state.get("lesson_results") or []:
+            if result.get("step") in lesson.plan:
+                index = lesson.plan.index(result["step"])
+                lesson.answered |= 1 << index
+                if result.get("is_correct"):
+                    lesson.correct |= 1 << index
+        if state.get("check_question"):
+            lesson.check = question_store.put(state["check_question"])
+        progress.lesson = lesson
+    if state.get("question_shown_at") is not None:
+        progress.shown_at = state["question_shown_at"]
+    return progress
+
+
+def load(state: MutableMapping[str, Any]) -> Progress:
+    """
+    The session's progress record.
+
+    State with values under the unversioned keys (older sessions, or cached entries
+    and bank content generated before version 1) is read as if it had been migrated;
+    nothing is written until ``save``.
+
+    Raises:
+        ValueError: If the record was written by a newer state version.
+    """
+    stored = state.get(PROGRESS_KEY)
+    if stored and stored.get("v", STATE_VERSION) > STATE_VERSION:
+        raise ValueError(f"Session progress has version {stored['v']}; this release reads up to {STATE_VERSION}")
+    progress = Progress.model_validate(stored) if stored else Progress()
+    if any(state.get(key) is not None for key in LEGACY_KEYS):
+        progress = _from_legacy(state, progress)
+    return progress
+
+
+def save(state: MutableMapping[str, Any], progress: Progress) -> None:
+    """Write the progress record to state and clear any unversioned keys left from before."""
+    if progress.shown_at is not None:
+        progress.shown_at = round(progress.shown_at, 3)
+    state[PROGRESS_KEY] = progress.model_dump(exclude_none=True)
+    for key in LEGACY_KEYS:
+        if state.get(key) is not None:
+            state[key] = None
+
+
+def share(state_delta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The part of a subagent's state delta that a cache or bank entry may replay into other sessions.
+
+    A subagent runs on a copy of its caller's state, so the progress record ``start_quiz``
+    writes also holds the caller's lesson and question time: only the quiz is kept, at
+    its first question. The quiz's questions are included by value, since another host's
+    question store may not have them.
+
+    Returns:
+        Dict[str, Any]: "state_delta" and "questions" (question id -> question).
+    """
+    delta = {key: value for key, value in state_delta.items() if key != PROGRESS_KEY and key not in LEGACY_KEYS}
+    questions: Dict[str, Dict[str, Any]] = {}
+    quiz = load(state_delta).quiz if any(state_delta.get(key) is not None for key in (PROGRESS_KEY, *LEGACY_KEYS)) else None
+    if quiz is not None:
+        delta[PROGRESS_KEY] = Progress(quiz=QuizProgress(ids=quiz.ids)).model_dump(exclude_none=True)
+        questions = {qid: question for qid in quiz.ids if (question := question_store.get(qid)) is not None}
+    return {"state_delta": delta, "questions": questions}
+
+
+def replay(state: MutableMapping[str, Any], entry: Dict[str, Any]) -> None:
+    """
+    Apply a cache or bank entry's state delta to a session.
+
+    The entry's questions are added to the question store and its quiz replaces the
+    session's, timed from now; the rest of the session's progress record is kept.
+    Entries written before ``share`` (whole progress records or unversioned keys) are
+    read the same way.
+    """
+    for question in (entry.get("questions") or {}).values():
+        question_store.put(question)
+    delta = entry.get("state_delta") or {}
+    state.update({key: value for key, value in delta.items() if key != PROGRESS_KEY and key not in LEGACY_KEYS})
+    if not any(delta.get(key) is not None for key in (PROGRESS_KEY, *LEGACY_KEYS)):
+        return
+    quiz = load(delta).quiz
+    if quiz is not None:
+        record = load(state)
+        record.quiz = QuizProgress(ids=quiz.ids)
+        record.shown_at = time.time()
+        save(state, record)
+
+
+def migrate_state(state: Dict[str, Any]) -> bool:
+    """Convert a plain state dict to version 1 in place, removing the old keys. Returns whether it changed."""
+    if not any(state.get(key) is not None for key in LEGACY_KEYS):
+        return False
+    save(state, load(state))
+    for key in LEGACY_KEYS:
+        state.pop(key, None)
+    return True
+
+
+def migrate(db_path: str) -> Dict[str, int]:
+    """Migrate every session stored by the SQLite session service (sessions.py) in ``db_path``."""
+    db = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    counts = {"sessions": 0, "migrated": 0}
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        for app_name, user_id, session_id, text in db.execute("SELECT app_name, user_id, id, state FROM sessions").fetchall():
+            counts["sessions"] += 1
+            state = json.loads(text)
+            if migrate_state(state):
+                db.execute(
+                    "UPDATE sessions SET state = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (json.dumps(state), app_name, user_id, session_id),
+                )
+                counts["migrated"] += 1
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    finally:
+        db.close()
+    return counts
+
+
+def _legacy_turns(quiz: List[Dict[str, Any]], plan: List[str], check: Dict[str, Any], replies: List[int]) -> List[Dict[str, Any]]:
+    """The state deltas the unversioned layout wrote for a diagnostic and lesson, turn by turn."""
+    now = time.time()
+    turns = [{
+        "quiz": quiz, "quiz_started": True, "quiz_finished": False, "current_question_index": 0,
+        "correct_answers": 0, "total_answered": 0, "score_percentage": 0, "quiz_results": [], "question_shown_at": now,
+    }]
+    results: List[Dict[str, Any]] = []
+    for index, question in enumerate(quiz):
+        choice = replies[index]
+        is_correct = choice == question["correct_answer_index"]
+        results = results + [{"question": question["question"], "chosen_index": choice, "is_correct": is_correct}]
+        delta = {
+            "question": question["question"], "answer": "ABCDEFGH"[choice], "quiz_results": results,
+            "correct_answers": sum(r["is_correct"] for r in results), "total_answered": len(results),
+            "score_percentage": round(100 * sum(r["is_correct"] for r in results) / len(results)),
+            "current_question_index": index + 1, "question_shown_at": now,
+        }
+        if index + 1 == len(quiz):
+            delta.update({
+                "quiz_started": False, "quiz_finished": True,
+                "test_results_json": json.dumps([{"question": r["question"], "correct": r["is_correct"]} for r in results]),
+                "lesson_plan": plan, "lesson_step_index": 0, "lesson_results": [], "check_question": check,
+            })
+        turns.append(delta)
+    lesson_results: List[Dict[str, Any]] = []
+    for index, step in enumerate(plan):
+        lesson_results = lesson_results + [{"step": step, "is_correct": replies[len(quiz) + index] == check["correct_answer_index"]}]
+        delta = {"lesson_results": lesson_results}
+        if index + 1 < len(plan):
+            delta.update({"lesson_step_index": index + 1, "check_question": check, "question_shown_at": now})
+        else:
+            delta["check_question"] = None
+        turns.append(delta)
+    return turns
+
+
+def _versioned_turns(quiz: List[Dict[str, Any]], plan: List[str], check: Dict[str, Any], replies: List[int]) -> List[Dict[str, Any]]:
+    """The same conversation as ``_legacy_turns``, written as version 1 records."""
+    progress = Progress(quiz=QuizProgress(ids=[question_store.put(q) for q in quiz]), shown_at=time.time())
+    turns = []
+
+    def write() -> None:
+        state: Dict[str, Any] = {}
+        save(state, progress)
+        turns.append(state)
+
+    write()
+    for index, question in enumerate(quiz):
+        if replies[index] == question["correct_answer_index"]:
+            progress.quiz.correct |= 1 << index
+        progress.quiz.at += 1
+        progress.shown_at = time.time()
+        if progress.quiz.finished:
+            progress.lesson = LessonProgress(plan=plan, check=question_store.put(check))
+        write()
+    for index in range(len(plan)):
+        progress.lesson.record_check(replies[len(quiz) + index] == check["correct_answer_index"])
+        if index + 1 < len(plan):
+            progress.lesson.at += 1
+            progress.shown_at = time.time()
+        else:
+            progress.lesson.check = None
+        write()
+    return turns
+
+
+def run_benchmark(questions: int = 3, steps: int = 3) -> Dict[str, Any]:
+    """
+    Compare the state written by the unversioned layout and by version 1 for one student.
+
+    The student takes a ``questions``-question diagnostic (the fake Tester's questions,
+    repeated as needed) and a ``steps``-step lesson with a check question per step.
+    Reported per layout: state delta bytes per turn, the session state's final size,
+    and the approximate tokens (4 characters each) of that state, which is what a
+    prompt template or state dump including it would cost.
+    """
+    from .fake_llm import FAKE_CHECK_QUESTION, FAKE_QUIZ
+
+    quiz = [dict(FAKE_QUIZ[i % len(FAKE_QUIZ)], question=f"{FAKE_QUIZ[i % len(FAKE_QUIZ)]['question']} (#{i + 1})") for i in range(questions)]
+    plan = [f"Halving step {i + 1}: sharing things equally between two friends" for i in range(steps)]
+    replies = [i % 3 for i in range(questions + steps)]
+    report: Dict[str, Any] = {"questions": questions, "steps": steps, "turns": questions + steps + 1}
+    for name, turns in (("legacy", _legacy_turns(quiz, plan, FAKE_CHECK_QUESTION, replies)), ("v1", _versioned_turns(quiz, plan, FAKE_CHECK_QUESTION, replies))):
+        state: Dict[str, Any] = {}
+        sizes = []
+        for delta in turns:
+            sizes.append(len(json.dumps(delta, separators=(",", ":"))))
+            state.update(delta)
+        state = {key: value for key, value in state.items() if value is not None}
+        final = len(json.dumps(state, separators=(",", ":")))
+        report[name] = {
+            "delta_bytes_per_turn": round(sum(sizes) / len(sizes)),
+            "delta_bytes_total": sum(sizes),
+            "state_bytes": final,
+            "state_tokens": round(final / 4),
+        }
+    report["reduction"] = {
+        key: f"{1 - report['v1'][key] / report['legacy'][key]:.0%}" for key in ("delta_bytes_total", "state_bytes")
+    }
+    return report
+
+
+# Shared by every session in this process
+question_store = QuestionStore.from_env()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.progress", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="Compare state sizes of the old layout and version 1")
+    bench.add_argument("--questions", type=int, default=3, help="Diagnostic questions")
+    bench.add_argument("--steps", type=int, default=3, help="Lesson steps")
+    migrate_cmd = commands.add_parser("migrate", help="Convert the sessions in a SQLite session database to version 1")
+    migrate_cmd.add_argument("--db", default="agent_store.db", help="Database file of the slimpai-sqlite session store")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        global question_store
+        question_store = QuestionStore(path=None)
+        report = run_benchmark(args.questions, args.steps)
+    else:
+        report = migrate(args.db)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
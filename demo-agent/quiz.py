@@ -0,0 +1,306 @@
+import json
+import re
+import time
+from typing import Any, Dict, List, MutableMapping, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from . import progress
+from .mastery import record_quiz_answer
+
+# Letters used to label multiple-choice options (A, B, C, ...)
+OPTION_LABELS = "ABCDEFGH"
+
+# Words that often precede an option pick ("it's B", "my answer is 2", "option c")
+_CHOICE_PREFIX = re.compile(
+    r"^(?:i think|i choose|i pick|my answer is|the answer is|answer|it's|it is|option|choice)\s*[:\-]?\s*",
+    re.IGNORECASE,
+)
+
+
+class QuizError(ValueError):
+    """Raised when a quiz does not match the expected question schema."""
+
+
+def validate_quiz(quiz: Any) -> List[Dict[str, Any]]:
+    """
+    Validate and normalize a list of multiple-choice questions.
+
+    Args:
+        quiz: A list of question objects (or its JSON encoding) with keys 'question',
+              'options' (list of strings) and 'correct_answer_index' (integer).
+
+    Returns:
+        List[Dict[str, Any]]: The questions with whitespace trimmed and the index as int.
+
+    Raises:
+        QuizError: If the quiz is empty or any question is malformed.
+    """
+    if isinstance(quiz, str):
+        try:
+            quiz = json.loads(quiz)
+        except json.JSONDecodeError as e:
+            raise QuizError(f"Quiz is not valid JSON: {e}") from e
+    if isinstance(quiz, dict):
+        quiz = [quiz]
+    if not isinstance(quiz, list) or not quiz:
+        raise QuizError("Quiz must be a non-empty list of questions")
+
+    questions = []
+    for number, item in enumerate(quiz, start=1):
+        if not isinstance(item, dict):
+            raise QuizError(f"Question {number} must be an object")
+        question = item.get("question")
+        options = item.get("options")
+        index = item.get("correct_answer_index")
+        if not isinstance(question, str) or not question.strip():
+            raise QuizError(f"Question {number} is missing its 'question' text")
+        if not isinstance(options, list) or not 2 <= len(options) <= len(OPTION_LABELS):
+            raise QuizError(f"Question {number} must have between 2 and {len(OPTION_LABELS)} options")
+        if isinstance(index, str) and index.strip().isdigit():
+            index = int(index)
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < len(options):
+            raise QuizError(f"Question {number} has an invalid 'correct_answer_index'")
+        questions.append({
+            "question": question.strip(),
+            "options": [str(option).strip() for option in options],
+            "correct_answer_index": index,
+        })
+    return questions
+
+
+def parse_choice(answer: Any, options: List[str]) -> Optional[int]:
+    """
+    Map a student's reply onto an option index.
+
+    Accepts option letters ("B", "b)", "(b)"), 1-based numbers ("2") and the option
+    text itself, optionally preceded by phrases such as "my answer is".
+
+    Returns:
+        Optional[int]: The 0-based option index, or None if the reply is not a clear pick.
+    """
+    if isinstance(answer, bool):
+        return None
+    if isinstance(answer, int):
+        return answer - 1 if 1 <= answer <= len(options) else None
+
+    text = str(answer).strip().rstrip(".!")
+    text = _CHOICE_PREFIX.sub("", text).strip()
+    if not text:
+        return None
+
+    # Exact option text ("8 slices") wins over letter/number interpretations
+    folded = text.casefold()
+    for index, option in enumerate(options):
+        if folded == option.casefold():
+            return index
+
+    token = text.strip("()[] ").rstrip(")").strip()
+    if len(token) == 1 and token.upper() in OPTION_LABELS[:len(options)]:
+        return OPTION_LABELS.index(token.upper())
+    if token.isdigit() and 1 <= int(token) <= len(options):
+        return int(token) - 1
+    return None
+
+
+def format_question(question: Dict[str, Any], number: int, total: int) -> str:
+    """Render one question with lettered options for display to the student."""
+    lines = [f"Question {number} of {total}: {question['question']}"]
+    for label, option in zip(OPTION_LABELS, question["options"]):
+        lines.append(f"{label}) {option}")
+    return "\n".join(lines)
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """Encode per-question outcomes as the 'test_results_json' string given to the Planner."""
+    return json.dumps([{"question": r["question"], "correct": r["is_correct"]} for r in results])
+
+
+def planner_request(topic: str, test_results_json: str) -> str:
+    """The exact request sent to the Planner (shared by both Guides and batch generation)."""
+    return f"Topic: {topic}\nResults: {test_results_json}"
+
+
+def questions(state: MutableMapping[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """The questions of the session's quiz, or None without a quiz (or if they are no longer stored)."""
+    quiz = progress.load(state).quiz
+    return progress.question_store.get_many(quiz.ids) if quiz is not None else None
+
+
+def current_question(state: MutableMapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """The question the student is answering, or None when no quiz is active."""
+    quiz = progress.load(state).quiz
+    if quiz is None or quiz.finished:
+        return None
+    return progress.question_store.get(quiz.ids[quiz.at])
+
+
+def test_results_json(state: MutableMapping[str, Any]) -> Optional[str]:
+    """The finished quiz's outcomes as given to the Planner, or None if no quiz is finished."""
+    quiz = progress.load(state).quiz
+    if quiz is None or not quiz.finished:
+        return None
+    asked = progress.question_store.get_many(quiz.ids) or []
+    return format_results([{"question": q["question"], "is_correct": ok} for q, ok in zip(asked, quiz.outcomes())])
+
+
+def start(state: MutableMapping[str, Any], quiz: Any, shown: bool = True) -> Dict[str, Any]:
+    """
+    Validate a quiz and reset the quiz state so the first question is active.
+
+    The questions go to the shared question store; the session's progress record
+    (progress.py) only keeps their ids, starting at the first one.
+
+    Args:
+        state: Session state to write the quiz to
+        quiz: The questions (see ``validate_quiz``)
+        shown: Whether the first question is shown to the student now; if not, the
+            time taken to answer it is not recorded
+
+    Returns:
+        Dict[str, Any]: status, the formatted first question and the question count.
+
+    Raises:
+        QuizError: If the quiz is malformed.
+    """
+    validated = validate_quiz(quiz)
+    record = progress.load(state)
+    record.quiz = progress.QuizProgress(ids=[progress.question_store.put(question) for question in validated])
+    record.shown_at = time.time() if shown else None
+    progress.save(state, record)
+    return {
+        "status": "started",
+        "first_question": format_question(validated[0], 1, len(validated)),
+        "question_number": 1,
+        "total_questions": len(validated),
+    }
+
+
+def is_active(state: MutableMapping[str, Any]) -> bool:
+    """Return True if a quiz has been started and still has unanswered questions."""
+    quiz = progress.load(state).quiz
+    return quiz is not None and not quiz.finished
+
+
+def answer(state: MutableMapping[str, Any], reply: Any) -> Dict[str, Any]:
+    """
+    Grade the student's reply to the current question and advance the quiz.
+
+    Correctness is decided from the stored 'correct_answer_index'; the model is not
+    consulted. When the last question is answered, the result carries the
+    'test_results_json' the Planner needs.
+
+    Returns:
+        Dict[str, Any]: A dictionary containing:
+            - status (str): "answered", "finished", "unrecognized" or "error"
+            - is_correct (bool), correct_answer (str): Grading of this reply
+            - question_index (int), chosen_index (int): Which question and option
+            - latency_ms (int): Time since the question was presented, if known
+            - score_percentage (int), correct_answers (int), total_answered (int)
+            - next_question (str): The next formatted question (if any remain)
+            - test_results_json (str): The outcomes for the Planner (when finished)
+            - error_message (str): Error description (if status is "error"/"unrecognized")
+    """
+    record = progress.load(state)
+    quiz = record.quiz
+    if quiz is None or quiz.finished:
+        return {"status": "error", "error_message": "No quiz is in progress"}
+
+    index = quiz.at
+    question = progress.question_store.get(quiz.ids[index])
+    if question is None:
+        return {"status": "error", "error_message": "The quiz questions are no longer available"}
+    choice = parse_choice(reply, question["options"])
+    if choice is None:
+        return {
+            "status": "unrecognized",
+            "error_message": "Please answer with one of the option letters.",
+            "current_question": format_question(question, index + 1, len(quiz.ids)),
+        }
+
+    next_question = progress.question_store.get(quiz.ids[index + 1]) if index + 1 < len(quiz.ids) else None
+    if index + 1 < len(quiz.ids) and next_question is None:
+        return {"status": "error", "error_message": "The quiz questions are no longer available"}
+
+    correct_index = question["correct_answer_index"]
+    is_correct = choice == correct_index
+    if is_correct:
+        quiz.correct |= 1 << index
+    quiz.at = index + 1
+    shown_at = record.shown_at
+    record.shown_at = time.time()
+    progress.save(state, record)
+
+    result = {
+        "status": "answered",
+        "is_correct": is_correct,
+        "question_index": index,
+        "chosen_index": choice,
+        "latency_ms": round((record.shown_at - shown_at) * 1000) if shown_at else None,
+        "correct_answer": f"{OPTION_LABELS[correct_index]}) {question['options'][correct_index]}",
+        "score_percentage": quiz.score_percentage,
+        "correct_answers": quiz.correct_answers,
+        "total_answered": quiz.at,
+    }
+    if next_question is not None:
+        result["next_question"] = format_question(next_question, index + 2, len(quiz.ids))
+    else:
+        result["status"] = "finished"
+        result["test_results_json"] = test_results_json(state)
+    return result
+
+
+def _latest_user_text(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[str]:
+    """Return the student's new message if this is the first model call of the turn."""
+    if not llm_request.contents:
+        return None
+    last = llm_request.contents[-1]
+    if last.role != "user" or not last.parts or any(part.function_response for part in last.parts):
+        return None
+    user_content = callback_context.user_content
+    if user_content is None or user_content.parts != last.parts:
+        return None
+    text = "".join(part.text for part in last.parts if part.text)
+    return text or None
+
+
+def quiz_fast_path(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """
+    before_model_callback that grades routine quiz answers without calling the model.
+
+    While a quiz is active and the student's message is a clear option pick, the answer
+    is graded locally. For every question but the last, the feedback and the next
+    question are returned directly, skipping the model call. For the last question
+    the grade is added to the request so the Guide can move on to planning in a
+    single model call.
+    """
+    state = callback_context.state
+    if not is_active(state):
+        return None
+    text = _latest_user_text(callback_context, llm_request)
+    if text is None:
+        return None
+    question = current_question(state)
+    if question is None or parse_choice(text, question["options"]) is None:
+        return None
+
+    result = answer(state, text)
+    record_quiz_answer(state, result)
+    feedback = "✅ Correct, amazing work!" if result["is_correct"] else (
+        f"Good try! The answer was {result['correct_answer']}. You've got this!"
+    )
+    if result["status"] == "answered":
+        reply = f"{feedback}\n\n{result['next_question']}"
+        return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=reply)]))
+
+    summary = (
+        f"[Quiz graded by the system] The student's last answer was "
+        f"{'correct' if result['is_correct'] else 'incorrect'} (correct answer: {result['correct_answer']}). "
+        f"The diagnostic quiz is finished with {result['correct_answers']}/{result['total_answered']} correct "
+        f"({result['score_percentage']}%). test_results_json: {result['test_results_json']}"
+    )
+    llm_request.contents[-1].parts.append(types.Part(text=summary))
+    return None
@@ -0,0 +1,219 @@
+"""
+Session recorder: real classroom sessions as compact JSON lines, for offline replay.
+
+When SLIMPAI_RECORD_LOG is set, every sampled session (SLIMPAI_RECORD_SAMPLE) appends
+to that file what replay.py needs to play it back without the network: the student's
+messages, every model response per agent with its latency, every tool call with its
+arguments and latency, and each turn's latency. Model and tool calls come from the
+metrics callbacks (``metrics.add_listener``), so they cover the Guide, the subagents
+and prefetching alike; the Guide's agent callbacks add the messages and turn times.
+
+One JSON object per line, all with "kind", "ts" and "session_id":
+    user   the student's message: "user_id", "text", "guide" and, the first time this
+           process sees the session, its "state" and the quiz and check "questions" it
+           points to in the question store
+    model  a model call: "agent", "key" (fingerprint of the request), "latency_ms",
+           "tokens" [input, output] and "response" (content and error, thoughts left out)
+    tool   a tool call: "agent", "tool", "latency_ms", "args" and, when the result came
+           from the cache, the curriculum bank or an identical call (so no model call
+           was recorded for it), "source" and "result"
+    turn   the end of the Guide's turn: "latency_ms"
+"""
+import hashlib
+import json
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from . import progress
+from .metrics import JsonLog, add_listener
+
+# Tool results served without a model call; replay answers the subagent with them
+_NO_MODEL_SOURCES = ("cache", "bank", "coalesced")
+
+
+def request_key(llm_request: LlmRequest) -> str:
+    """
+    Fingerprint of what a model call answers: the text, tool calls and tool responses
+    (by name) of the request's last message.
+
+    Replay uses it to serve each call the recorded response to the same request, even
+    when concurrent calls (e.g. prefetching) arrive in a different order.
+    """
+    content = llm_request.contents[-1] if llm_request.contents else None
+    parts = []
+    for part in (content.parts or []) if content else []:
+        if part.function_call:
+            parts.append(f"call:{part.function_call.name}")
+        elif part.function_response:
+            parts.append(f"response:{part.function_response.name}")
+        elif part.text and not part.thought:
+            parts.append(part.text)
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def compact_response(llm_response: LlmResponse) -> Dict[str, Any]:
+    """The parts of a model response replay needs, as JSON."""
+    response: Dict[str, Any] = {}
+    if llm_response.content is not None:
+        parts = [part for part in llm_response.content.parts or [] if not part.thought]
+        response["content"] = types.Content(role=llm_response.content.role, parts=parts).model_dump(mode="json", exclude_none=True)
+    if llm_response.error_code:
+        response["error_code"] = llm_response.error_code
+        response["error_message"] = llm_response.error_message
+    return response
+
+
+def _json_safe(value: Any) -> Any:
+    return json.loads(json.dumps(value, default=str))
+
+
+class SessionRecorder:
+    """Appends the sampled sessions of this process to a JSON-lines file; inactive without a path."""
+
+    def __init__(self, path: Optional[str] = None, sample: float = 1.0, remember: int = 10000):
+        """
+        Args:
+            path: File to append to (None: record nothing)
+            sample: Fraction of sessions recorded, chosen by a hash of the session id
+            remember: Sessions remembered as already snapshotted by this process
+        """
+        self.log = JsonLog(path)
+        self.sample = sample
+        self.remember = remember
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        # invocation id -> start of the Guide's turn
+        self._turns: Dict[str, float] = {}
+        self.guide = ""
+
+    @classmethod
+    def from_env(cls) -> "SessionRecorder":
+        """Configure from SLIMPAI_RECORD_LOG and SLIMPAI_RECORD_SAMPLE."""
+        return cls(
+            path=os.getenv("SLIMPAI_RECORD_LOG") or None,
+            sample=float(os.getenv("SLIMPAI_RECORD_SAMPLE", "1")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.log.path)
+
+    def _sampled(self, session_id: Optional[str]) -> bool:
+        if not self.enabled or not session_id:
+            return False
+        return self.sample >= 1 or zlib.crc32(session_id.encode("utf-8")) < self.sample * 2**32
+
+    def _first_sight(self, session_id: str) -> bool:
+        """True the first time this process records ``session_id``."""
+        if session_id in self._seen:
+            self._seen.move_to_end(session_id)
+            return False
+        self._seen[session_id] = None
+        if len(self._seen) > self.remember:
+            self._seen.popitem(last=False)
+        return True
+
+    def on_call(self, entry: Dict[str, Any], detail: Dict[str, Any]) -> None:
+        """metrics listener: record a model or tool call of a sampled session."""
+        if not self._sampled(entry.get("session_id")):
+            return
+        if entry["kind"] == "model":
+            request, response = detail.get("request"), detail.get("response")
+            if response is None:
+                return
+            self.log.write({
+                "kind": "model",
+                "ts": entry["ts"],
+                "session_id": entry["session_id"],
+                "agent": entry["agent"],
+                "key": request_key(request) if request is not None else "",
+                "latency_ms": entry["latency_ms"],
+                "tokens": [entry["input_tokens"], entry["output_tokens"]],
+                "response": compact_response(response),
+            })
+            return
+        record = {
+            "kind": "tool",
+            "ts": entry["ts"],
+            "session_id": entry["session_id"],
+            "agent": entry["agent"],
+            "tool": entry["tool"],
+            "latency_ms": entry["latency_ms"],
+            "args": _json_safe(detail.get("args")),
+        }
+        if entry.get("source") in _NO_MODEL_SOURCES:
+            record["source"] = entry["source"]
+            record["result"] = _json_safe(detail.get("result"))
+        self.log.write(record)
+
+    def before_turn(self, callback_context: CallbackContext) -> None:
+        """before_agent_callback for the Guide: record the student's message."""
+        session = callback_context.session
+        if not self._sampled(session.id):
+            return None
+        self._turns[callback_context.invocation_id] = time.perf_counter()
+        user_content = callback_context.user_content
+        text = "".join(part.text or "" for part in (user_content.parts or [])) if user_content else ""
+        record = {"kind": "user", "ts": time.time(), "session_id": session.id, "user_id": session.user_id, "text": text, "guide": self.guide}
+        if self._first_sight(session.id):
+            state = callback_context.state.to_dict()
+            record["state"] = _json_safe(state)
+            record["questions"] = self._questions(state)
+        self.log.write(record)
+        return None
+
+    def after_turn(self, callback_context: CallbackContext) -> None:
+        """after_agent_callback for the Guide: record how long the turn took."""
+        started = self._turns.pop(callback_context.invocation_id, None)
+        if started is not None:
+            self.log.write({
+                "kind": "turn",
+                "ts": time.time(),
+                "session_id": callback_context.session.id,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            })
+        return None
+
+    def _questions(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """The stored questions a state snapshot refers to, by id."""
+        try:
+            record = progress.load(state)
+        except ValueError:
+            return {}
+        ids = list(record.quiz.ids) if record.quiz else []
+        if record.lesson and record.lesson.check:
+            ids.append(record.lesson.check)
+        return {qid: question for qid in ids if (question := progress.question_store.get(qid)) is not None}
+
+
+def _as_list(callback) -> list:
+    if callback is None:
+        return []
+    return list(callback) if isinstance(callback, list) else [callback]
+
+
+def record_sessions(guide, mode: str) -> None:
+    """
+    Record the sessions ``guide`` serves, if SLIMPAI_RECORD_LOG is set.
+
+    Args:
+        guide: The root agent; its model and tool calls must already be instrumented
+        mode: Which Guide it is ("workflow" or "llm"), so replay can drive the same one
+    """
+    if not session_recorder.enabled:
+        return
+    session_recorder.guide = mode
+    guide.before_agent_callback = _as_list(guide.before_agent_callback) + [session_recorder.before_turn]
+    guide.after_agent_callback = _as_list(guide.after_agent_callback) + [session_recorder.after_turn]
+
+
+# Shared by every Guide in this process
+session_recorder = SessionRecorder.from_env()
+add_listener(session_recorder.on_call)
@@ -0,0 +1,340 @@
+"""
+Offline replay of recorded sessions (see recorder.py) as a regression harness.
+
+Every recorded session is played back through the agents from its recorded starting
+state: the same student messages, with each model call answered by ReplayLlm from the
+recording after the recorded latency. No network access or credentials are needed.
+Sessions start at their recorded offsets and students wait their recorded think time
+(both multiplied by --time-scale; 0 replays as fast as possible), so a recorded class
+is replayed with the same traffic shape.
+
+The report compares the replay with the recording turn by turn:
+- divergences: turns whose tool calls by the Guide (in order) differ; calls made by
+  subagents are left out, as they only happen in the session that happens to
+  generate a piece of shared content;
+- regressions: turns slower than --tolerance times their recorded latency (scaled by
+  --time-scale) and by more than LATENCY_SLACK_MS; not checked with --time-scale 0;
+- model_calls: how the model calls were answered, i.e. "recorded" (the response to
+  the same request), "tool_result" (the recorded cache or bank result of that
+  subagent) or "scripted" (nothing recorded, fake_llm.py's script).
+
+Usage:
+    python -m demo-agent.replay sessions.jsonl --time-scale 1 --fail-on-diff
+"""
+import argparse
+import asyncio
+import difflib
+import json
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from . import agent as agents
+from . import mastery, progress
+from .cache import ContentCache
+from .dedup import DedupIndex
+from .fake_llm import install_fake_llm, scripted_response
+from .metrics import JsonLog, add_listener, current_session_id, load_records, percentile
+from .recorder import request_key, session_recorder
+
+APP_NAME = "slimpai_replay"
+
+# Slower turns within this many milliseconds of the recording are not regressions
+LATENCY_SLACK_MS = 20.0
+
+
+def load_recording(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Group a recording's lines by session.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Per session id: 'user_id', 'guide', 'state' and
+        'questions' (from its first snapshot), 'turns' (each with 'ts', 'text', 'tools',
+        'latency_ms' and 'ended'), 'models' (recorded model calls per agent, in order)
+        and 'results' (recorded results of tools served without a model call, per tool).
+    """
+    sessions: Dict[str, Dict[str, Any]] = {}
+    for entry in load_records(path):
+        session_id = entry.get("session_id")
+        if not session_id:
+            continue
+        session = sessions.get(session_id)
+        if session is None:
+            session = sessions[session_id] = {
+                "session_id": session_id, "user_id": "student", "guide": "", "state": None, "questions": {},
+                "turns": [], "models": defaultdict(list), "results": defaultdict(list),
+            }
+        turns = session["turns"]
+        kind = entry.get("kind")
+        if kind == "user":
+            if not turns:
+                session["user_id"] = entry.get("user_id") or session["user_id"]
+                session["guide"] = entry.get("guide") or ""
+                session["state"] = entry.get("state")
+                session["questions"] = entry.get("questions") or {}
+            turns.append({"ts": entry["ts"], "text": entry.get("text", ""), "tools": [], "latency_ms": None, "ended": None})
+        elif kind == "turn" and turns:
+            turns[-1]["latency_ms"] = entry["latency_ms"]
+            turns[-1]["ended"] = entry["ts"]
+        elif kind == "tool":
+            if turns and turns[-1]["latency_ms"] is None:
+                turns[-1]["tools"].append(f"{entry['agent']}.{entry['tool']}")
+            if "result" in entry:
+                session["results"][entry["tool"]].append(entry["result"])
+        elif kind == "model":
+            session["models"][entry["agent"]].append(entry)
+    return {session_id: session for session_id, session in sessions.items() if session["turns"]}
+
+
+class ReplayLlm(BaseLlm):
+    """
+    Answers every agent's model calls from a recording, keyed by session and agent.
+
+    A call gets the session's recorded response to the same request (``request_key``).
+    Generated content is shared between sessions (cache, coalescing), and which session
+    generates it depends on timing, so it otherwise gets another session's response to
+    the same request; else the session's next unused response of that agent, else the
+    recorded cache or bank result of that subagent, else the fake model's script.
+    """
+
+    sessions: Dict[str, Any] = {}
+    """Recorded sessions, as returned by ``load_recording``."""
+
+    time_scale: float = 1.0
+    """Multiplier for the recorded model latencies (0: answer at once)."""
+
+    served: Counter = Counter()
+
+    by_request: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    """Recorded model calls of every session, per (agent, request key)."""
+
+    def __init__(self, **data):
+        data.setdefault("model", "replay")
+        data.setdefault("served", Counter())
+        super().__init__(**data)
+        self.by_request = defaultdict(list)
+        for session in self.sessions.values():
+            for agent_name, calls in session["models"].items():
+                for call in calls:
+                    self.by_request[(agent_name, call.get("key", ""))].append(call)
+
+    def _take(self, session: Dict[str, Any], agent_name: str, key: str) -> Optional[Dict[str, Any]]:
+        own = [call for call in session["models"].get(agent_name, []) if not call.get("used")]
+        call = next((c for c in own if c.get("key") == key), None)
+        if call is None:
+            same_request = self.by_request.get((agent_name, key), [])
+            # Responses to the same request are interchangeable, so one may serve twice
+            call = next((c for c in same_request if not c.get("used")), None) or (same_request[-1] if same_request else None)
+        if call is None and own:
+            call = own[0]
+        if call is not None:
+            call["used"] = True
+        return call
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        agent_name = (llm_request.config.labels or {}).get("adk_agent_name", "") if llm_request.config else ""
+        session = self.sessions.get(current_session_id() or "")
+        call = self._take(session, agent_name, request_key(llm_request)) if session else None
+        if call is not None:
+            self.served["recorded"] += 1
+            if self.time_scale:
+                await asyncio.sleep(call["latency_ms"] / 1000 * self.time_scale)
+            recorded = call["response"]
+            response = LlmResponse(
+                content=types.Content.model_validate(recorded["content"]) if "content" in recorded else None,
+                error_code=recorded.get("error_code"),
+                error_message=recorded.get("error_message"),
+            )
+            tokens = call.get("tokens") or [0, 0]
+            response.usage_metadata = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=tokens[0], candidates_token_count=tokens[1],
+            )
+        elif session and session["results"].get(agent_name):
+            # The subagent's result came from the cache or bank when recorded
+            self.served["tool_result"] += 1
+            result = session["results"][agent_name].pop(0)
+            text = result if isinstance(result, str) else json.dumps(result)
+            response = LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+        else:
+            self.served["scripted"] += 1
+            response = scripted_response(agent_name, llm_request)
+        yield response
+
+
+async def replay_session(
+    runner: Runner, session: Dict[str, Any], tool_calls: Dict[str, List[str]], origin: float, started: float, time_scale: float
+) -> List[Dict[str, Any]]:
+    """Play one recorded session; return per turn the replayed tool calls and latency."""
+    session_id = session["session_id"]
+    for question in session["questions"].values():
+        progress.question_store.put(question)
+    await runner.session_service.create_session(
+        app_name=APP_NAME, user_id=session["user_id"], state=session["state"] or {}, session_id=session_id,
+    )
+    replayed = []
+    previous = None
+    for turn in session["turns"]:
+        if time_scale:
+            # Arrive at the recorded time, and never before the recorded think time has passed
+            due = started + (turn["ts"] - origin) * time_scale
+            if previous is not None and previous[1] is not None:
+                due = max(due, previous[0] + (turn["ts"] - previous[1]) * time_scale)
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        first_tool = len(tool_calls[session_id])
+        turn_started = time.perf_counter()
+        content = types.Content(role="user", parts=[types.Part(text=turn["text"])])
+        async for _ in runner.run_async(user_id=session["user_id"], session_id=session_id, new_message=content):
+            pass
+        ended = time.perf_counter()
+        replayed.append({"tools": tool_calls[session_id][first_tool:], "latency_ms": round((ended - turn_started) * 1000, 2)})
+        previous = (ended, turn["ended"])
+    return replayed
+
+
+def compare(
+    session: Dict[str, Any], replayed: List[Dict[str, Any]], time_scale: float, tolerance: float, caller: str = "Guide"
+) -> Tuple[list, list]:
+    """(divergences, regressions) of a replayed session against its recording; tool calls are compared for ``caller``."""
+    divergences, regressions = [], []
+    prefix = f"{caller}."
+    for number, (turn, replay) in enumerate(zip(session["turns"], replayed)):
+        if turn["latency_ms"] is None:
+            # The recorded turn never finished (e.g. the server stopped)
+            continue
+        recorded_tools = [tool for tool in turn["tools"] if tool.startswith(prefix)]
+        replayed_tools = [tool for tool in replay["tools"] if tool.startswith(prefix)]
+        if recorded_tools != replayed_tools:
+            matcher = difflib.SequenceMatcher(a=recorded_tools, b=replayed_tools, autojunk=False)
+            divergences.append({
+                "session_id": session["session_id"],
+                "turn": number,
+                "text": turn["text"],
+                "diff": [
+                    f"{tag}: {recorded_tools[i1:i2]} -> {replayed_tools[j1:j2]}"
+                    for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"
+                ],
+            })
+        if time_scale:
+            expected = turn["latency_ms"] * time_scale
+            if replay["latency_ms"] > expected * tolerance and replay["latency_ms"] - expected > LATENCY_SLACK_MS:
+                regressions.append({
+                    "session_id": session["session_id"],
+                    "turn": number,
+                    "text": turn["text"],
+                    "recorded_ms": round(expected, 2),
+                    "replayed_ms": replay["latency_ms"],
+                })
+    return divergences, regressions
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "max": max(latencies, default=0.0)}
+
+
+async def run_replay(
+    path: str,
+    time_scale: float = 1.0,
+    tolerance: float = 1.25,
+    guide: Optional[str] = None,
+    session_ids: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """Replay a recording (all sessions at once, or those in ``session_ids``) and compare it with the recording."""
+    sessions = load_recording(path)
+    if session_ids:
+        sessions = {session_id: sessions[session_id] for session_id in session_ids if session_id in sessions}
+    if not sessions:
+        raise ValueError(f"No recorded sessions to replay in {path}")
+    guide = guide or next(iter(sessions.values()))["guide"] or "workflow"
+
+    root_agent = agents.llm_guide if guide == "llm" else agents.guide_workflow
+    # Replaying must not record itself, nor touch the real cache, answer history or question store
+    session_recorder.log = JsonLog(None)
+    llm = ReplayLlm(sessions=sessions, time_scale=time_scale)
+    install_fake_llm(root_agent, llm)
+    cache = ContentCache(path=None)
+    dedup = DedupIndex(path=None, threshold=agents.dedup_index.threshold, max_entries=agents.dedup_index.max_entries)
+    for tool in (agents.tester_tool, agents.planner_tool, agents.explainer_tool, agents.quizzer_tool, agents.encourager_tool):
+        tool.cache = cache
+        tool.bank = None
+    agents.tester_tool.canonicalize = dedup.topic
+    agents.planner_tool.canonicalize = dedup.planner_request
+    agents.explainer_tool.canonicalize = dedup.step
+    mastery.mastery_store = mastery.MasteryStore(path=None)
+    progress.question_store = progress.QuestionStore(path=None)
+
+    tool_calls: Dict[str, List[str]] = defaultdict(list)
+
+    def on_call(entry: Dict[str, Any], detail: Dict[str, Any]) -> None:
+        if entry["kind"] == "tool" and entry.get("session_id") in sessions:
+            tool_calls[entry["session_id"]].append(f"{entry['agent']}.{entry['tool']}")
+
+    add_listener(on_call)
+    runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=InMemorySessionService())
+    origin = min(session["turns"][0]["ts"] for session in sessions.values())
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        replay_session(runner, session, tool_calls, origin, started, time_scale) for session in sessions.values()
+    ))
+    elapsed = time.perf_counter() - started
+
+    divergences, regressions = [], []
+    recorded_latencies, replayed_latencies = [], []
+    for session, replayed in zip(sessions.values(), results):
+        session_divergences, session_regressions = compare(session, replayed, time_scale, tolerance, root_agent.name)
+        divergences += session_divergences
+        regressions += session_regressions
+        recorded_latencies += [turn["latency_ms"] for turn in session["turns"] if turn["latency_ms"] is not None]
+        replayed_latencies += [turn["latency_ms"] for turn in replayed]
+    turns = sum(len(session["turns"]) for session in sessions.values())
+    return {
+        "recording": path,
+        "guide": guide,
+        "sessions": len(sessions),
+        "turns": turns,
+        "time_scale": time_scale,
+        "elapsed_s": round(elapsed, 3),
+        "latency_ms": {
+            "recorded": _latency_summary(recorded_latencies),
+            "replayed": _latency_summary(replayed_latencies),
+        },
+        "model_calls": dict(llm.served),
+        "unused_recorded_model_calls": sum(
+            not call.get("used") for session in sessions.values() for calls in session["models"].values() for call in calls
+        ),
+        "matching_turns": turns - len(divergences),
+        "divergences": divergences,
+        "regressions": regressions,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.replay", description=__doc__.split("\n\n")[0])
+    parser.add_argument("recording", help="File written via SLIMPAI_RECORD_LOG")
+    parser.add_argument("--session", action="append", dest="sessions", help="Replay only this session id (repeatable)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplier for recorded model latencies, arrivals and think times (0: no waiting)")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Replayed/recorded turn latency ratio above which a turn is a regression")
+    parser.add_argument("--guide", choices=("workflow", "llm"), help="Which Guide to drive (default: the recorded one)")
+    parser.add_argument("--fail-on-diff", action="store_true", help="Exit with status 1 if any turn diverged or regressed")
+    args = parser.parse_args(argv)
+
+    try:
+        report = asyncio.run(run_replay(args.recording, args.time_scale, args.tolerance, args.guide, args.sessions))
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(report, indent=2))
+    if args.fail_on_diff and (report["divergences"] or report["regressions"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
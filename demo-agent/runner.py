@@ -31,3 +31,32 @@ async def call_agent_async(query: str, runner, user_id, session_id):
 
   # @title Run the Initial Conversation
 
+
+
+async def run_agent_once(agent, request: str, app_name: str = "slimpai_batch", user_id: str = "batch"):
+    """
+    Run an agent on a single request in a throwaway in-memory session.
+
+    Used to generate content outside of a student conversation (batch generation,
+    prefetching). Mirrors what AgentTool does when the Guide calls a subagent.
+
+    Returns:
+        tuple: (final text of the agent's last message, state delta written during the run)
+    """
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    runner = Runner(agent=agent, app_name=app_name, session_service=InMemorySessionService())
+    session = await runner.session_service.create_session(app_name=app_name, user_id=user_id)
+    content = types.Content(role='user', parts=[types.Part(text=request)])
+
+    last_content = None
+    state_delta = {}
+    async for event in runner.run_async(user_id=user_id, session_id=session.id, new_message=content):
+        if event.actions.state_delta:
+            state_delta.update(event.actions.state_delta)
+        if event.content:
+            last_content = event.content
+
+    text = '\n'.join(p.text for p in last_content.parts if p.text) if last_content and last_content.parts else ''
+    return text, state_delta
@@ -0,0 +1,222 @@
+"""
+Typed output schemas for the subagents that return JSON, with local repair.
+
+Tester, Planner and Quizzer are asked for "ONLY a valid JSON list/object", and models
+mostly comply, but not always: a ```json fence, a trailing comma, an option list keyed
+by letter or a 1-based answer index are common. ``parse_output`` validates the text
+against the agent's schema and, when that fails, repairs it locally (strip fences and
+prose, fix trailing commas/quotes, rename common key variants, clamp indices) before
+anyone considers asking the model again. Outcomes are counted per agent:
+
+    valid     parsed and validated as returned
+    repaired  valid after local repair (no extra model call)
+    retried   repair failed; a second model call produced usable output
+    failed    still unusable after the retry
+"""
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, RootModel, ValidationError, field_validator, model_validator
+
+OPTION_LABELS = "ABCDEFGH"
+
+
+class QuizQuestion(BaseModel):
+    """One multiple-choice question, as produced by the Tester (in a list) and the Quizzer."""
+
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    question: str = Field(min_length=1)
+    options: List[str] = Field(min_length=2, max_length=len(OPTION_LABELS))
+    correct_answer_index: int
+
+    @model_validator(mode="after")
+    def _index_in_range(self) -> "QuizQuestion":
+        if not 0 <= self.correct_answer_index < len(self.options):
+            raise ValueError("correct_answer_index is out of range")
+        return self
+
+
+class Quiz(RootModel[List[QuizQuestion]]):
+    """The Tester's diagnostic: a non-empty list of questions."""
+
+    root: List[QuizQuestion] = Field(min_length=1)
+
+
+class LessonPlan(RootModel[List[str]]):
+    """The Planner's output: a non-empty list of lesson step titles."""
+
+    root: List[str] = Field(min_length=1)
+
+    @field_validator("root")
+    @classmethod
+    def _non_empty_titles(cls, steps: List[str]) -> List[str]:
+        steps = [step.strip() for step in steps]
+        if not all(steps):
+            raise ValueError("lesson step titles must not be empty")
+        return steps
+
+
+SCHEMAS = {"quiz": Quiz, "question": QuizQuestion, "lesson_plan": LessonPlan}
+
+# Which schema each agent's final answer must follow
+AGENT_SCHEMAS = {"Tester": "quiz", "Planner": "lesson_plan", "Quizzer": "question"}
+
+# Outcome counts per (agent, outcome), exported by metrics.py
+outcome_stats: Dict[Tuple[str, str], int] = {}
+
+
+class ParseResult(NamedTuple):
+    value: Any
+    """The validated value (plain lists/dicts), or None if the output is unusable."""
+    outcome: str
+    """"valid", "repaired" or "invalid"."""
+    error: Optional[str] = None
+
+
+def record_outcome(agent: str, outcome: str) -> None:
+    outcome_stats[(agent, outcome)] = outcome_stats.get((agent, outcome), 0) + 1
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove a surrounding ```json ... ``` fence, which models often add despite instructions."""
+    match = re.match(r"^\s*```[a-zA-Z]*\s*(.*?)\s*```\s*$", text, re.DOTALL)
+    return match.group(1) if match else text.strip()
+
+
+def _extract_json(text: str) -> str:
+    """The outermost JSON array/object in ``text``, dropping any prose around it."""
+    text = strip_code_fences(text)
+    fenced = re.search(r"```[a-zA-Z]*\s*(.*?)```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("["), text.find("{")) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    end = max(text.rfind("]"), text.rfind("}"))
+    return text[start:end + 1] if end > start else text[start:]
+
+
+def _fix_syntax(text: str) -> str:
+    """Fix the JSON syntax slips models make most often."""
+    text = text.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
+    text = re.sub(r",\s*([\]}])", r"\1", text)
+    text = re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", re.sub(r"\bNone\b", "null", text)))
+    if '"' not in text:
+        # Python-style single-quoted strings
+        text = re.sub(r"'((?:[^'\\]|\\.)*)'", lambda m: json.dumps(m.group(1)), text)
+    return text
+
+
+def _load(text: str) -> Any:
+    text = _fix_syntax(_extract_json(text))
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # An unterminated list/object, e.g. output cut off by the token limit
+        for closer in ("]", "}", "}]", "]}"):
+            try:
+                return json.loads(text + closer)
+            except json.JSONDecodeError:
+                continue
+        raise
+
+
+def _option_text(option: Any) -> str:
+    if isinstance(option, dict):
+        option = option.get("text", option.get("option", next(iter(option.values()), "")))
+    # Drop labels the model added itself ("A) 4", "b. 4")
+    return re.sub(r"^\s*[A-Ha-h][).:]\s+", "", str(option)).strip()
+
+
+def _coerce_question(item: Any) -> Any:
+    if not isinstance(item, dict):
+        return item
+    item = dict(item)
+    for alias in ("text", "prompt", "q"):
+        if "question" not in item and alias in item:
+            item["question"] = item.pop(alias)
+    for alias in ("choices", "answers"):
+        if "options" not in item and alias in item:
+            item["options"] = item.pop(alias)
+    options = item.get("options")
+    if isinstance(options, dict):
+        options = list(options.values())
+    if isinstance(options, list):
+        options = [_option_text(option) for option in options]
+        item["options"] = options
+    else:
+        options = []
+
+    index = item.get("correct_answer_index")
+    for alias in ("correct_index", "answer_index", "correctAnswerIndex", "correct_answer", "answer"):
+        if index is None and alias in item:
+            index = item[alias]
+    if isinstance(index, str):
+        answer = index.strip()
+        if answer.isdigit():
+            index = int(answer)
+        elif len(answer) == 1 and answer.upper() in OPTION_LABELS:
+            index = OPTION_LABELS.index(answer.upper())
+        elif _option_text(answer) in options:
+            index = options.index(_option_text(answer))
+    if isinstance(index, float) and index.is_integer():
+        index = int(index)
+    if isinstance(index, int) and not isinstance(index, bool) and options:
+        index = min(max(index, 0), len(options) - 1)
+    item["correct_answer_index"] = index
+    return item
+
+
+def _coerce(schema: str, value: Any) -> Any:
+    """Reshape common near-misses into the schema's structure."""
+    if isinstance(value, dict) and schema in ("quiz", "lesson_plan"):
+        # {"questions": [...]} / {"lesson_plan": [...]}
+        lists = [v for v in value.values() if isinstance(v, list)]
+        if len(lists) == 1:
+            value = lists[0]
+        elif schema == "quiz" and "question" in value:
+            value = [value]
+    if schema == "question":
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        return _coerce_question(value)
+    if schema == "quiz" and isinstance(value, list):
+        return [_coerce_question(item) for item in value]
+    if schema == "lesson_plan" and isinstance(value, list):
+        steps = []
+        for step in value:
+            if isinstance(step, dict):
+                step = step.get("title", step.get("step", next(iter(step.values()), "")))
+            steps.append(re.sub(r"^\s*(?:step\s*)?\d+[).:-]\s*", "", str(step), flags=re.IGNORECASE))
+        return steps
+    return value
+
+
+def _validate(schema: str, value: Any) -> Any:
+    return SCHEMAS[schema].model_validate(value).model_dump()
+
+
+def parse_output(schema: str, output: Any) -> ParseResult:
+    """
+    Validate a subagent's output against ``schema``, repairing it locally if needed.
+
+    Args:
+        schema: "quiz", "question" or "lesson_plan"
+        output: The model's text, or an already decoded value (e.g. tool call arguments)
+
+    Returns:
+        ParseResult: The validated value and whether it was valid as given or repaired.
+    """
+    try:
+        value = json.loads(output) if isinstance(output, str) else output
+        return ParseResult(_validate(schema, value), "valid")
+    except (json.JSONDecodeError, ValidationError, TypeError):
+        pass
+    try:
+        value = _load(output) if isinstance(output, str) else output
+        return ParseResult(_validate(schema, _coerce(schema, value)), "repaired")
+    except (json.JSONDecodeError, ValidationError, TypeError) as e:
+        return ParseResult(None, "invalid", str(e).splitlines()[0])
@@ -0,0 +1,150 @@
+"""
+ADK API server for SLIMPai.
+
+Equivalent to ``adk api_server`` run from the repository root, plus the project's own
+services (e.g. the ``slimpai-sqlite://`` session store), which the stock CLI cannot
+load.
+
+Usage:
+    python -m demo-agent.server --host 0.0.0.0 --port 8080 \
+        --session_service_uri "slimpai-sqlite:///./agent_store.db?ttl=86400"
+"""
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from .sessions import register_session_service
+from .startup import warm_up, warmup_enabled
+
+logger = logging.getLogger(__name__)
+
+# adk loads agents from the directory *containing* the demo-agent package
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_NAME = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+# Scheme under which create_app hands its own session service instance to ADK
+_APP_SESSIONS_SCHEME = "slimpai-app"
+
+
+def create_session_service(session_service_uri: Optional[str] = None):
+    """Build the session service for a URI the way ``adk api_server`` would (None: in memory)."""
+    from google.adk.cli.service_registry import get_service_registry
+    from google.adk.sessions import InMemorySessionService
+
+    if not session_service_uri:
+        return InMemorySessionService()
+    register_session_service()
+    service = get_service_registry().create_session_service(session_service_uri, agents_dir=AGENTS_DIR)
+    if service is None:
+        from google.adk.sessions.database_session_service import DatabaseSessionService
+
+        service = DatabaseSessionService(db_url=session_service_uri)
+    return service
+
+
+def create_app(session_service_uri: Optional[str] = None, host: str = "127.0.0.1", port: int = 8000, web: bool = False):
+    """Build the ADK FastAPI app with the project's services and endpoints registered."""
+    from google.adk.cli.fast_api import get_fast_api_app
+    from google.adk.cli.service_registry import get_service_registry
+
+    from fastapi import Body, HTTPException
+    from fastapi.responses import PlainTextResponse
+
+    from .metrics import registry
+
+    # Build the session service here so the project's endpoints share ADK's instance
+    session_service = create_session_service(session_service_uri)
+    get_service_registry().register_session_service(_APP_SESSIONS_SCHEME, lambda uri, **kwargs: session_service)
+    app = get_fast_api_app(
+        agents_dir=AGENTS_DIR,
+        session_service_uri=f"{_APP_SESSIONS_SCHEME}://",
+        web=web,
+        host=host,
+        port=port,
+    )
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics() -> str:
+        """Prometheus scrape endpoint: model/tool latency, tokens and cache statistics."""
+        return registry.render()
+
+    @app.post("/apps/{app_name}/cohorts")
+    async def create_cohort(app_name: str, request: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+        """
+        Start a class on one topic: generate the diagnostic once and create a session
+        per student with the quiz already started.
+
+        Body: {"topic": "halving", "students": ["S001", {"student_number": "S002", "name": "Ana"}], "variants": 1, "tenant": "school-a"}
+        """
+        from .agent import tester_tool
+        from .cohort import CohortError, start_cohort
+
+        if app_name != APP_NAME:
+            raise HTTPException(status_code=404, detail=f"Unknown app {app_name!r}")
+        try:
+            return await start_cohort(
+                session_service,
+                tester_tool,
+                app_name,
+                request.get("topic", ""),
+                request.get("students", []),
+                variants=request.get("variants", 1),
+                tenant=request.get("tenant"),
+            )
+        except (CohortError, ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/apps/{app_name}/users/{user_id}/sessions/{session_id}/admission")
+    def admission_position(app_name: str, user_id: str, session_id: str) -> Dict[str, Any]:
+        """Where the session's waiting model call is in the admission queue (position 0: not waiting)."""
+        from .admission import scheduler
+
+        return scheduler.position(session_id)
+
+    @app.get("/mastery/students/{student_number}")
+    def student_mastery(student_number: str, topic: Optional[str] = None, history: int = 0) -> Dict[str, Any]:
+        """A student's mastery per topic and skill, optionally with their latest answers."""
+        from .mastery import mastery_store
+
+        report: Dict[str, Any] = {"mastery": mastery_store.student_mastery(student_number, topic)}
+        if history:
+            report["history"] = mastery_store.history(student_number, topic, min(history, 500))
+        return report
+
+    @app.get("/mastery/topics/{topic}")
+    def topic_mastery(topic: str) -> List[Dict[str, Any]]:
+        """Class summary of a topic: students, accuracy and answer time per skill."""
+        from .mastery import mastery_store
+
+        return mastery_store.topic_summary(topic)
+
+    if warmup_enabled():
+        # Import the agents, create model clients and open the stores before serving
+        logger.info("Warm-up: %s", json.dumps(warm_up()))
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.server", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--session_service_uri",
+        default=os.getenv("SLIMPAI_SESSION_URI", "slimpai-sqlite:///./agent_store.db"),
+        help="Session store URI (slimpai-sqlite://, sqlite://, memory:// ...)",
+    )
+    parser.add_argument("--web", action="store_true", help="Also serve the ADK dev UI")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    uri = None if args.session_service_uri == "memory://" else args.session_service_uri
+    app = create_app(uri, args.host, args.port, args.web)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+import asyncio
+import copy
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events.event import Event
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.session import Session
+from google.adk.sessions.state import State
+
+# URI scheme under which the service is registered with the ADK service registry
+SESSION_URI_SCHEME = "slimpai-sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL,
+    state TEXT NOT NULL, create_time REAL NOT NULL, update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE INDEX IF NOT EXISTS sessions_update_time ON sessions (update_time);
+CREATE TABLE IF NOT EXISTS events (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL, timestamp REAL NOT NULL, data TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY, state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+def _split_state(state: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Split a state dict into (app, user, session) parts, dropping temp: keys."""
+    app, user, session = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    A persistent session service backed by a local SQLite database in WAL mode.
+
+    Each event is stored as its own row, so appending an event is a single INSERT (plus
+    a small state update when the event carries a state delta) instead of rewriting the
+    whole session. Recently used sessions are kept in a bounded write-through cache; a
+    cached copy is only served while its update time still matches the database, so
+    several worker processes can share one database file safely. The cache is bounded
+    both in sessions and in the events they hold, and a cached session is handed out
+    without copying its stored events, which are never modified.
+
+    Database work runs in a worker thread, so waiting on another process's write lock
+    does not stall the event loop (and every response it is streaming).
+
+    Sessions idle for longer than ``ttl_seconds`` are treated as expired and are purged
+    periodically.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: float = 24 * 3600,
+        cache_size: int = 256,
+        purge_interval: float = 300,
+        cache_events: int = 20000,
+    ):
+        """
+        Args:
+            db_path: Path of the SQLite database file
+            ttl_seconds: Idle time after which a session expires (0 to keep sessions forever)
+            cache_size: Number of sessions kept in the in-process cache
+            purge_interval: Minimum seconds between two purges of expired sessions
+            cache_events: Number of events the cached sessions may hold in total; least
+                recently used sessions are dropped beyond it
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.cache_size = cache_size
+        self.purge_interval = purge_interval
+        self.cache_events = cache_events
+        self._cache: "OrderedDict[Tuple[str, str, str], Session]" = OrderedDict()
+        self._cached_events = 0
+        self._lock = threading.RLock()
+        self._last_purge = 0.0
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @classmethod
+    def from_uri(cls, uri: str, **kwargs) -> "SqliteSessionService":
+        """
+        Create the service from a URI such as
+        ``slimpai-sqlite:///./agent_store.db?ttl=86400&cache_size=256``.
+        """
+        parsed = urlparse(uri)
+        path = (parsed.netloc + parsed.path) or "agent_store.db"
+        if path.startswith("/./"):
+            path = path[1:]
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        return cls(
+            path,
+            ttl_seconds=float(params.get("ttl", 24 * 3600)),
+            cache_size=int(params.get("cache_size", 256)),
+            purge_interval=float(params.get("purge_interval", 300)),
+            cache_events=int(params.get("cache_events", 20000)),
+        )
+
+    # --- Cache helpers (caller holds the lock) ---
+
+    def _remember(self, session: Session) -> None:
+        key = (session.app_name, session.user_id, session.id)
+        self._forget(*key)
+        self._cache[key] = session
+        self._cached_events += len(session.events)
+        while self._cache and (len(self._cache) > self.cache_size or self._cached_events > self.cache_events):
+            _, dropped = self._cache.popitem(last=False)
+            self._cached_events -= len(dropped.events)
+
+    def _forget(self, app_name: str, user_id: str, session_id: str) -> None:
+        dropped = self._cache.pop((app_name, user_id, session_id), None)
+        if dropped is not None:
+            self._cached_events -= len(dropped.events)
+
+    @staticmethod
+    def _copy(session: Session) -> Session:
+        """A copy the caller may change: the state is copied, the (immutable) stored events are shared."""
+        return session.model_copy(update={"state": copy.deepcopy(session.state), "events": list(session.events)})
+
+    def _is_expired(self, update_time: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - update_time > self.ttl_seconds
+
+    def _merge_shared_state(self, session: Session) -> Session:
+        """Add the app: and user: state to a session copy."""
+        row = self._db.execute("SELECT state FROM app_states WHERE app_name = ?", (session.app_name,)).fetchone()
+        if row:
+            for key, value in json.loads(row[0]).items():
+                session.state[State.APP_PREFIX + key] = value
+        row = self._db.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (session.app_name, session.user_id)
+        ).fetchone()
+        if row:
+            for key, value in json.loads(row[0]).items():
+                session.state[State.USER_PREFIX + key] = value
+        return session
+
+    def _update_shared_state(self, app_name: str, user_id: str, app_delta: Dict[str, Any], user_delta: Dict[str, Any]) -> None:
+        """Merge app: and user: deltas into their tables (caller holds a transaction)."""
+        if app_delta:
+            row = self._db.execute("SELECT state FROM app_states WHERE app_name = ?", (app_name,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            state.update(app_delta)
+            self._db.execute("INSERT OR REPLACE INTO app_states VALUES (?, ?)", (app_name, json.dumps(state)))
+        if user_delta:
+            row = self._db.execute(
+                "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            ).fetchone()
+            state = json.loads(row[0]) if row else {}
+            state.update(user_delta)
+            self._db.execute(
+                "INSERT OR REPLACE INTO user_states VALUES (?, ?, ?)", (app_name, user_id, json.dumps(state))
+            )
+
+    def _maybe_purge(self, now: float) -> None:
+        if not self.ttl_seconds or now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self.purge_expired(now)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete every session idle for longer than the TTL. Returns the number removed."""
+        if not self.ttl_seconds:
+            return 0
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self._db.execute(
+                    "SELECT app_name, user_id, id FROM sessions WHERE update_time < ?", (cutoff,)
+                ).fetchall()
+                for app_name, user_id, session_id in expired:
+                    self._db.execute(
+                        "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                        (app_name, user_id, session_id),
+                    )
+                    self._forget(app_name, user_id, session_id)
+                self._db.execute("DELETE FROM sessions WHERE update_time < ?", (cutoff,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(expired)
+
+    # --- BaseSessionService ---
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        return await asyncio.to_thread(self._create_session, app_name, user_id, state, session_id)
+
+    def _create_session(self, app_name: str, user_id: str, state: Optional[Dict[str, Any]], session_id: str) -> Session:
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+        with self._lock:
+            self._maybe_purge(now)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._db.execute(
+                    "SELECT update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (app_name, user_id, session_id),
+                ).fetchone()
+                if existing and not self._is_expired(existing[0], now):
+                    raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+                if existing:
+                    self._db.execute(
+                        "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                        (app_name, user_id, session_id),
+                    )
+                self._update_shared_state(app_name, user_id, app_delta, user_delta)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, json.dumps(session_state), now, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            session = Session(app_name=app_name, user_id=user_id, id=session_id, state=session_state, last_update_time=now)
+            self._remember(session)
+            return self._merge_shared_state(self._copy(session))
+
+    async def create_sessions(self, *, app_name: str, sessions: List[Tuple[str, str, Dict[str, Any]]]) -> List[str]:
+        """
+        Create many sessions in a single transaction (e.g. a whole class at once).
+
+        The new sessions are not added to this process's cache: with several workers,
+        each session is later served by the worker that owns it, which loads it from the
+        database on first use.
+
+        Args:
+            app_name: The app the sessions belong to
+            sessions: (user_id, session_id, state) for each session; state must not
+                contain app: or user: keys
+
+        Returns:
+            List[str]: The session ids, in order.
+
+        Raises:
+            AlreadyExistsError: If any of the sessions exists and has not expired; then
+                none of them is created.
+        """
+        return await asyncio.to_thread(self._create_sessions, app_name, sessions)
+
+    def _create_sessions(self, app_name: str, sessions: List[Tuple[str, str, Dict[str, Any]]]) -> List[str]:
+        now = time.time()
+        rows = [(app_name, user_id, session_id, json.dumps(_split_state(state)[2]), now, now) for user_id, session_id, state in sessions]
+        with self._lock:
+            self._maybe_purge(now)
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for _, user_id, session_id, _, _, _ in rows:
+                    existing = self._db.execute(
+                        "SELECT update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                        (app_name, user_id, session_id),
+                    ).fetchone()
+                    if existing and not self._is_expired(existing[0], now):
+                        raise AlreadyExistsError(f"Session with id {session_id} already exists.")
+                self._db.executemany(
+                    "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                    [(app_name, user_id, session_id) for _, user_id, session_id, _, _, _ in rows],
+                )
+                self._db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            for _, user_id, session_id, _, _, _ in rows:
+                self._forget(app_name, user_id, session_id)
+        return [session_id for _, _, session_id, _, _, _ in rows]
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = await asyncio.to_thread(self._get_session, app_name, user_id, session_id)
+        if session is not None and config:
+            if config.num_recent_events:
+                session.events = session.events[-config.num_recent_events:]
+            if config.after_timestamp:
+                session.events = [e for e in session.events if e.timestamp >= config.after_timestamp]
+        return session
+
+    def _get_session(self, app_name: str, user_id: str, session_id: str) -> Optional[Session]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            ).fetchone()
+            if row is None or self._is_expired(row[1], now):
+                self._forget(app_name, user_id, session_id)
+                return None
+
+            cached = self._cache.get((app_name, user_id, session_id))
+            if cached is not None and cached.last_update_time == row[1]:
+                self._cache.move_to_end((app_name, user_id, session_id))
+                session = self._copy(cached)
+            else:
+                events = [
+                    Event.model_validate_json(data)
+                    for (data,) in self._db.execute(
+                        "SELECT data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+                        (app_name, user_id, session_id),
+                    )
+                ]
+                loaded = Session(
+                    app_name=app_name, user_id=user_id, id=session_id,
+                    state=json.loads(row[0]), events=events, last_update_time=row[1],
+                )
+                self._remember(loaded)
+                session = self._copy(loaded)
+            return self._merge_shared_state(session)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await asyncio.to_thread(self._list_sessions, app_name, user_id)
+
+    def _list_sessions(self, app_name: str, user_id: Optional[str]) -> ListSessionsResponse:
+        now = time.time()
+        query = "SELECT user_id, id, state, update_time FROM sessions WHERE app_name = ?"
+        params: Tuple[Any, ...] = (app_name,)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+            sessions = [
+                self._merge_shared_state(Session(
+                    app_name=app_name, user_id=row_user, id=row_id, state=json.loads(state), last_update_time=updated,
+                ))
+                for row_user, row_id, state, updated in rows
+                if not self._is_expired(updated, now)
+            ]
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await asyncio.to_thread(self._delete_session, app_name, user_id, session_id)
+
+    def _delete_session(self, app_name: str, user_id: str, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                    (app_name, user_id, session_id),
+                )
+                self._db.execute(
+                    "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (app_name, user_id, session_id),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._forget(app_name, user_id, session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Updates the caller's session object and trims temp: keys from the delta
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        # The cache keeps its own copy: the caller may still change the one it holds
+        await asyncio.to_thread(self._append_event, session, copy.deepcopy(event))
+        return event
+
+    def _append_event(self, session: Session, event: Event) -> None:
+        app_delta, user_delta, session_delta = _split_state(event.actions.state_delta if event.actions else None)
+        key = (session.app_name, session.user_id, session.id)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT state FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", key
+                ).fetchone()
+                if row is None:
+                    self._db.execute("ROLLBACK")
+                    return
+                if session_delta:
+                    state = json.loads(row[0])
+                    state.update(session_delta)
+                    self._db.execute(
+                        "UPDATE sessions SET state = ?, update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                        (json.dumps(state), event.timestamp, *key),
+                    )
+                else:
+                    self._db.execute(
+                        "UPDATE sessions SET update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                        (event.timestamp, *key),
+                    )
+                self._update_shared_state(session.app_name, session.user_id, app_delta, user_delta)
+                self._db.execute(
+                    "INSERT INTO events VALUES (?, ?, ?,"
+                    " (SELECT COALESCE(MAX(seq), 0) + 1 FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?),"
+                    " ?, ?)",
+                    (*key, *key, event.timestamp, event.model_dump_json(exclude_none=True)),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+            # Write-through: keep the cached copy in step with what was just stored
+            cached = self._cache.get(key)
+            if cached is not None:
+                cached.events.append(event)
+                cached.state.update(session_delta)
+                cached.last_update_time = event.timestamp
+                self._cached_events += 1
+                self._remember(cached)
+
+
+def register_session_service() -> None:
+    """Make ``slimpai-sqlite://`` URIs available to get_fast_api_app / --session_service_uri."""
+    from google.adk.cli.service_registry import get_service_registry
+
+    def factory(uri: str, **kwargs):
+        return SqliteSessionService.from_uri(uri)
+
+    get_service_registry().register_session_service(SESSION_URI_SCHEME, factory)
@@ -0,0 +1,153 @@
+"""
+Startup warm-up and cold-start benchmark.
+
+A fresh server process pays for importing ADK and the agents, for creating the model
+clients and for opening the local SQLite stores. Without a warm-up all of it lands on
+the first student's request. ``warm_up`` does that work up front; the server calls it
+before it starts listening (disable with SLIMPAI_WARMUP=false), so Cloud Run only
+sends traffic to an instance that is ready.
+
+The benchmark starts fresh interpreters with ``-X importtime`` and reports how long
+each startup step takes and which top-level packages the time goes to.
+
+Usage:
+    python -m demo-agent.startup warmup
+    python -m demo-agent.startup bench --target agent --runs 5
+    python -m demo-agent.startup bench --target app
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE = os.path.basename(PACKAGE_DIR)
+
+# What each benchmark target does in a fresh interpreter (run from the directory shown)
+TARGETS = {
+    "agent": (os.path.dirname(PACKAGE_DIR), f"importlib.import_module({PACKAGE!r} + '.agent').root_agent"),
+    "warmup": (os.path.dirname(PACKAGE_DIR), f"importlib.import_module({PACKAGE!r} + '.startup').warm_up()"),
+    "server": (os.path.dirname(PACKAGE_DIR), f"importlib.import_module({PACKAGE!r} + '.server').create_app(None)"),
+    # The imports app.py makes before drawing anything
+    "app": (PACKAGE_DIR, "import streamlit, aiohttp, adk_client"),
+}
+
+_CHILD = """
+import importlib, json, time
+started = time.perf_counter()
+{statement}
+print(json.dumps({{"seconds": time.perf_counter() - started}}))
+"""
+
+
+def warmup_enabled() -> bool:
+    """Whether the server should warm up before listening (SLIMPAI_WARMUP, default true)."""
+    return os.getenv("SLIMPAI_WARMUP", "true").lower() in ("1", "true", "yes")
+
+
+def warm_up() -> Dict[str, Any]:
+    """
+    Import the agents, create their model clients and open the local stores.
+
+    Returns:
+        Dict[str, Any]: Seconds spent per step and the status of each model client.
+    """
+    from importlib import import_module
+
+    seconds: Dict[str, float] = {}
+    started = time.perf_counter()
+    agents = import_module(f"{PACKAGE}.agent")
+    seconds["agents"] = time.perf_counter() - started
+
+    from .bank import curriculum_bank
+    from .cache import content_cache
+    from .dedup import dedup_index
+    from .mastery import mastery_store
+    from .models import warm_up_models
+    from .progress import question_store
+
+    step = time.perf_counter()
+    models = warm_up_models(agents.root_agent)
+    seconds["model_clients"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    content_cache.open()
+    mastery_store.open()
+    question_store.open()
+    len(curriculum_bank)
+    dedup_index.open()
+    seconds["stores"] = time.perf_counter() - step
+    seconds["total"] = time.perf_counter() - started
+    return {"seconds": {name: round(value, 3) for name, value in seconds.items()}, "models": models}
+
+
+def _import_times(stderr: str) -> Dict[str, float]:
+    """Cumulative milliseconds per top-level package from ``-X importtime`` output."""
+    totals: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented below the module that triggered them
+        if name[1:2] == " ":
+            continue
+        totals[name.strip().split(".")[0]] += int(cumulative) / 1000
+    return totals
+
+
+def run_benchmark(target: str, runs: int = 5, top: int = 15) -> Dict[str, Any]:
+    """Start ``target`` in ``runs`` fresh interpreters and summarize where startup time goes."""
+    cwd, statement = TARGETS[target]
+    env = dict(os.environ)
+    # Keep benchmark runs from creating store files in the working directory
+    env.update({"SLIMPAI_CACHE_DB": "", "SLIMPAI_MASTERY_DB": "", "SLIMPAI_METRICS_LOG": ""})
+    inside: List[float] = []
+    wall: List[float] = []
+    imports: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(runs):
+        started = time.perf_counter()
+        child = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _CHILD.format(statement=statement)],
+            cwd=cwd, env=env, capture_output=True, text=True,
+        )
+        wall.append(time.perf_counter() - started)
+        if child.returncode != 0:
+            raise RuntimeError(f"{target} failed to start:\n{child.stderr[-2000:]}")
+        inside.append(json.loads(child.stdout.strip().splitlines()[-1])["seconds"])
+        for package, ms in _import_times(child.stderr).items():
+            imports[package].append(ms)
+
+    slowest = sorted(imports.items(), key=lambda item: -statistics.median(item[1]))[:top]
+    return {
+        "target": target,
+        "runs": runs,
+        "process_seconds": {"median": round(statistics.median(wall), 3), "min": round(min(wall), 3), "max": round(max(wall), 3)},
+        "target_seconds": {"median": round(statistics.median(inside), 3), "min": round(min(inside), 3), "max": round(max(inside), 3)},
+        "slowest_imports_ms": {package: round(statistics.median(values), 1) for package, values in slowest},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m demo-agent.startup", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("warmup", help="Run the warm-up once in this process and show its timings")
+    bench = commands.add_parser("bench", help="Measure cold starts in fresh interpreters")
+    bench.add_argument("--target", choices=sorted(TARGETS), default="agent", help="What to start")
+    bench.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters")
+    bench.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list")
+    args = parser.parse_args(argv)
+
+    if args.command == "warmup":
+        report = warm_up()
+    else:
+        report = run_benchmark(args.target, args.runs, args.top)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import asyncio
+import os
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
 from google.genai import types # For creating message Content/
 
 from agent import tester_agent
 from runner import call_agent_async
+from sessions import SqliteSessionService
 
 import dotenv
 dotenv.load_dotenv()
@@ -14,7 +16,9 @@ APP_NAME = "slimpai_app"
 USER_ID = "user_1"
 SESSION_ID = "session_001" # Using a fixed ID for simplicity
 
-session_service = InMemorySessionService()
+# Set SLIMPAI_SESSION_DB to keep sessions in a SQLite file instead of process memory
+session_db = os.getenv("SLIMPAI_SESSION_DB")
+session_service = SqliteSessionService(session_db) if session_db else InMemorySessionService()
 
 # We need an async function to await our interaction helper
 async def run_conversation():
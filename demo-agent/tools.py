@@ -1,6 +1,12 @@
 from typing import Any, Dict
 from google.adk.tools.tool_context import ToolContext
 
+from . import quiz as quiz_engine
+from .mastery import record_quiz_answer
+from .schemas import parse_output, record_outcome
+
+_INTERNAL_RESULT_KEYS = ("question_index", "chosen_index", "latency_ms")
+
 
 def store_user_info(tool_context: ToolContext, student_number: str, name: str, grade: int) -> Dict[str, Any]:
     """
@@ -26,71 +32,67 @@ def store_user_info(tool_context: ToolContext, student_number: str, name: str, g
         }
     }
 
-def submit_answer(tool_context: ToolContext, question: str, answer: str, is_correct: bool) -> Dict[str, Any]:
+def submit_answer(tool_context: ToolContext, answer: str) -> Dict[str, Any]:
     """
-    Record a user's answer submission and update quiz state tracking.
+    Grade the user's answer to the current quiz question and advance the quiz.
     
-    This function processes a submitted answer by updating the user's quiz progress
-    metrics in their context state. It tracks both the total number of answers
-    submitted and the count of correct answers.
+    Correctness is decided on the server from the stored quiz (the question's
+    'correct_answer_index'), so the model only needs to pass the user's reply through.
     
     Args:
-        question (str): The question text that was answered.
-        answer (str): The user's submitted answer.
-        is_correct (bool): Whether the submitted answer is correct.
+        answer (str): The user's reply, e.g. an option letter ("B"), a number ("2")
+                      or the option text.
     
     Returns:
-        Dict[str, Any]: A dictionary containing the result of the answer submission.
+        Dict[str, Any]: A dictionary containing:
+            - status (str): "answered", "finished" (last question), "unrecognized" or "error"
+            - is_correct (bool): Whether the answer was correct
+            - correct_answer (str): The correct option, labelled (e.g. "B) 4")
+            - score_percentage (int): Current score, 0-100
+            - next_question (str): The next question to present (if any remain)
+            - test_results_json (str): The results to give the Planner (when the quiz is finished)
+            - error_message (str): Error description (if the reply could not be graded)
     
     State Variables Updated:
-        - total_answered (int): Incremented by 1 for each answer submitted
-        - correct_answers (int): Incremented by 1 only when is_correct is True
+        - progress (dict): The quiz advanced to the next question, with this outcome recorded
+
+    Graded answers are also appended to the student's mastery history (mastery.py).
     """
     state = tool_context.state
-    state["question"] = question
-    state["answer"] = answer
-    state["total_answered"] = state.get("total_answered", 0) + 1
-    if is_correct:
-        state["correct_answers"] = state.get("correct_answers", 0) + 1
+    result = quiz_engine.answer(state, answer)
+    record_quiz_answer(state, result)
+    # Only the mastery log needs these; keep them out of the Guide's history
+    return {key: value for key, value in result.items() if key not in _INTERNAL_RESULT_KEYS}
 
 def start_quiz(tool_context: ToolContext, quiz: list) -> Dict[str, Any]:
     """
     Initialize and start a quiz session by storing quiz state information for a user.
     
     Args:
-        quiz (list): A list of quiz questions, where each question is a tuple of
-                     (question_text, correct_answer).
+        quiz (list): A list of question objects, each with keys 'question',
+                     'options' (list of strings) and 'correct_answer_index' (int).
     
     Returns:
         Dict[str, Any]: A dictionary containing:
             - status (str): "started" if successful, "error" if failed
-            - first_question (str): The text of the first question (if successful)
+            - first_question (str): The formatted first question (if successful)
             - question_number (int): Current question number (1-indexed, if successful)
             - total_questions (int): Total number of questions in the quiz (if successful)
             - error_message (str): Error description (if failed)
     
     State Variables Set:
-        - quiz_started (bool): Set to True to indicate quiz is active
-        - current_question_index (int): Set to 0 (first question)
-        - correct_answers (int): Set to 0 (no correct answers yet)
-        - total_answered (int): Set to 0 (no questions answered yet)
-        - score_percentage (int): Set to 0 (initial score)
+        - progress (dict): The quiz's question ids (the questions go to the shared
+          question store, see progress.py), positioned at the first question
     """
-    state = tool_context.state
-    # Initialize quiz state
-    state["quiz_started"] = True
-    state["current_question_index"] = 0
-    state["correct_answers"] = 0
-    state["total_answered"] = 0
-    state["score_percentage"] = 0
-    if quiz:
-        data = {
-            "status": "started",
-            "questions": quiz,
-            "question_number": 1,
-            "total_questions": len(quiz),
-        }
-        state["quiz"] = quiz
-        print(f"Quiz started: {data}")
-        return data
-    return {"status": "error", "error_message": "No questions available"}
\ No newline at end of file
+    try:
+        data = quiz_engine.start(tool_context.state, quiz)
+    except quiz_engine.QuizError as e:
+        # Repair near-misses (string indices, letter answers, ...) rather than sending the model round again
+        repaired = parse_output("quiz", quiz)
+        if repaired.value is None:
+            record_outcome(tool_context.agent_name, "invalid")
+            return {"status": "error", "error_message": str(e)}
+        record_outcome(tool_context.agent_name, "repaired")
+        data = quiz_engine.start(tool_context.state, repaired.value)
+    print(f"Quiz started: {data}")
+    return data
@@ -0,0 +1,165 @@
+"""
+Bounded chat transcript for the Streamlit frontend.
+
+Streamlit reruns app.py on every interaction, so every message kept in a browser
+session's state is rendered again on each keystroke, and a long lesson makes each
+rerun slower and the server's per-user memory larger. A ``Transcript`` keeps only the
+last ``window`` messages in the session; older ones are moved to a ``TranscriptStore``,
+a SQLite file shared by every session of the Streamlit server, and read back one page
+at a time when the student opens them.
+
+Configured with CHAT_WINDOW, CHAT_PAGE_SIZE, CHAT_HISTORY_DB and CHAT_HISTORY_TTL.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+ROLE_LABELS = {"user": "🧑 **You**", "assistant": "🎓 **Assistant**"}
+
+
+class TranscriptStore:
+    """
+    Messages that have scrolled out of a chat's window, keyed by chat session and position.
+
+    Thread-safe: Streamlit runs each browser session's script in its own thread.
+    """
+
+    def __init__(self, path: Optional[str] = "chat_history.db", ttl: float = 86400.0):
+        """
+        Args:
+            path: SQLite file (None or empty to keep the messages in memory)
+            ttl: Seconds after its last archived message that a chat's history is purged
+        """
+        self.path = path or None
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @classmethod
+    def from_env(cls) -> "TranscriptStore":
+        """Configure from CHAT_HISTORY_DB and CHAT_HISTORY_TTL."""
+        return cls(
+            path=os.getenv("CHAT_HISTORY_DB", "chat_history.db"),
+            ttl=float(os.getenv("CHAT_HISTORY_TTL", "86400")),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database on first use, purging expired chats (caller holds the lock)."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False, isolation_level=None)
+            if self.path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, "
+                "content TEXT NOT NULL, archived_at REAL NOT NULL, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+            )
+            self._purge(self._conn)
+        return self._conn
+
+    def append(self, session_id: str, message: Dict[str, Any]) -> None:
+        """Archive one message (a dict with 'seq', 'role' and 'content')."""
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO messages (session_id, seq, role, content, archived_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, message["seq"], message["role"], message["content"], time.time()),
+            )
+
+    def read(self, session_id: str, start: int, stop: int) -> List[Dict[str, Any]]:
+        """The archived messages of a chat with ``start <= seq < stop``, oldest first."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, start, stop),
+            ).fetchall()
+        return [{"seq": seq, "role": role, "content": content} for seq, role, content in rows]
+
+    def delete(self, session_id: str) -> None:
+        """Forget a chat's archived messages."""
+        with self._lock:
+            self._connection().execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def purge(self) -> int:
+        """Delete the history of chats with nothing archived for ``ttl`` seconds; return the rows removed."""
+        with self._lock:
+            return self._purge(self._connection())
+
+    def _purge(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "DELETE FROM messages WHERE session_id IN "
+            "(SELECT session_id FROM messages GROUP BY session_id HAVING MAX(archived_at) < ?)",
+            (time.time() - self.ttl,),
+        ).rowcount
+
+
+class Transcript:
+    """
+    The messages of one chat: the newest ``window`` in memory, older ones in a TranscriptStore.
+
+    Older messages are read back in pages of ``page_size``; page 1 holds the messages
+    just before the window.
+    """
+
+    def __init__(self, session_id: str, store: TranscriptStore, window: int = 40, page_size: int = 20):
+        """
+        Args:
+            session_id: Chat session the messages belong to
+            store: Where messages that leave the window are archived
+            window: Messages kept in memory and rendered on every rerun (0 to keep all)
+            page_size: Archived messages shown per page
+        """
+        self.session_id = session_id
+        self.store = store
+        self.window = window
+        self.page_size = page_size
+        self.recent: List[Dict[str, Any]] = []
+        self.archived = 0
+
+    @classmethod
+    def from_env(cls, session_id: str, store: TranscriptStore) -> "Transcript":
+        """Create a transcript whose window and page size come from CHAT_WINDOW and CHAT_PAGE_SIZE."""
+        return cls(
+            session_id,
+            store,
+            window=int(os.getenv("CHAT_WINDOW", "40")),
+            page_size=int(os.getenv("CHAT_PAGE_SIZE", "20")),
+        )
+
+    def __len__(self) -> int:
+        return self.archived + len(self.recent)
+
+    def append(self, role: str, content: str) -> None:
+        """Add a message, archiving the oldest in-memory one if the window is full."""
+        self.recent.append({"seq": len(self), "role": role, "content": content})
+        if self.window and len(self.recent) > self.window:
+            self.store.append(self.session_id, self.recent.pop(0))
+            self.archived += 1
+
+    @property
+    def pages(self) -> int:
+        """Number of pages of archived messages."""
+        return -(-self.archived // self.page_size)
+
+    def page(self, number: int) -> List[Dict[str, Any]]:
+        """Archived page ``number`` (1: just before the window), oldest message first."""
+        stop = self.archived - (number - 1) * self.page_size
+        return self.store.read(self.session_id, max(0, stop - self.page_size), stop) if stop > 0 else []
+
+    def clear(self) -> None:
+        """Remove every message, archived ones included."""
+        self.store.delete(self.session_id)
+        self.recent = []
+        self.archived = 0
+
+
+def message_markdown(role: str, content: str) -> str:
+    """One archived message as a markdown block."""
+    return f"{ROLE_LABELS.get(role, role)}\n\n{content}"
+
+
+def page_markdown(messages: List[Dict[str, Any]]) -> str:
+    """A page of archived messages as a single markdown string, rendered as one element."""
+    return "\n\n---\n\n".join(message_markdown(m["role"], m["content"]) for m in messages)
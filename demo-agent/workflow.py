@@ -0,0 +1,463 @@
+"""
+Code-driven Guide: the lesson flow as an explicit state machine.
+
+The LLM Guide spends a model call deciding which tool comes next on every step of a
+workflow that never changes. GuideWorkflow runs the same phases in code:
+
+    collect_info -> choose_topic -> diagnostic -> lesson -> finished
+
+A student coming back to a topic they have shown mastery of skips the diagnostic and
+the Planner: the lesson continues from their stored plan (mastery.py).
+
+The current phase lives in session state ('workflow_phase'), so a conversation can
+continue on any server process. Tester, Planner, Explainer and Quizzer are called
+directly, quiz answers are graded locally, and the only model calls the Guide itself
+makes are short encouragement messages from the Encourager. Tool calls are recorded as
+function call/response events, exactly as if the model had made them, so the session
+history, the frontend progress messages and the metrics look the same in both modes.
+"""
+import logging
+import re
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.function_tool import FunctionTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from . import progress
+from . import quiz as quiz_engine
+from .cache import normalize_text
+from .mastery import record_check_answer, record_plan, remaining_steps
+from .metrics import track_tool
+from .schemas import parse_output
+from .tools import store_user_info, submit_answer
+
+logger = logging.getLogger(__name__)
+
+PHASE_KEY = "workflow_phase"
+
+INFO_FIELDS = ("student_number", "name", "grade")
+INFO_PROMPTS = {
+    "student_number": "First, could you please tell me your student number? 🔢",
+    "name": "Thanks! And what is your name? 😊",
+    "grade": "Great! Which group are you in? (just the number) 🏫",
+}
+
+
+def parse_student_info(text: str, awaiting: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Pick the student number, name and group out of a message.
+
+    Accepts "<number>, <name>, group <n>" in one message, phrases like "my name is ...",
+    or, when ``awaiting`` names the field that was just asked for, the bare reply.
+
+    Returns:
+        Dict[str, Any]: Any of 'student_number', 'name' and 'grade' that were found.
+    """
+    text = text.strip()
+    info: Dict[str, Any] = {}
+    parts = [p.strip() for p in text.split(",") if p.strip()]
+    if len(parts) >= 3 and re.search(r"\d", parts[0]):
+        group = re.search(r"\d+", parts[2])
+        info = {"student_number": parts[0], "name": parts[1]}
+        if group:
+            info["grade"] = int(group.group())
+        return info
+
+    group = re.search(r"\b(?:group|grade|class)\s*(?:is\s*)?(\d+)", text, re.IGNORECASE)
+    if group:
+        info["grade"] = int(group.group(1))
+    number = re.search(r"\b(?:number|id)\s*(?:is\s*)?([A-Za-z]*\d[\w-]*)", text, re.IGNORECASE)
+    if number:
+        info["student_number"] = number.group(1)
+    name = re.search(r"\b(?:name is|i am|i'm|call me)\s+([A-Za-z][A-Za-z' -]*)", text, re.IGNORECASE)
+    if name:
+        info["name"] = re.split(r"\s+(?:and|from|in)\s+", name.group(1).strip(" .!"), maxsplit=1)[0]
+
+    if awaiting and awaiting not in info:
+        if awaiting == "grade":
+            digits = re.search(r"\d+", text)
+            if digits:
+                info["grade"] = int(digits.group())
+        elif awaiting == "student_number":
+            token = re.search(r"[A-Za-z]*\d[\w-]*", text)
+            if token:
+                info["student_number"] = token.group()
+        elif re.fullmatch(r"[A-Za-z][A-Za-z' -]{0,40}", text.strip(" .!")):
+            info["name"] = text.strip(" .!")
+    return info
+
+
+# Words that make a short reply name a math topic ("fractions", "times tables", "7 x 8")
+_MATH_WORDS = re.compile(
+    r"\d\s*[-+x×*/÷^]\s*\d|\b(?:add\w*|sums?|plus|subtract\w*|minus|take away|multipl\w*|times tables?|"
+    r"divi[ds]\w*|fractions?|decimals?|percent\w*|halv\w*|halves|half|doubl\w*|quarters?|numbers?|counting|"
+    r"even|odd|primes?|factors?|place value|round\w*|estimat\w*|ratios?|proportions?|geometry|shapes?|"
+    r"angles?|triangles?|circles?|squares?|rectangles?|area|perimeter|volume|measur\w*|length|weight|clocks?|"
+    r"telling time|money|coins?|graphs?|charts?|algebra|equations?|patterns?|sequences?|symmetry|integers?|"
+    r"negative numbers|exponents?|powers?|probability|statistics|median|average|math\w*)\b",
+    re.IGNORECASE,
+)
+_TOPIC_REQUEST = re.compile(
+    r"^(?:(?:can|could) you\s+)?(?:please\s+)?(?:teach me(?: about)?|i (?:want|would like|'d like) to (?:learn|do|practi[cs]e)(?: about)?|"
+    r"let'?s (?:learn|do|try|practi[cs]e)(?: about)?|learn(?: about)?|practi[cs]e|how about|what about|quiz me on|"
+    r"(?:new|next) topic:?)\s+(?P<topic>.+)$",
+    re.IGNORECASE,
+)
+_PRACTICE_QUIZ = re.compile(r"\b(?:practice|another|new|same|one more)\s+quiz\b|\bquiz me again\b|^(?:again|one more time)$", re.IGNORECASE)
+_NEW_TOPIC = re.compile(r"\b(?:new|another|different|next|other)\s+(?:math\s+)?(?:topic|subject|lesson)\b|\bsomething else\b", re.IGNORECASE)
+_VAGUE_WORDS = frozenset("it this that more something anything stuff again please".split())
+
+
+def parse_next_choice(text: str, current_topic: str = "") -> Tuple[str, Optional[str]]:
+    """
+    Read what a student who finished a lesson wants to do next.
+
+    Returns:
+        Tuple[str, Optional[str]]: ("topic", <topic>) for a topic asked for ("teach me
+        fractions"), repeated (``current_topic``) or given as a short reply about math
+        ("times tables"); ("quiz", None) for another practice quiz on the same topic;
+        ("choose", None) for a new topic not named yet; ("menu", None) for anything else
+        ("Thanks so much!").
+    """
+    text = text.strip()
+    plain = text.strip(" .!")
+    if _PRACTICE_QUIZ.search(plain):
+        return "quiz", None
+    if _NEW_TOPIC.search(plain):
+        return "choose", None
+    request = _TOPIC_REQUEST.match(plain)
+    if request:
+        topic = request.group("topic").strip(" .!?")
+        words = set(re.findall(r"\w+", topic.lower()))
+        if words and not words <= _VAGUE_WORDS:
+            return "topic", topic
+    if current_topic and normalize_text(plain) == normalize_text(current_topic):
+        return "topic", plain
+    if "?" not in text and len(plain.split()) <= 6 and _MATH_WORDS.search(plain):
+        return "topic", plain
+    return "menu", None
+
+
+def _check_question_text(question: Dict[str, Any]) -> str:
+    lines = [f"Quick check: {question['question']}"]
+    for label, option in zip(quiz_engine.OPTION_LABELS, question["options"]):
+        lines.append(f"{label}) {option}")
+    return "\n".join(lines)
+
+
+def _feedback(is_correct: bool, correct_answer: str) -> str:
+    if is_correct:
+        return "✅ Correct! Amazing work!"
+    return f"❌ Not quite! The answer was {correct_answer}. You've got this!"
+
+
+class GuideWorkflow(BaseAgent):
+    """
+    A deterministic replacement for the LLM Guide with the same tools and state.
+
+    Each turn reads the phase from session state, performs that phase's steps and
+    answers with one message. Quiz and lesson progress is kept in the same compact
+    record (progress.py) as the LLM Guide's tools write.
+    """
+
+    tester_tool: BaseTool
+    planner_tool: BaseTool
+    explainer_tool: BaseTool
+    quizzer_tool: BaseTool
+    encourager_tool: Optional[BaseTool] = None
+    """Writes short encouragement; templated text is used when absent or failing."""
+    prefetcher: Optional[Any] = None
+    """Prefetcher that generates upcoming lesson steps while the student answers."""
+
+    @property
+    def tools(self) -> List[BaseTool]:
+        """The agent tools this workflow calls (used to reach the subagents)."""
+        tools = [self.tester_tool, self.planner_tool, self.explainer_tool, self.quizzer_tool]
+        return tools + ([self.encourager_tool] if self.encourager_tool is not None else [])
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        text = "".join(part.text or "" for part in (ctx.user_content.parts if ctx.user_content else []) if part.text).strip()
+        actions = EventActions()
+        state = CallbackContext(ctx, event_actions=actions).state
+        reply: List[str] = []
+
+        phase = state.get(PHASE_KEY, "collect_info")
+        if phase == "collect_info" and all(state.get(field) for field in INFO_FIELDS):
+            phase = "choose_topic"
+
+        if phase == "collect_info":
+            async for event in self._collect_info(ctx, state, text, reply):
+                yield event
+        elif phase == "choose_topic":
+            async for event in self._start_diagnostic(ctx, state, text, reply):
+                yield event
+        elif phase == "diagnostic":
+            async for event in self._grade_diagnostic(ctx, state, text, reply):
+                yield event
+        elif phase == "lesson":
+            async for event in self._grade_check(ctx, state, text, reply):
+                yield event
+        else:
+            async for event in self._choose_next(ctx, state, text, reply):
+                yield event
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=actions,
+            content=types.Content(role="model", parts=[types.Part(text="\n\n".join(reply))]),
+        )
+
+    async def _call_tool(
+        self, ctx: InvocationContext, tool: BaseTool, args: Dict[str, Any], result: Dict[str, Any]
+    ) -> AsyncGenerator[Event, None]:
+        """Run ``tool`` as the model would: emit the call, run it, emit the response. Sets result['value']."""
+        call = types.FunctionCall(id=f"wf-{uuid.uuid4().hex[:12]}", name=tool.name, args=args)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(function_call=call)]),
+        )
+        tool_context = ToolContext(ctx, function_call_id=call.id)
+        with track_tool(self.name, tool.name, ctx.session.id, args) as recorded:
+            value = recorded["result"] = await tool.run_async(args=args, tool_context=tool_context)
+        result["value"] = value
+        response = value if isinstance(value, dict) else {"result": value}
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=tool_context.actions,
+            content=types.Content(role="user", parts=[types.Part(
+                function_response=types.FunctionResponse(id=call.id, name=tool.name, response=response)
+            )]),
+        )
+
+    async def _encourage(self, ctx: InvocationContext, situation: str, fallback: str, reply: List[str]) -> AsyncGenerator[Event, None]:
+        """Append an encouraging line for ``situation``; the only free text a model writes."""
+        if self.encourager_tool is None:
+            reply.append(fallback)
+            return
+        result: Dict[str, Any] = {}
+        try:
+            async for event in self._call_tool(ctx, self.encourager_tool, {"request": situation}, result):
+                yield event
+        except Exception as e:
+            logger.warning("Encourager failed, using the templated message: %s", e)
+        reply.append(str(result.get("value") or "").strip() or fallback)
+
+    async def _collect_info(self, ctx: InvocationContext, state, text: str, reply: List[str]) -> AsyncGenerator[Event, None]:
+        draft = dict(state.get("student_info_draft") or {})
+        draft.update(parse_student_info(text, state.get("student_info_awaiting")))
+        missing = [field for field in INFO_FIELDS if not draft.get(field)]
+        if missing:
+            state["student_info_draft"] = draft
+            state["student_info_awaiting"] = missing[0]
+            if not draft:
+                reply.append("Hello and welcome, math explorer! 🌟 I'm your Quest Guide.")
+            reply.append(INFO_PROMPTS[missing[0]])
+            return
+
+        result: Dict[str, Any] = {}
+        async for event in self._call_tool(ctx, FunctionTool(store_user_info), draft, result):
+            yield event
+        state["student_info_draft"] = None
+        state["student_info_awaiting"] = None
+        state[PHASE_KEY] = "choose_topic"
+        reply.append(f"Welcome, {draft['name']}! 🎉 Which math topic would you like to learn today?")
+
+    async def _start_diagnostic(self, ctx: InvocationContext, state, topic: str, reply: List[str]) -> AsyncGenerator[Event, None]:
+        if not topic:
+            reply.append("Which math topic would you like to learn today? 🤔")
+            return
+        if self.prefetcher is not None:
+            self.prefetcher.cancel(ctx.session.id)
+        state["current_topic"] = topic
+        # Asking for a topic again right after it was skipped means the student wants the quiz
+        if state.get("mastery_skipped_topic") != normalize_text(topic):
+            steps = remaining_steps(state, topic)
+            if steps is not None:
+                async for event in self._resume_lesson(ctx, state, topic, steps, reply):
+                    yield event
+                return
+        state["mastery_skipped_topic"] = None
+        result: Dict[str, Any] = {}
+        async for event in self._call_tool(ctx, self.tester_tool, {"request": topic}, result):
+            yield event
+
+        # The Tester normally starts the quiz itself; start it from its output otherwise
+        # (also when a cached quiz's questions are no longer in the question store)
+        if not quiz_engine.is_active(state) or quiz_engine.questions(state) is None:
+            quiz = parse_output("quiz", str(result.get("value") or "")).value
+            try:
+                quiz_engine.start(state, quiz)
+            except quiz_engine.QuizError:
+                reply.append(f"Oops! I couldn't prepare a quiz about {topic}. 🙈 Could you try another topic?")
+                return
+        state[PHASE_KEY] = "diagnostic"
+        questions = quiz_engine.questions(state)
+        reply.append(f"Let's warm up with a quick quiz about {topic}! ✨ Answer with the letter of your choice.")
+        reply.append(quiz_engine.format_question(questions[0], 1, len(questions)))
+
+    async def _choose_next(self, ctx: InvocationContext, state, text: str, reply: List[str]) -> AsyncGenerator[Event, None]:
+        """After a lesson: start a diagnostic only when the student picks a topic or another quiz."""
+        topic = state.get("current_topic") or ""
+        choice, named = parse_next_choice(text, topic)
+        if choice == "quiz" and topic:
+            # Skip the mastery check, as when a skipped topic is asked for again
+            state["mastery_skipped_topic"] = normalize_text(topic)
+            named = topic
+        elif choice == "choose":
+            state[PHASE_KEY] = "choose_topic"
+            reply.append("Which math topic would you like to learn next? 🤔")
+            return
+        if named:
+            async for event in self._start_diagnostic(ctx, state, named, reply):
+                yield event
+            return
+        reply.append(
+            f"You've finished your quest on {topic or 'this topic'}! 🎉 Tell me another math topic "
+            "(like fractions or times tables), or ask for a practice quiz to try this one again."
+        )
+
+    async def _grade_diagnostic(self, ctx: InvocationContext, state, text: str, reply: List[str]) -> AsyncGenerator[Event, None]:
+        result: Dict[str, Any] = {}
+        async for event in self._call_tool(ctx, FunctionTool(submit_answer), {"answer": text}, result):
+            yield event
+        graded = result["value"]
+        if graded["status"] == "unrecognized":
+            reply.append("Please answer with one of the option letters (A, B or C). 🙂")
+            reply.append(graded["current_question"])
+            return
+        if graded["status"] == "error":
+            # The quiz state is gone (e.g. reset); start over from the topic
+            state[PHASE_KEY] = "choose_topic"
+            reply.append("Let's pick a topic to practice! Which math topic would you like to learn?")
+            return
+
+        reply.append(_feedback(graded["is_correct"], graded["correct_answer"]))
+        if graded["status"] == "answered":
+            reply.append(graded["next_question"])
+            return
+
+        topic = state.get("current_topic", "")
+        total = graded["total_answered"]
+        async for event in self._encourage(
+            ctx,
+            f"A student finished a warm-up quiz about {topic} with {graded['correct_answers']} of {total} correct.",
+            "Great job finishing the quiz! Based on that, I've designed your custom learning path. 🗺️",
+            reply,
+        ):
+            yield event
+
+        result = {}
+        async for event in self._call_tool(ctx, self.planner_tool, {"request": quiz_engine.planner_request(topic, graded["test_results_json"])}, result):
+            yield event
+        plan = parse_output("lesson_plan", str(result.get("value") or "")).value or [topic]
+        record_plan(state, plan)
+        self._start_lesson(state, plan)
+        if self.prefetcher is not None:
+            self.prefetcher.schedule(ctx.session.id, plan, start=1)
+        async for event in self._teach_step(ctx, state, reply):
+            yield event
+
+    async def _resume_lesson(self, ctx: InvocationContext, state, topic: str, steps: List[str], reply: List[str]) -> AsyncGenerator[Event, None]:
+        """Continue a known student's stored plan at ``steps``, without a diagnostic or Planner call."""
+        state["mastery_skipped_topic"] = normalize_text(topic)
+        if not steps:
+            state[PHASE_KEY] = "finished"
+            reply.append(
+                f"Welcome back! 🏆 Your recent answers show you've already mastered {topic}. "
+                f"Tell me another math topic, or say {topic} again for a fresh practice quiz!"
+            )
+            return
+        self._start_lesson(state, steps)
+        reply.append(f"Welcome back! 🌟 You already know a lot about {topic}, so let's skip the warm-up quiz and pick up where you left off.")
+        if self.prefetcher is not None:
+            self.prefetcher.schedule(ctx.session.id, steps, start=1)
+        async for event in self._teach_step(ctx, state, reply):
+            yield event
+
+    def _start_lesson(self, state, plan: List[str]) -> None:
+        record = progress.load(state)
+        record.lesson = progress.LessonProgress(plan=plan)
+        progress.save(state, record)
+        state[PHASE_KEY] = "lesson"
+
+    async def _teach_step(self, ctx: InvocationContext, state, reply: List[str]) -> AsyncGenerator[Event, None]:
+        lesson = progress.load(state).lesson
+        plan, index, step = lesson.plan, lesson.at, lesson.step
+        if self.prefetcher is not None:
+            await self.prefetcher.wait(ctx.session.id, step)
+
+        result: Dict[str, Any] = {}
+        async for event in self._call_tool(ctx, self.explainer_tool, {"request": step}, result):
+            yield event
+        explanation = str(result.get("value") or "").strip()
+
+        result = {}
+        async for event in self._call_tool(ctx, self.quizzer_tool, {"request": explanation}, result):
+            yield event
+        question = parse_output("question", str(result.get("value") or "")).value
+        record = progress.load(state)
+        record.lesson.check = progress.question_store.put(question) if question is not None else None
+        record.shown_at = time.time()
+        progress.save(state, record)
+
+        reply.append(f"📚 Step {index + 1} of {len(plan)}: {step}")
+        reply.append(f"Professor Pizza says: {explanation}")
+        if question is not None:
+            reply.append(_check_question_text(question))
+        else:
+            reply.append("Ready for the next step? Say anything to continue! 🚀")
+
+    async def _grade_check(self, ctx: InvocationContext, state, text: str, reply: List[str]) -> AsyncGenerator[Event, None]:
+        record = progress.load(state)
+        lesson = record.lesson
+        if lesson is None:
+            # The lesson state is gone (e.g. reset); start over from the topic
+            state[PHASE_KEY] = "choose_topic"
+            reply.append("Let's pick a topic to practice! Which math topic would you like to learn?")
+            return
+        question = progress.question_store.get(lesson.check) if lesson.check else None
+        if question is not None:
+            choice = quiz_engine.parse_choice(text, question["options"])
+            if choice is None:
+                reply.append("Please answer with one of the option letters (A, B or C). 🙂")
+                reply.append(_check_question_text(question))
+                return
+            correct = question["correct_answer_index"]
+            is_correct = choice == correct
+            lesson.record_check(is_correct)
+            record_check_answer(state, lesson.step, question, choice, is_correct)
+            reply.append(_feedback(is_correct, f"{quiz_engine.OPTION_LABELS[correct]}) {question['options'][correct]}"))
+
+        lesson.check = None
+        if lesson.at + 1 < len(lesson.plan):
+            lesson.at += 1
+            progress.save(state, record)
+            async for event in self._teach_step(ctx, state, reply):
+                yield event
+            return
+
+        progress.save(state, record)
+        state[PHASE_KEY] = "finished"
+        async for event in self._encourage(
+            ctx,
+            f"A student completed all {len(lesson.plan)} lesson steps about {state.get('current_topic', '')}, "
+            f"answering {lesson.checks_correct} of {lesson.checks_answered} check questions correctly.",
+            "🎉 Fantastic! You finished every lesson step!",
+            reply,
+        ):
+            yield event
+        reply.append("Want to keep going? Tell me another math topic, or take another practice quiz! 🚀")
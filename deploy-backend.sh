@@ -63,6 +63,7 @@ gcloud run deploy ${SERVICE_NAME} \
     --memory 1Gi \
     --cpu 1 \
     --timeout 300 \
+    --cpu-boost \
     --set-env-vars "PYTHONUNBUFFERED=1" \
     --max-instances 10 \
     --min-instances 0
@@ -78,6 +78,7 @@ gcloud run deploy ${SERVICE_NAME} \
     --memory 1Gi \
     --cpu 1 \
     --timeout 300 \
+    --cpu-boost \
     --set-env-vars "ADK_API_URL=${BACKEND_URL},PYTHONUNBUFFERED=1" \
     --max-instances 10 \
     --min-instances 0
@@ -16,10 +16,10 @@ echo "🚀 Starting Math Learning Assistant (Streamlit UI)..."
 echo "📡 Connecting to ADK API Server at: $ADK_API_URL"
 echo ""
 echo "⚠️  Important: Ensure the ADK API server is running!"
-echo "   Start it with: uv run adk api_server"
+echo "   Start it with: uv run python -m demo-agent.server"
 echo ""
 
-uv run adk api_server --session_db_url="sqlite:///./agent_store.db" &
+uv run python -m demo-agent.server --session_service_uri="slimpai-sqlite:///./agent_store.db" &
 sleep 2  # Give the server a moment to start
 # Run the Streamlit app
 uv run streamlit run demo-agent/app.py
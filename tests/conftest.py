@@ -0,0 +1,46 @@
+"""
+Shared fixtures.
+
+The shared stores (content cache, mastery, questions, chat history) are created when
+their modules are first imported, so they are pointed at memory here, before any test
+module imports the package; fixtures swap in fresh ones per test.
+"""
+import importlib
+import os
+
+import pytest
+
+for _var in ("SLIMPAI_CACHE_DB", "SLIMPAI_MASTERY_DB", "SLIMPAI_QUESTION_DB", "CHAT_HISTORY_DB", "SLIMPAI_BANK_DIR", "SLIMPAI_RECORD_LOG"):
+    os.environ[_var] = ""
+
+progress = importlib.import_module("demo-agent.progress")
+mastery = importlib.import_module("demo-agent.mastery")
+dedup = importlib.import_module("demo-agent.dedup")
+
+
+@pytest.fixture
+def question_store(monkeypatch):
+    store = progress.QuestionStore(path=None)
+    monkeypatch.setattr(progress, "question_store", store)
+    return store
+
+
+@pytest.fixture
+def mastery_store(monkeypatch):
+    store = mastery.MasteryStore(path=None)
+    monkeypatch.setattr(mastery, "mastery_store", store)
+    return store
+
+
+@pytest.fixture
+def dedup_index(monkeypatch):
+    index = dedup.DedupIndex(path=None)
+    monkeypatch.setattr(dedup, "dedup_index", index)
+    return index
+
+
+@pytest.fixture
+def sample_quiz():
+    """The fake Tester's diagnostic (correct answers: B, A, C)."""
+    fake_llm = importlib.import_module("demo-agent.fake_llm")
+    return [dict(question) for question in fake_llm.FAKE_QUIZ]
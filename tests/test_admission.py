@@ -0,0 +1,112 @@
+import asyncio
+import importlib
+
+import pytest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+admission = importlib.import_module("demo-agent.admission")
+agents = importlib.import_module("demo-agent.agent")
+cache = importlib.import_module("demo-agent.cache")
+fake_llm = importlib.import_module("demo-agent.fake_llm")
+
+
+def test_calls_beyond_max_concurrency_wait_for_a_slot():
+    async def scenario():
+        scheduler = admission.ModelScheduler(max_concurrency=1, queue_timeout=1)
+        await scheduler.acquire()
+        waiting = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        assert not waiting.done() and scheduler.stats["queued"] == 1
+
+        scheduler.release()
+        await waiting
+        assert scheduler.in_flight == 1
+        scheduler.release()
+        assert scheduler.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_interactive_calls_go_before_background_work():
+    async def scenario():
+        scheduler = admission.ModelScheduler(max_concurrency=1, queue_timeout=1)
+        await scheduler.acquire()
+        order = []
+
+        async def call(name):
+            await scheduler.acquire()
+            order.append(name)
+            scheduler.release()
+
+        with admission.background():
+            prefetch = asyncio.ensure_future(call("prefetch"))
+        await asyncio.sleep(0)
+        turn = asyncio.ensure_future(call("turn"))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(prefetch, turn)
+        assert order == ["turn", "prefetch"]
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_and_long_waits_are_refused():
+    async def scenario():
+        scheduler = admission.ModelScheduler(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+        await scheduler.acquire()
+        waiting = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(admission.AdmissionRejected):
+            await scheduler.acquire()
+        with pytest.raises(admission.AdmissionRejected):
+            await waiting
+        assert scheduler.stats["rejected_queue_full"] == 1
+        assert scheduler.stats["rejected_timeout"] == 1
+        assert scheduler.position("any") == {"position": 0, "queued": 0, "in_flight": 1}
+
+    asyncio.run(scenario())
+
+
+def test_tenants_over_their_rate_are_refused():
+    async def scenario():
+        scheduler = admission.ModelScheduler(tenant_rpm=60, tenant_burst=1, queue_timeout=0.5)
+        await scheduler.acquire()
+        scheduler.release()
+        # The next token is due in a second, past the queue timeout
+        with pytest.raises(admission.AdmissionRejected):
+            await scheduler.acquire()
+        assert scheduler.stats["rejected_rate_limit"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_llm_guide_tool_calls_do_not_wait_for_the_guides_slot(question_store, mastery_store, dedup_index, monkeypatch):
+    scheduler = admission.ModelScheduler(max_concurrency=1, queue_timeout=1)
+    monkeypatch.setattr(admission, "scheduler", scheduler)
+    content_cache = cache.ContentCache(path=None)
+    for tool in (agents.tester_tool, agents.planner_tool, agents.explainer_tool, agents.quizzer_tool):
+        monkeypatch.setattr(tool, "cache", content_cache)
+        monkeypatch.setattr(tool, "bank", None)
+    guide = agents.llm_guide
+    fake = fake_llm.FakeLlm()
+    fake_llm.install_fake_llm(guide, fake)
+    admission.schedule_models(guide)
+
+    async def scenario():
+        runner = Runner(agent=guide, app_name="slimpai_test", session_service=InMemorySessionService())
+        session = await runner.session_service.create_session(app_name="slimpai_test", user_id="student_1")
+        texts = []
+        for message in ["Hi!", "S0001, Student 1, group 2", "halving"]:
+            content = types.Content(role="user", parts=[types.Part(text=message)])
+            async for event in runner.run_async(user_id="student_1", session_id=session.id, new_message=content):
+                assert not event.error_code
+                texts += [part.text for part in (event.content.parts if event.content else None) or [] if part.text]
+        return texts
+
+    texts = asyncio.run(scenario())
+    assert "Question 1 of 3: What is half of 4?" in texts[-1]
+    assert fake.calls["Tester"] == 2
+    assert scheduler.stats["rejected_timeout"] == 0
+    assert scheduler.in_flight == 0
@@ -0,0 +1,159 @@
+"""End-to-end runs of both Guides against the scripted fake model (fake_llm.py)."""
+import asyncio
+import importlib
+
+import pytest
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+agents = importlib.import_module("demo-agent.agent")
+cache = importlib.import_module("demo-agent.cache")
+fake_llm = importlib.import_module("demo-agent.fake_llm")
+progress = importlib.import_module("demo-agent.progress")
+
+APP_NAME = "slimpai_test"
+INTRO = ["Hi!", "S0001, Student 1, group 2", "halving"]
+
+
+@pytest.fixture
+def content_cache(monkeypatch):
+    store = cache.ContentCache(path=None)
+    for tool in (agents.tester_tool, agents.planner_tool, agents.explainer_tool, agents.quizzer_tool, agents.encourager_tool):
+        monkeypatch.setattr(tool, "cache", store)
+        monkeypatch.setattr(tool, "bank", None)
+    return store
+
+
+@pytest.fixture
+def stores(question_store, mastery_store, dedup_index, content_cache):
+    return {"questions": question_store, "mastery": mastery_store, "cache": content_cache}
+
+
+def _guide(name):
+    guide = getattr(agents, name)
+    fake = fake_llm.FakeLlm()
+    fake_llm.install_fake_llm(guide, fake)
+    return guide, fake
+
+
+class Student:
+    """One conversation: ``say`` returns the texts and tool calls of a turn."""
+
+    def __init__(self, runner, user_id):
+        self.runner = runner
+        self.user_id = user_id
+        self.session_id = None
+
+    async def say(self, message):
+        if self.session_id is None:
+            session = await self.runner.session_service.create_session(app_name=APP_NAME, user_id=self.user_id)
+            self.session_id = session.id
+        texts, calls = [], []
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+        async for event in self.runner.run_async(user_id=self.user_id, session_id=self.session_id, new_message=content):
+            calls += [call.name for call in event.get_function_calls()]
+            texts += [part.text for part in (event.content.parts if event.content else None) or [] if part.text]
+        return "\n".join(texts), calls
+
+    async def state(self):
+        session = await self.runner.session_service.get_session(app_name=APP_NAME, user_id=self.user_id, session_id=self.session_id)
+        return session.state
+
+
+def _runner(guide):
+    return Runner(agent=guide, app_name=APP_NAME, session_service=InMemorySessionService())
+
+
+def test_workflow_runs_the_whole_lesson(stores):
+    guide, fake = _guide("guide_workflow")
+
+    async def scenario():
+        student = Student(_runner(guide), "student_1")
+        for message in INTRO:
+            text, calls = await student.say(message)
+        assert calls == ["Tester"]
+        assert "Question 1 of 3: What is half of 4?" in text
+
+        text, calls = await student.say("B")
+        assert calls == ["submit_answer"] and "Correct" in text
+        await student.say("B")
+        text, calls = await student.say("C")
+        assert {"Planner", "Explainer", "Quizzer"} <= set(calls)
+        assert "Step 1 of 1" in text
+
+        text, _ = await student.say("B")
+        assert "another math topic" in text
+        return await student.state()
+
+    state = asyncio.run(scenario())
+    record = progress.load(state)
+    assert record.quiz.outcomes() == [True, False, True]
+    assert record.lesson.checks_correct == 1
+    assert state["workflow_phase"] == "finished"
+    assert stores["mastery"].topic_mastery("S0001", "halving")["attempts"] == 4
+    # The Guide itself never calls the model
+    assert fake.calls["Guide"] == 0
+
+
+def test_workflow_offers_the_menu_after_a_finished_lesson(stores):
+    guide, fake = _guide("guide_workflow")
+
+    async def scenario():
+        student = Student(_runner(guide), "student_1")
+        for message in INTRO + ["B", "B", "C", "B"]:
+            await student.say(message)
+        testers = fake.calls["Tester"]
+        text, calls = await student.say("Thanks so much!")
+        assert calls == [] and "another math topic" in text
+        assert fake.calls["Tester"] == testers
+
+    asyncio.run(scenario())
+
+
+def test_llm_guide_grades_quiz_answers_without_the_model(stores):
+    guide, fake = _guide("llm_guide")
+
+    async def scenario():
+        student = Student(_runner(guide), "student_1")
+        for message in INTRO:
+            text, calls = await student.say(message)
+        assert calls == ["Tester"]
+
+        guide_calls = fake.calls["Guide"]
+        text, _ = await student.say("B")
+        assert "Question 2 of 3" in text
+        await student.say("B")
+        assert fake.calls["Guide"] == guide_calls
+
+        text, calls = await student.say("C")
+        assert calls == ["Planner", "Explainer", "Quizzer"]
+        assert fake_llm.FAKE_CHECK_QUESTION["question"] in text
+        return await student.state()
+
+    state = asyncio.run(scenario())
+    assert progress.load(state).quiz.outcomes() == [True, False, True]
+    assert state["current_topic"] == "halving"
+
+
+def test_cached_quiz_starts_fresh_for_another_student(stores):
+    guide, fake = _guide("guide_workflow")
+
+    async def scenario():
+        runner = _runner(guide)
+        first, second = Student(runner, "student_1"), Student(runner, "student_2")
+        for message in INTRO + ["B", "B", "C"]:
+            await first.say(message)
+        testers = fake.calls["Tester"]
+
+        for message in ["Hi!", "S0002, Student 2, group 2", "Halving numbers"]:
+            text, _ = await second.say(message)
+        assert "Question 1 of 3: What is half of 4?" in text
+        assert fake.calls["Tester"] == testers
+        return await second.state()
+
+    state = asyncio.run(scenario())
+    record = progress.load(state)
+    assert stores["cache"].stats["memory_hits"] >= 1
+    assert record.quiz.at == 0 and record.lesson is None
+    assert stores["questions"].get_many(record.quiz.ids) == fake_llm.FAKE_QUIZ
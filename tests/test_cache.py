@@ -0,0 +1,101 @@
+import importlib
+import json
+
+import pytest
+from google.adk.agents import LlmAgent
+
+cache = importlib.import_module("demo-agent.cache")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable time.time(), starting at 1000."""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_memory_tier_expires_after_ttl(clock):
+    store = cache.ContentCache(path=None, ttl_seconds=60)
+    store.put("k", {"a": 1})
+
+    clock[0] += 60
+    assert store.get("k") == {"a": 1}
+    clock[0] += 1
+    assert store.get("k") is None
+    assert store.stats["memory_hits"] == 1 and store.stats["misses"] == 1
+
+
+def test_memory_tier_drops_least_recently_used(clock):
+    store = cache.ContentCache(path=None, memory_size=2)
+    store.put("a", 1)
+    store.put("b", 2)
+    assert store.get("a") == 1
+    store.put("c", 3)
+
+    assert store.get("b") is None
+    assert store.get("a") == 1 and store.get("c") == 3
+    assert store.stats["evictions"] == 1
+
+
+def test_disk_tier_serves_entries_the_memory_tier_dropped(clock, tmp_path):
+    store = cache.ContentCache(path=str(tmp_path / "cache.db"), memory_size=1)
+    store.put("a", [1, 2])
+    store.put("b", [3])
+
+    assert store.get("a") == [1, 2]
+    assert store.stats["disk_hits"] == 1
+    assert cache.ContentCache(path=str(tmp_path / "cache.db")).get("b") == [3]
+
+
+def test_disk_tier_expires_after_ttl(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache.ContentCache(path=path, ttl_seconds=60).put("k", "v")
+
+    clock[0] += 61
+    assert cache.ContentCache(path=path, ttl_seconds=60).get("k") is None
+
+
+def test_disk_tier_keeps_max_entries_most_recently_used(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    store = cache.ContentCache(path=path, memory_size=0, max_entries=2)
+    store.put("a", 1)
+    clock[0] += 1
+    store.put("b", 2)
+    clock[0] += 1
+    assert store.get("a") == 1
+    clock[0] += 1
+    store.put("c", 3)
+
+    assert store.get("b") is None
+    assert store.get("a") == 1 and store.get("c") == 3
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    store = cache.ContentCache(path=str(tmp_path / "cache.db"))
+    store.put("k", "v")
+    store.clear()
+    assert store.get("k") is None
+
+
+def test_normalize_text_ignores_case_punctuation_and_spacing():
+    assert cache.normalize_text("Halving!") == cache.normalize_text("  halving ") == "halving"
+
+
+def test_only_results_that_fit_the_schema_are_cacheable():
+    tester = LlmAgent(name="Tester", model="gemini-2.0-flash", instruction="Write a quiz.")
+    tool = cache.CachedAgentTool(tester, cache.ContentCache(path=None))
+    question = {"question": "What is half of 4?", "options": ["1", "2", "3"], "correct_answer_index": 1}
+
+    assert tool.cacheable(json.dumps([question]))
+    assert not tool.cacheable("")
+    assert not tool.cacheable("Sorry, I can't make a quiz about that.")
+
+
+def test_cache_key_changes_with_the_prompt():
+    def key(instruction):
+        agent = LlmAgent(name="Planner", model="gemini-2.0-flash", instruction=instruction)
+        return cache.CachedAgentTool(agent, cache.ContentCache(path=None)).cache_key({"request": "Halving"})
+
+    assert key("Plan a lesson.") == key("Plan a lesson.")
+    assert key("Plan a lesson.") != key("Plan a short lesson.")
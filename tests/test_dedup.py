@@ -0,0 +1,97 @@
+import importlib
+
+import pytest
+
+cache = importlib.import_module("demo-agent.cache")
+dedup = importlib.import_module("demo-agent.dedup")
+
+
+def test_rephrased_topics_map_onto_the_first_phrasing(dedup_index):
+    assert dedup_index.topic("Halving") == "halving"
+    assert dedup_index.topic("Halving numbers") == "halving"
+    assert dedup_index.topic("learn about halving") == "halving"
+    assert dedup_index.entries(dedup.TOPIC) == ["halving"]
+    assert dedup_index.stats[(dedup.TOPIC, "mapped")] == 2
+
+
+def test_inflections_and_typos_are_the_same_words(dedup_index):
+    assert dedup_index.topic("adding fractions") == "adding fractions"
+    assert dedup_index.topic("add fractions") == "adding fractions"
+    assert dedup_index.topic("multiplication") == "multiplication"
+    assert dedup_index.topic("multiplicaton") == "multiplication"
+
+
+@pytest.mark.parametrize("canonical, variant", [
+    ("halving", "half of numbers"),
+    ("halving", "dividing by 2"),
+    ("halving", "Divide by two"),
+    ("Halving even numbers", "How to halve even numbers"),
+    ("Counting by 5s", "Counting in 5s"),
+    ("Counting by 5s", "counting in fives"),
+    ("Adding fractions with the same denominator", "Adding fractions with like denominators"),
+])
+def test_planner_rephrasings_and_synonyms_share_an_entry(dedup_index, canonical, variant):
+    expected = dedup_index.step(canonical)
+    assert dedup_index.step(variant) == expected
+    assert dedup_index.entries(dedup.STEP) == [expected]
+
+
+def test_different_numbers_are_never_merged(dedup_index):
+    assert dedup_index.topic("halving 10") == "halving 10"
+    assert dedup_index.topic("halving 12") == "halving 12"
+    dedup_index.step("Counting by 5s")
+    assert dedup_index.step("Counting by 10s") == "counting by 10s"
+
+
+@pytest.mark.parametrize("first, second", [
+    ("adding fractions", "subtracting fractions"),
+    ("division", "long division"),
+    ("halving", "doubling"),
+    ("Halving even numbers", "Halving odd numbers"),
+    ("Adding fractions with the same denominator", "Adding fractions with unlike denominators"),
+])
+def test_different_words_are_never_merged(dedup_index, first, second):
+    dedup_index.topic(first)
+    assert dedup_index.topic(second) == cache.normalize_text(second)
+    assert len(dedup_index.entries(dedup.TOPIC)) == 2
+
+
+def test_topics_and_steps_are_kept_apart(dedup_index):
+    dedup_index.topic("halving")
+    assert dedup_index.step("Halving") == "halving"
+    assert dedup_index.entries(dedup.STEP) == ["halving"]
+
+
+def test_lookup_maps_known_topics_but_adds_none(dedup_index):
+    dedup_index.topic("halving")
+    assert dedup_index.lookup(dedup.TOPIC, "Halving numbers") == "halving"
+    assert dedup_index.lookup(dedup.TOPIC, "Fractions!") == "fractions"
+    assert dedup_index.entries(dedup.TOPIC) == ["halving"]
+
+
+def test_planner_requests_get_a_canonical_topic(dedup_index):
+    dedup_index.topic("halving")
+    request = 'Topic: Halving numbers\nResults: [{"is_correct": true}]'
+    assert dedup_index.planner_request(request) == 'Topic: halving\nResults: [{"is_correct": true}]'
+    assert dedup_index.planner_request("something else") == "something else"
+
+
+def test_threshold_above_one_disables_mapping():
+    index = dedup.DedupIndex(threshold=1.1)
+    index.topic("halving")
+    assert index.topic("halving numbers") == "halving numbers"
+
+
+def test_max_entries_stops_new_texts_being_added():
+    index = dedup.DedupIndex(max_entries=1)
+    index.topic("halving")
+    assert index.topic("multiplication") == "multiplication"
+    assert index.entries(dedup.TOPIC) == ["halving"]
+
+
+def test_entries_are_shared_through_the_database(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first, second = dedup.DedupIndex(path=path), dedup.DedupIndex(path=path)
+    second.open()
+    first.topic("halving")
+    assert second.topic("halving numbers") == "halving"
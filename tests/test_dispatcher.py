@@ -0,0 +1,44 @@
+import importlib
+import json
+from collections import Counter
+
+import pytest
+
+dispatcher = importlib.import_module("demo-agent.dispatcher")
+
+SESSIONS = [f"session-{i}" for i in range(2000)]
+
+
+def test_pick_worker_is_stable_and_in_range():
+    for session_id in SESSIONS[:50]:
+        worker = dispatcher.pick_worker(session_id, 4)
+        assert 0 <= worker < 4
+        assert dispatcher.pick_worker(session_id, 4) == worker
+
+
+def test_pick_worker_spreads_sessions_evenly():
+    counts = Counter(dispatcher.pick_worker(session_id, 4) for session_id in SESSIONS)
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > len(SESSIONS) / 4 * 0.8
+
+
+def test_adding_a_worker_only_moves_sessions_to_it():
+    for session_id in SESSIONS:
+        before, after = dispatcher.pick_worker(session_id, 4), dispatcher.pick_worker(session_id, 5)
+        assert after in (before, 4)
+
+
+@pytest.mark.parametrize("method, path, body, expected", [
+    ("GET", "/apps/slimpai/users/u1/sessions/s1", b"", "s1"),
+    ("DELETE", "/apps/slimpai/users/u1/sessions/s1/", b"", "s1"),
+    ("GET", "/debug/trace/session/s2", b"", "s2"),
+    ("POST", "/run", json.dumps({"session_id": "s3", "new_message": {}}).encode(), "s3"),
+    ("POST", "/run_sse", json.dumps({"session_id": "s4"}).encode(), "s4"),
+    ("POST", "/run", b"not json", None),
+    ("POST", "/run", b"[1, 2]", None),
+    ("POST", "/run", json.dumps({"session_id": ""}).encode(), None),
+    ("POST", "/apps/slimpai/users/u1/sessions", b"{}", None),
+    ("GET", "/list-apps", b"", None),
+])
+def test_session_key(method, path, body, expected):
+    assert dispatcher.session_key(method, path, body) == expected
@@ -0,0 +1,102 @@
+import importlib
+
+import pytest
+
+dedup = importlib.import_module("demo-agent.dedup")
+mastery = importlib.import_module("demo-agent.mastery")
+quiz = importlib.import_module("demo-agent.quiz")
+
+QUESTION = {"question": "What is half of 4?", "options": ["1", "2", "3"], "correct_answer_index": 1}
+PLAN = ["Halving even numbers", "Halving odd numbers", "Halving money"]
+
+
+def _answer(store, is_correct, skill="halving", answered_at=None):
+    store.record("S0001", "halving", skill, QUESTION, 1 if is_correct else 0, is_correct, answered_at=answered_at)
+
+
+def test_ewma_weighs_recent_answers_more(mastery_store):
+    _answer(mastery_store, True)
+    assert mastery_store.topic_mastery("S0001", "halving")["ewma"] == 1.0
+    _answer(mastery_store, False)
+    _answer(mastery_store, True)
+
+    row = mastery_store.topic_mastery("S0001", "Halving!")
+    # 1.0, then 0.7 * 1.0, then 0.7 * 0.7 + 0.3
+    assert row["ewma"] == pytest.approx(0.79)
+    assert row["attempts"] == 3 and row["correct"] == 2
+    assert row["accuracy"] == pytest.approx(0.667)
+
+
+def test_skills_and_the_topic_are_aggregated_separately(mastery_store):
+    _answer(mastery_store, True, skill=PLAN[0])
+    _answer(mastery_store, False, skill=PLAN[1])
+
+    rows = {row["skill"]: row for row in mastery_store.student_mastery("S0001")}
+    assert set(rows) == {"", "halving even numbers", "halving odd numbers"}
+    assert rows[""]["attempts"] == 2
+    assert rows["halving odd numbers"]["ewma"] == 0.0
+    assert len(mastery_store.history("S0001", "halving")) == 2
+
+
+def test_remaining_steps_needs_a_plan_and_enough_recent_answers(mastery_store):
+    for _ in range(4):
+        _answer(mastery_store, True, skill=PLAN[0])
+    assert mastery_store.remaining_steps("S0001", "halving") is None
+
+    mastery_store.save_plan("S0001", "halving", PLAN)
+    assert mastery_store.remaining_steps("S0001", "halving") is None
+
+    _answer(mastery_store, True, skill=PLAN[1])
+    assert mastery_store.remaining_steps("S0001", "halving") == [PLAN[2]]
+
+
+def test_remaining_steps_is_none_below_the_threshold(mastery_store):
+    mastery_store.save_plan("S0001", "halving", PLAN)
+    for is_correct in (True, True, True, False, False):
+        _answer(mastery_store, is_correct)
+    assert mastery_store.remaining_steps("S0001", "halving") is None
+
+
+def test_remaining_steps_is_empty_when_every_step_is_mastered(mastery_store):
+    mastery_store.save_plan("S0001", "halving", PLAN[:1])
+    for _ in range(5):
+        _answer(mastery_store, True, skill=PLAN[0])
+    assert mastery_store.remaining_steps("S0001", "halving") == []
+
+
+def test_session_helpers_key_on_the_canonical_topic(mastery_store, dedup_index):
+    dedup_index.topic("halving")
+    state = {"student_number": "S0001", "current_topic": "Halving numbers"}
+    mastery.record_plan(state, PLAN)
+    for _ in range(5):
+        mastery.record_check_answer(state, PLAN[0], QUESTION, 1, True)
+
+    assert mastery_store.topic_mastery("S0001", "halving")["attempts"] == 5
+    assert mastery.remaining_steps(state, "learn about halving") == PLAN[1:]
+    assert mastery.remaining_steps({}, "halving") is None
+
+
+def test_record_quiz_answer_logs_graded_answers_only(mastery_store, dedup_index, question_store, sample_quiz):
+    state = {"student_number": "S0001", "current_topic": "halving"}
+    quiz.start(state, sample_quiz)
+
+    mastery.record_quiz_answer(state, quiz.answer(state, "no idea"))
+    mastery.record_quiz_answer(state, quiz.answer(state, "B"))
+
+    history = mastery_store.history("S0001")
+    assert len(history) == 1
+    assert history[0]["kind"] == "diagnostic" and history[0]["is_correct"] == 1
+
+
+def test_queries_find_the_canonical_topic_without_adding_one(mastery_store, dedup_index):
+    state = {"student_number": "S0001", "current_topic": "halving"}
+    mastery.record_plan(state, PLAN)
+    mastery.record_check_answer(state, PLAN[0], QUESTION, 1, True)
+
+    assert [row["skill"] for row in mastery_store.student_mastery("S0001", "Halving numbers")] == ["", "halving even numbers"]
+    assert mastery_store.topic_mastery("S0001", "learn about halving")["attempts"] == 1
+    assert [row["skill"] for row in mastery_store.topic_summary("halving numbers")] == ["", "halving even numbers"]
+    assert len(mastery_store.history("S0001", "Halving numbers")) == 1
+
+    assert mastery_store.topic_summary("fractions") == []
+    assert dedup_index.entries(dedup.TOPIC) == ["halving"]
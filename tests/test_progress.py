@@ -0,0 +1,144 @@
+import importlib
+import json
+import sqlite3
+
+import pytest
+
+progress = importlib.import_module("demo-agent.progress")
+
+
+def _legacy_state(sample_quiz):
+    return {
+        "quiz": sample_quiz,
+        "quiz_results": [
+            {"question": sample_quiz[0]["question"], "is_correct": True},
+            {"question": sample_quiz[1]["question"], "is_correct": False},
+        ],
+        "current_question_index": 2,
+        "correct_answers": 1,
+        "lesson_plan": ["Halving even numbers", "Halving odd numbers"],
+        "lesson_step_index": 1,
+        "lesson_results": [{"step": "Halving even numbers", "is_correct": True}],
+        "check_question": sample_quiz[2],
+        "question_shown_at": 1760000000.5,
+        "student_id": "S0001",
+    }
+
+
+def test_load_reads_the_unversioned_keys(question_store, sample_quiz):
+    record = progress.load(_legacy_state(sample_quiz))
+
+    assert question_store.get_many(record.quiz.ids) == sample_quiz
+    assert record.quiz.at == 2 and record.quiz.outcomes() == [True, False]
+    assert record.lesson.step == "Halving odd numbers"
+    assert record.lesson.checks_answered == 1 and record.lesson.checks_correct == 1
+    assert question_store.get(record.lesson.check) == sample_quiz[2]
+    assert record.shown_at == 1760000000.5
+
+
+def test_load_does_not_write(question_store, sample_quiz):
+    state = _legacy_state(sample_quiz)
+    before = json.dumps(state, sort_keys=True)
+    progress.load(state)
+    assert json.dumps(state, sort_keys=True) == before
+
+
+def test_save_clears_the_unversioned_keys(question_store, sample_quiz):
+    state = _legacy_state(sample_quiz)
+    record = progress.load(state)
+    progress.save(state, record)
+
+    assert state["progress"]["v"] == progress.STATE_VERSION
+    assert all(state.get(key) is None for key in progress.LEGACY_KEYS)
+    assert state["student_id"] == "S0001"
+    assert progress.load(state) == record
+
+
+def test_lesson_position_falls_back_to_compacted_progress(question_store):
+    state = {
+        "lesson_plan": ["a", "b", "c"],
+        "lesson_progress": {"explained_steps": ["a", "b"]},
+    }
+    assert progress.load(state).lesson.at == 1
+
+
+def test_migrate_state_removes_the_old_keys(question_store, sample_quiz):
+    state = _legacy_state(sample_quiz)
+    assert progress.migrate_state(state)
+    assert set(state) == {"progress", "student_id"}
+    assert not progress.migrate_state(state)
+
+
+def test_migrate_rewrites_a_session_database(question_store, sample_quiz, tmp_path):
+    path = str(tmp_path / "agent_store.db")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE sessions (app_name TEXT, user_id TEXT, id TEXT, state TEXT)")
+    db.execute("INSERT INTO sessions VALUES ('slimpai', 'u1', 's1', ?)", (json.dumps(_legacy_state(sample_quiz)),))
+    db.execute("INSERT INTO sessions VALUES ('slimpai', 'u2', 's2', '{}')")
+    db.commit()
+    db.close()
+
+    assert progress.migrate(path) == {"sessions": 2, "migrated": 1}
+    db = sqlite3.connect(path)
+    state = json.loads(db.execute("SELECT state FROM sessions WHERE id = 's1'").fetchone()[0])
+    assert progress.load(state).quiz.at == 2
+
+
+def test_newer_versions_are_refused():
+    with pytest.raises(ValueError):
+        progress.load({"progress": {"v": progress.STATE_VERSION + 1}})
+
+
+def test_share_keeps_only_the_quiz_and_its_questions(question_store, sample_quiz):
+    ids = [question_store.put(question) for question in sample_quiz]
+    record = progress.Progress(
+        quiz=progress.QuizProgress(ids=ids, at=1, correct=1),
+        lesson=progress.LessonProgress(plan=["Halving"]),
+        shown_at=1760000000.0,
+    )
+    delta = {"progress": record.model_dump(exclude_none=True), "phase": "quiz"}
+
+    entry = progress.share(delta)
+    assert entry["state_delta"] == {"phase": "quiz", "progress": {"v": 1, "quiz": {"ids": ids, "at": 0, "correct": 0}}}
+    assert list(entry["questions"].values()) == sample_quiz
+
+
+def test_replay_starts_the_quiz_and_keeps_the_sessions_lesson(question_store, sample_quiz, monkeypatch):
+    source = progress.QuestionStore(path=None)
+    monkeypatch.setattr(progress, "question_store", source)
+    ids = [source.put(question) for question in sample_quiz]
+    entry = progress.share({"progress": progress.Progress(quiz=progress.QuizProgress(ids=ids)).model_dump()})
+
+    # Another host: its own question store, and a session in the middle of a lesson
+    monkeypatch.setattr(progress, "question_store", question_store)
+    state = {}
+    progress.save(state, progress.Progress(lesson=progress.LessonProgress(plan=["Halving"])))
+    progress.replay(state, entry)
+
+    record = progress.load(state)
+    assert question_store.get_many(record.quiz.ids) == sample_quiz
+    assert record.lesson.plan == ["Halving"]
+    assert record.shown_at is not None
+
+
+def test_replay_reads_entries_with_unversioned_keys(question_store, sample_quiz):
+    state = {}
+    progress.replay(state, {"state_delta": {"quiz": sample_quiz, "quiz_started": True}})
+    assert question_store.get_many(progress.load(state).quiz.ids) == sample_quiz
+    assert state.get("quiz") is None
+
+
+def test_question_store_expires_questions(sample_quiz, monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(progress.time, "time", lambda: now[0])
+    store = progress.QuestionStore(path=str(tmp_path / "questions.db"), ttl=60, purge_interval=10)
+    qid = store.put(sample_quiz[0])
+
+    now[0] += 30
+    assert store.put(sample_quiz[0]) == qid
+    now[0] += 50
+    # Storing a question again refreshes it
+    assert progress.QuestionStore(path=str(tmp_path / "questions.db"), ttl=60).get(qid) == sample_quiz[0]
+    now[0] += 61
+    assert store.get(qid) is None
+    assert store.purge() == 1
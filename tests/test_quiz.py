@@ -0,0 +1,114 @@
+import importlib
+
+import pytest
+
+quiz = importlib.import_module("demo-agent.quiz")
+progress = importlib.import_module("demo-agent.progress")
+
+OPTIONS = ["8 slices", "4 slices", "2 slices"]
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ("B", 1),
+    ("b)", 1),
+    ("(c)", 2),
+    ("2", 1),
+    (3, 2),
+    ("my answer is A", 0),
+    ("It's c.", 2),
+    ("option 1", 0),
+    ("4 slices", 1),
+    ("  8 SLICES!", 0),
+])
+def test_parse_choice_accepts_letters_numbers_and_option_text(reply, expected):
+    assert quiz.parse_choice(reply, OPTIONS) == expected
+
+
+@pytest.mark.parametrize("reply", ["D", "4", 0, True, "", "I don't know", "AB"])
+def test_parse_choice_rejects_unclear_replies(reply):
+    assert quiz.parse_choice(reply, OPTIONS) is None
+
+
+def test_parse_choice_prefers_option_text_over_numbers():
+    assert quiz.parse_choice("2", ["3", "2", "1"]) == 1
+    assert quiz.parse_choice("3", ["1", "2", "3"]) == 2
+
+
+def test_start_keeps_question_ids_and_shows_the_first(question_store, sample_quiz):
+    state = {}
+    started = quiz.start(state, sample_quiz)
+
+    assert started["status"] == "started"
+    assert started["total_questions"] == 3
+    assert started["first_question"].startswith("Question 1 of 3: What is half of 4?")
+    record = progress.load(state)
+    assert question_store.get_many(record.quiz.ids) == sample_quiz
+    assert record.quiz.at == 0 and record.shown_at is not None
+
+
+def test_start_without_showing_leaves_the_first_answer_untimed(question_store, sample_quiz):
+    state = {}
+    quiz.start(state, sample_quiz, shown=False)
+    assert progress.load(state).shown_at is None
+    assert quiz.answer(state, "B")["latency_ms"] is None
+
+
+def test_start_rejects_malformed_quiz(question_store):
+    with pytest.raises(quiz.QuizError):
+        quiz.start({}, [{"question": "Half of 4?", "options": ["2"], "correct_answer_index": 0}])
+
+
+def test_answer_packs_outcomes_into_bits(question_store, sample_quiz):
+    state = {}
+    quiz.start(state, sample_quiz)
+
+    first = quiz.answer(state, "B")
+    assert first["status"] == "answered" and first["is_correct"]
+    assert first["next_question"].startswith("Question 2 of 3")
+    second = quiz.answer(state, "C")
+    assert not second["is_correct"]
+    assert second["correct_answer"] == "A) 5"
+
+    record = progress.load(state).quiz
+    assert record.at == 2
+    assert record.correct == 0b01
+    assert record.outcomes() == [True, False]
+
+
+def test_answer_grades_the_finished_quiz(question_store, sample_quiz):
+    state = {}
+    quiz.start(state, sample_quiz)
+    for reply in ("B", "B"):
+        quiz.answer(state, reply)
+
+    final = quiz.answer(state, "9")
+    assert final["status"] == "finished"
+    assert final["is_correct"]
+    assert final["correct_answers"] == 2 and final["total_answered"] == 3
+    assert final["score_percentage"] == 67
+    assert "next_question" not in final
+    assert final["test_results_json"] == quiz.format_results([
+        {"question": "What is half of 4?", "is_correct": True},
+        {"question": "What is half of 10?", "is_correct": False},
+        {"question": "What is half of 18?", "is_correct": True},
+    ])
+    assert progress.load(state).quiz.correct == 0b101
+    assert not quiz.is_active(state)
+    assert quiz.answer(state, "A")["status"] == "error"
+
+
+def test_answer_leaves_unrecognized_replies_ungraded(question_store, sample_quiz):
+    state = {}
+    quiz.start(state, sample_quiz)
+
+    result = quiz.answer(state, "no idea")
+    assert result["status"] == "unrecognized"
+    assert result["current_question"].startswith("Question 1 of 3")
+    assert progress.load(state).quiz.at == 0
+
+
+def test_answer_reports_missing_questions(question_store, sample_quiz, monkeypatch):
+    state = {}
+    quiz.start(state, sample_quiz)
+    monkeypatch.setattr(progress, "question_store", progress.QuestionStore(path=None))
+    assert quiz.answer(state, "B") == {"status": "error", "error_message": "The quiz questions are no longer available"}
@@ -0,0 +1,65 @@
+import importlib
+import json
+
+import pytest
+
+schemas = importlib.import_module("demo-agent.schemas")
+
+QUESTION = {"question": "What is half of 4?", "options": ["1", "2", "3"], "correct_answer_index": 1}
+
+
+def test_valid_output_is_returned_as_is():
+    result = schemas.parse_output("quiz", json.dumps([QUESTION]))
+    assert result.outcome == "valid"
+    assert result.value == [QUESTION]
+
+
+@pytest.mark.parametrize("text", [
+    "```json\n" + json.dumps([QUESTION]) + "\n```",
+    "Here is your quiz:\n" + json.dumps([QUESTION]) + "\nGood luck!",
+    json.dumps([QUESTION])[:-1] + ",]",
+    json.dumps({"questions": [QUESTION]}),
+    json.dumps([QUESTION])[:-1],
+    str([QUESTION]).replace('"', "'"),
+])
+def test_quiz_syntax_and_shape_are_repaired(text):
+    result = schemas.parse_output("quiz", text)
+    assert result.outcome == "repaired"
+    assert result.value == [QUESTION]
+
+
+@pytest.mark.parametrize("variant", [
+    {"question": "What is half of 4?", "options": ["1", "2", "3"], "correct_answer": "B"},
+    {"question": "What is half of 4?", "options": ["A) 1", "B) 2", "C) 3"], "answer": "B) 2"},
+    {"text": "What is half of 4?", "choices": {"A": "1", "B": "2", "C": "3"}, "answer_index": 1.0},
+])
+def test_question_keys_and_answers_are_repaired(variant):
+    result = schemas.parse_output("question", json.dumps(variant))
+    assert result.outcome == "repaired"
+    assert result.value == QUESTION
+
+
+def test_out_of_range_index_is_clamped():
+    result = schemas.parse_output("question", dict(QUESTION, correct_answer_index=3))
+    assert result.outcome == "repaired"
+    assert result.value["correct_answer_index"] == 2
+
+
+def test_lesson_plan_titles_are_repaired():
+    text = '{"lesson_plan": [{"title": "Step 1: Halving even numbers"}, "2) Halving odd numbers"]}'
+    result = schemas.parse_output("lesson_plan", text)
+    assert result.outcome == "repaired"
+    assert result.value == ["Halving even numbers", "Halving odd numbers"]
+
+
+@pytest.mark.parametrize("schema, text", [
+    ("quiz", "Sorry, I can't make a quiz about that."),
+    ("quiz", "[]"),
+    ("question", json.dumps({"question": "Half of 4?", "options": ["2"], "correct_answer_index": 0})),
+    ("lesson_plan", '["Halving", ""]'),
+])
+def test_unusable_output_is_invalid(schema, text):
+    result = schemas.parse_output(schema, text)
+    assert result.outcome == "invalid"
+    assert result.value is None
+    assert result.error
@@ -0,0 +1,180 @@
+import asyncio
+import importlib
+import sqlite3
+import time
+
+import pytest
+from google.adk.errors.already_exists_error import AlreadyExistsError
+from google.adk.events.event import Event
+from google.adk.events.event_actions import EventActions
+from google.genai import types
+
+sessions = importlib.import_module("demo-agent.sessions")
+
+APP = "slimpai"
+
+
+def _event(text, timestamp=None, **state_delta):
+    return Event(
+        author="user",
+        content=types.Content(role="user", parts=[types.Part(text=text)]),
+        actions=EventActions(state_delta=state_delta),
+        timestamp=timestamp or time.time(),
+    )
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "agent_store.db")
+
+
+def test_append_event_persists_events_and_state(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path)
+        session = await service.create_session(app_name=APP, user_id="u1", state={"phase": "start"}, session_id="s1")
+        await service.append_event(session, _event("Hi!", phase="quiz", **{"user:name": "Ada", "temp:scratch": 1}))
+        await service.append_event(session, _event("B"))
+        assert session.state["phase"] == "quiz"
+
+        # A second service has no cached copy, so this reads what was stored
+        stored = await sessions.SqliteSessionService(db_path).get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert [event.content.parts[0].text for event in stored.events] == ["Hi!", "B"]
+        assert stored.state == {"phase": "quiz", "user:name": "Ada"}
+
+        cached = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert cached.state == stored.state and len(cached.events) == 2
+
+    asyncio.run(scenario())
+
+
+def test_returned_sessions_do_not_share_state_with_the_cache(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path)
+        session = await service.create_session(app_name=APP, user_id="u1", state={"phase": "start"}, session_id="s1")
+        await service.append_event(session, _event("Hi!"))
+
+        copy = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        copy.state["phase"] = "changed"
+        copy.events.clear()
+        again = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert again.state == {"phase": "start"} and len(again.events) == 1
+
+    asyncio.run(scenario())
+
+
+def test_cache_is_bounded_by_its_event_budget(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path, cache_events=3)
+        for session_id in ("s1", "s2"):
+            session = await service.create_session(app_name=APP, user_id="u1", session_id=session_id)
+            await service.append_event(session, _event("Hi!"))
+            await service.append_event(session, _event("B"))
+
+        assert list(service._cache) == [(APP, "u1", "s2")]
+        assert service._cached_events == 2
+        # Dropped sessions are loaded from the database again
+        session = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert len(session.events) == 2
+
+    asyncio.run(scenario())
+
+
+def test_waiting_for_the_write_lock_does_not_block_the_event_loop(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path)
+        session = await service.create_session(app_name=APP, user_id="u1", session_id="s1")
+        # Another worker process holding the write lock
+        other = sqlite3.connect(db_path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+
+        append = asyncio.ensure_future(service.append_event(session, _event("Hi!")))
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+        assert not append.done()
+
+        other.execute("COMMIT")
+        await append
+        stored = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert len(stored.events) == 1
+
+    asyncio.run(scenario())
+
+
+def test_partial_events_are_not_stored(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path)
+        session = await service.create_session(app_name=APP, user_id="u1", session_id="s1")
+        event = _event("Hel")
+        event.partial = True
+        await service.append_event(session, event)
+        stored = await sessions.SqliteSessionService(db_path).get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert stored.events == []
+
+    asyncio.run(scenario())
+
+
+def test_get_session_reflects_writes_from_another_process(db_path):
+    async def scenario():
+        first, second = sessions.SqliteSessionService(db_path), sessions.SqliteSessionService(db_path)
+        await first.create_session(app_name=APP, user_id="u1", session_id="s1")
+        await first.get_session(app_name=APP, user_id="u1", session_id="s1")
+
+        session = await second.get_session(app_name=APP, user_id="u1", session_id="s1")
+        await second.append_event(session, _event("Hi!", phase="quiz"))
+
+        reloaded = await first.get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert reloaded.state["phase"] == "quiz" and len(reloaded.events) == 1
+
+    asyncio.run(scenario())
+
+
+def test_create_session_rejects_a_live_duplicate(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path)
+        await service.create_session(app_name=APP, user_id="u1", session_id="s1")
+        with pytest.raises(AlreadyExistsError):
+            await service.create_session(app_name=APP, user_id="u1", session_id="s1")
+
+    asyncio.run(scenario())
+
+
+def test_expired_sessions_are_hidden_and_purged(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path, ttl_seconds=60)
+        old = await service.create_session(app_name=APP, user_id="u1", session_id="old")
+        await service.append_event(old, _event("Hi!", timestamp=time.time() - 120))
+        await service.create_session(app_name=APP, user_id="u1", session_id="new")
+
+        assert await service.get_session(app_name=APP, user_id="u1", session_id="old") is None
+        listed = await service.list_sessions(app_name=APP, user_id="u1")
+        assert [session.id for session in listed.sessions] == ["new"]
+
+        assert service.purge_expired() == 1
+        assert service._db.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 0
+        # An expired id can be reused
+        await service.create_session(app_name=APP, user_id="u1", session_id="old")
+
+    asyncio.run(scenario())
+
+
+def test_create_sessions_is_all_or_nothing(db_path):
+    async def scenario():
+        service = sessions.SqliteSessionService(db_path)
+        await service.create_session(app_name=APP, user_id="u2", session_id="s2")
+        with pytest.raises(AlreadyExistsError):
+            await service.create_sessions(app_name=APP, sessions=[("u1", "s1", {}), ("u2", "s2", {})])
+        assert await service.get_session(app_name=APP, user_id="u1", session_id="s1") is None
+
+        ids = await service.create_sessions(app_name=APP, sessions=[("u1", "s1", {"phase": "quiz"}), ("u3", "s3", {})])
+        assert ids == ["s1", "s3"]
+        session = await service.get_session(app_name=APP, user_id="u1", session_id="s1")
+        assert session.state == {"phase": "quiz"}
+
+    asyncio.run(scenario())
+
+
+def test_from_uri_reads_the_path_and_options(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = sessions.SqliteSessionService.from_uri("slimpai-sqlite:///./store.db?ttl=60&cache_size=8&cache_events=100")
+    assert service.db_path == "./store.db"
+    assert service.ttl_seconds == 60 and service.cache_size == 8 and service.cache_events == 100